@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+#
+# Count the wakeups and failed accepts of idle sync workers sharing a
+# listening socket, waiting with select() as before and with epoll and
+# EPOLLEXCLUSIVE as the sync worker now does on Linux.
+#
+# Every worker process runs the accept loop of SyncWorker.run_for_one():
+# accept until EAGAIN, then wait for the listener to become readable.
+# Connections are opened one at a time, so that all workers are idle
+# when each of them arrives.
+#
+# "wakeups" counts the waits that returned a readable listener and "failed
+# accepts" those followed by EAGAIN, another worker having taken the
+# connection. The kernel checks the listener again before returning from
+# select(), so on few cores a thundering herd mostly shows in the
+# voluntary context switches of the workers, "ctx switches".
+#
+#   python devel/bench_accept_wakeups.py [--workers 32] [--connections 500]
+
+import argparse
+import errno
+import multiprocessing
+import resource
+import select
+import socket
+import time
+
+
+def wait_select(listener):
+    def wait(timeout):
+        return select.select([listener], [], [], timeout)[0]
+    return wait
+
+
+def wait_epoll_exclusive(listener):
+    poller = select.epoll()
+    poller.register(listener.fileno(), select.EPOLLIN | select.EPOLLEXCLUSIVE)
+
+    def wait(timeout):
+        return poller.poll(timeout)
+    return wait
+
+
+def worker(listener, mode, deadline, results):
+    wait = MODES[mode](listener)
+    wakeups = accepted = failed = 0
+    switches = resource.getrusage(resource.RUSAGE_SELF).ru_nvcsw
+    while time.monotonic() < deadline:
+        try:
+            client, _ = listener.accept()
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+        else:
+            accepted += 1
+            client.close()
+            continue
+
+        if not wait(0.5):
+            continue
+        wakeups += 1
+        # the first accept after waking up tells whether there was a
+        # connection left for this worker
+        try:
+            client, _ = listener.accept()
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+            failed += 1
+        else:
+            accepted += 1
+            client.close()
+    switches = resource.getrusage(resource.RUSAGE_SELF).ru_nvcsw - switches
+    results.put((switches, wakeups, accepted, failed))
+
+
+MODES = {
+    "select": wait_select,
+    "epollexclusive": wait_epoll_exclusive,
+}
+
+
+def run(mode, args):
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(2048)
+    listener.setblocking(False)
+
+    duration = args.connections * args.interval + 2.0
+    deadline = time.monotonic() + duration
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker,
+                                     args=(listener, mode, deadline, results))
+             for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+
+    time.sleep(1.0)
+    for _ in range(args.connections):
+        socket.create_connection(listener.getsockname()).close()
+        time.sleep(args.interval)
+
+    totals = [0, 0, 0, 0]
+    for _ in procs:
+        for i, value in enumerate(results.get()):
+            totals[i] += value
+    for p in procs:
+        p.join()
+    listener.close()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=0.005)
+    args = parser.parse_args()
+
+    modes = ["select"]
+    if hasattr(select, "EPOLLEXCLUSIVE"):
+        modes.append("epollexclusive")
+
+    print("%-16s %12s %10s %10s %14s" % ("wait", "ctx switches", "wakeups",
+                                         "accepted", "failed accepts"))
+    for mode in modes:
+        switches, wakeups, accepted, failed = run(mode, args)
+        print("%-16s %12d %10d %10d %14d" % (mode, switches, wakeups,
+                                             accepted, failed))
+
+
+if __name__ == "__main__":
+    main()
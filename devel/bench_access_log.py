@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+#
+# Time the formatting of an access log line with the dict of all the
+# atoms built by Logger.atoms(), as before, and with the compiled
+# access_log_format computing only the atoms it references.
+#
+# The request carries the headers of a browser behind a proxy and the
+# environ those of the WSGI server plus a few of the application.
+#
+#   python devel/bench_access_log.py [--number 20000]
+
+import argparse
+import datetime
+import timeit
+
+from gunicorn.config import Config
+from gunicorn.glogging import AccessLogFormat, Logger, SafeAtoms
+
+REQUEST_HEADERS = [
+    ("HOST", "example.com"),
+    ("USER-AGENT", "Mozilla/5.0 (X11; Linux x86_64; rv:120.0) Firefox/120.0"),
+    ("ACCEPT", "text/html,application/xhtml+xml,application/xml;q=0.9"),
+    ("ACCEPT-LANGUAGE", "en-US,en;q=0.5"),
+    ("ACCEPT-ENCODING", "gzip, deflate, br"),
+    ("REFERER", "https://example.com/index.html"),
+    ("COOKIE", "session=0123456789abcdef; theme=dark"),
+    ("X-FORWARDED-FOR", "203.0.113.7"),
+    ("X-FORWARDED-PROTO", "https"),
+    ("X-REQUEST-ID", "4f2a0c1e-8d3b-4a57-9e61-2b7c5d9f0a13"),
+    ("CONNECTION", "keep-alive"),
+    ("CACHE-CONTROL", "max-age=0"),
+]
+
+RESPONSE_HEADERS = [
+    ("Content-Type", "text/html; charset=utf-8"),
+    ("Content-Length", "5120"),
+    ("Cache-Control", "private"),
+    ("Set-Cookie", "session=0123456789abcdef; HttpOnly"),
+]
+
+FORMATS = {
+    "default": Config().access_log_format,
+    "proxy": '%({x-forwarded-for}i)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s '
+             '"%(f)s" "%(a)s" %(D)s %({x-request-id}i)s',
+}
+
+
+class Request:
+    headers = REQUEST_HEADERS
+
+
+class Response:
+    status = "200 OK"
+    headers = RESPONSE_HEADERS
+    sent = 5120
+
+
+def environ():
+    env = {
+        "REQUEST_METHOD": "GET",
+        "RAW_URI": "/articles/42?page=2",
+        "PATH_INFO": "/articles/42",
+        "QUERY_STRING": "page=2",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "SERVER_NAME": "example.com",
+        "SERVER_PORT": "443",
+        "REMOTE_ADDR": "10.0.0.2",
+        "REMOTE_PORT": "51234",
+        "SCRIPT_NAME": "",
+        "SERVER_SOFTWARE": "gunicorn",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "https",
+        "wsgi.multithread": False,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        "wsgi.input": None,
+        "wsgi.errors": None,
+        "gunicorn.socket": None,
+        "app.user": None,
+        "app.session": None,
+    }
+    for name, value in REQUEST_HEADERS:
+        env["HTTP_" + name.replace("-", "_")] = value
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    log = Logger(Config())
+    resp, req, env = Response(), Request(), environ()
+    request_time = datetime.timedelta(microseconds=12345)
+
+    print("%-10s %16s %16s" % ("format", "atoms() us/line",
+                                "compiled us/line"))
+    for name, fmt in FORMATS.items():
+        compiled = AccessLogFormat(fmt)
+
+        def full():
+            return fmt % SafeAtoms(log.atoms(resp, req, env, request_time))
+
+        def lazy():
+            return fmt % compiled(log, resp, req, env, request_time)
+
+        assert full() == lazy()
+        times = [min(timeit.repeat(f, number=args.number, repeat=3))
+                 for f in (full, lazy)]
+        print("%-10s %16.2f %16.2f" % (name, *(t / args.number * 1e6
+                                               for t in times)))
+
+
+if __name__ == "__main__":
+    main()
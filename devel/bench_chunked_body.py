@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+#
+# Benchmark decoding of large chunked request bodies made of many small
+# chunks, as sent by streaming clients.
+#
+# The current gunicorn.http.body.ChunkedReader is compared against a copy
+# of the previous implementation, which rebuilt a BytesIO and re-sliced
+# the accumulated data for every chunk header and every read.
+#
+#   python devel/bench_chunked_body.py [--size MB] [--chunk BYTES]
+
+import argparse
+import io
+import time
+
+from gunicorn.http.body import Body, ChunkedReader
+from gunicorn.http.errors import (NoMoreData, ChunkMissingTerminator,
+                                  InvalidChunkSize)
+from gunicorn.http.unreader import IterUnreader
+
+
+class LegacyChunkedReader:
+    """The previous BytesIO based chunked decoder."""
+
+    def __init__(self, req, unreader):
+        self.req = req
+        self.parser = self.parse_chunked(unreader)
+        self.buf = io.BytesIO()
+
+    def read(self, size):
+        if not isinstance(size, int):
+            raise TypeError("size must be an integer type")
+        if size < 0:
+            raise ValueError("Size must be positive.")
+        if size == 0:
+            return b""
+
+        if self.parser:
+            while self.buf.tell() < size:
+                try:
+                    self.buf.write(next(self.parser))
+                except StopIteration:
+                    self.parser = None
+                    break
+
+        data = self.buf.getvalue()
+        ret, rest = data[:size], data[size:]
+        self.buf = io.BytesIO()
+        self.buf.write(rest)
+        return ret
+
+    def parse_trailers(self, unreader, data):
+        buf = io.BytesIO()
+        buf.write(data)
+
+        idx = buf.getvalue().find(b"\r\n\r\n")
+        done = buf.getvalue()[:2] == b"\r\n"
+        while idx < 0 and not done:
+            self.get_data(unreader, buf)
+            idx = buf.getvalue().find(b"\r\n\r\n")
+            done = buf.getvalue()[:2] == b"\r\n"
+        if done:
+            unreader.unread(buf.getvalue()[2:])
+            return b""
+        self.req.trailers = self.req.parse_headers(buf.getvalue()[:idx], from_trailer=True)
+        unreader.unread(buf.getvalue()[idx + 4:])
+
+    def parse_chunked(self, unreader):
+        (size, rest) = self.parse_chunk_size(unreader)
+        while size > 0:
+            while size > len(rest):
+                size -= len(rest)
+                yield rest
+                rest = unreader.read()
+                if not rest:
+                    raise NoMoreData()
+            yield rest[:size]
+            # Remove \r\n after chunk
+            rest = rest[size:]
+            while len(rest) < 2:
+                new_data = unreader.read()
+                if not new_data:
+                    break
+                rest += new_data
+            if rest[:2] != b'\r\n':
+                raise ChunkMissingTerminator(rest[:2])
+            (size, rest) = self.parse_chunk_size(unreader, data=rest[2:])
+
+    def parse_chunk_size(self, unreader, data=None):
+        buf = io.BytesIO()
+        if data is not None:
+            buf.write(data)
+
+        idx = buf.getvalue().find(b"\r\n")
+        while idx < 0:
+            self.get_data(unreader, buf)
+            idx = buf.getvalue().find(b"\r\n")
+
+        data = buf.getvalue()
+        line, rest_chunk = data[:idx], data[idx + 2:]
+
+        # RFC9112 7.1.1: BWS before chunk-ext - but ONLY then
+        chunk_size, *chunk_ext = line.split(b";", 1)
+        if chunk_ext:
+            chunk_size = chunk_size.rstrip(b" \t")
+        if any(n not in b"0123456789abcdefABCDEF" for n in chunk_size):
+            raise InvalidChunkSize(chunk_size)
+        if len(chunk_size) == 0:
+            raise InvalidChunkSize(chunk_size)
+        chunk_size = int(chunk_size, 16)
+
+        if chunk_size == 0:
+            try:
+                self.parse_trailers(unreader, rest_chunk)
+            except NoMoreData:
+                pass
+            return (0, None)
+        return (chunk_size, rest_chunk)
+
+    def get_data(self, unreader, buf):
+        data = unreader.read()
+        if not data:
+            raise NoMoreData()
+        buf.write(data)
+
+
+
+class Request:
+    trailers = []
+
+    def parse_headers(self, data, from_trailer=False):
+        return []
+
+
+def make_body(size, chunk):
+    payload = b"x" * chunk
+    frame = b"%x\r\n%s\r\n" % (chunk, payload)
+    return frame * (size // chunk) + b"0\r\n\r\n"
+
+
+def recv_sized(data, recv_size=8192):
+    # what a socket hands the unreader
+    return [data[i:i + recv_size] for i in range(0, len(data), recv_size)]
+
+
+def run(reader_class, pieces, method, read_size):
+    reader = reader_class(Request(), IterUnreader(pieces))
+    start = time.perf_counter()
+    total = 0
+    if method == "readinto":
+        buf = bytearray(read_size)
+        n = reader.readinto(buf)
+        while n:
+            total += n
+            n = reader.readinto(buf)
+    else:
+        body = Body(reader)
+        data = body.read(read_size)
+        while data:
+            total += len(data)
+            data = body.read(read_size)
+    return time.perf_counter() - start, total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=8, help="body size in MB")
+    parser.add_argument("--chunk", type=int, default=64,
+                        help="payload bytes per chunk")
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    pieces = recv_sized(make_body(size, args.chunk))
+
+    print("%d MB body in %d byte chunks" % (args.size, args.chunk))
+    print("%-28s %10s %10s" % ("decoder", "seconds", "MB/s"))
+    for name, reader_class, method in (
+            ("legacy Body.read(65536)", LegacyChunkedReader, "read"),
+            ("current Body.read(65536)", ChunkedReader, "read"),
+            ("current readinto(65536)", ChunkedReader, "readinto")):
+        elapsed, total = run(reader_class, pieces, method, 65536)
+        assert total == size, (name, total)
+        print("%-28s %10.3f %10.1f" % (name, elapsed, total / elapsed / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+#
+# Report the unique (USS) and proportional (PSS) memory of preloaded
+# workers, with and without gc_freeze.
+#
+# The application allocates a large object graph at import time and runs a
+# full collection on every request, as the cyclic garbage collector
+# eventually does in a long running worker. Memory is read from
+# /proc/<pid>/smaps_rollup (Linux only) after the requests were served.
+#
+#   python devel/bench_fork_memory.py [--workers 4] [--objects 500000]
+
+import argparse
+import gc
+import os
+import socket
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REQUEST = b"GET / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+
+DATA = None
+
+
+def build():
+    global DATA
+    size = int(os.environ.get("BENCH_OBJECTS", "500000"))
+    DATA = {i: {"id": i, "name": "item %d" % i, "tags": [i, str(i)]}
+            for i in range(size)}
+
+
+def app(environ, start_response):
+    gc.collect()
+    body = b"%d" % len(DATA)
+    start_response("200 OK", [("Content-Type", "text/plain"),
+                              ("Content-Length", str(len(body)))])
+    return [body]
+
+
+if __name__ != "__main__":
+    build()
+
+
+def smaps_rollup(pid):
+    values = {}
+    with open("/proc/%d/smaps_rollup" % pid) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    uss = values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+    return uss, values.get("Pss", 0)
+
+
+def children(pid):
+    with open("/proc/%d/task/%d/children" % (pid, pid)) as f:
+        return [int(p) for p in f.read().split()]
+
+
+def wait_listening(port, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start")
+
+
+def request(port):
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall(REQUEST)
+    while sock.recv(65536):
+        pass
+    sock.close()
+
+
+def run(args, gc_freeze):
+    env = dict(os.environ)
+    env["BENCH_OBJECTS"] = str(args.objects)
+    env["PYTHONPATH"] = os.pathsep.join([HERE, os.path.dirname(HERE),
+                                         env.get("PYTHONPATH", "")])
+    cmd = [sys.executable, "-m", "gunicorn", "bench_fork_memory:app",
+           "--preload", "--workers", str(args.workers),
+           "--bind", "127.0.0.1:%d" % args.port, "--log-level", "warning"]
+    if gc_freeze:
+        cmd.append("--gc-freeze")
+    proc = subprocess.Popen(cmd, env=env)
+    try:
+        wait_listening(args.port)
+        for _ in range(args.requests):
+            request(args.port)
+        time.sleep(1.0)
+        return [smaps_rollup(pid) for pid in children(proc.pid)]
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--objects", type=int, default=500000)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    print("%-10s %14s %14s %14s" % ("gc_freeze", "USS/worker kB",
+                                    "PSS/worker kB", "PSS total kB"))
+    for gc_freeze in (False, True):
+        stats = run(args, gc_freeze)
+        uss = sum(s[0] for s in stats) / len(stats)
+        pss = sum(s[1] for s in stats)
+        print("%-10s %14.0f %14.0f %14d" % (gc_freeze, uss, pss / len(stats),
+                                            pss))
+
+
+if __name__ == "__main__":
+    main()
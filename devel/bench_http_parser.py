@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+#
+# Benchmark the HTTP/1.1 request-head parser.
+#
+# The current gunicorn.http.message.Request is compared against a
+# subclass carrying the previous head scanning strategy, which rescanned
+# the whole buffer for the terminator after every read and split headers
+# with list.pop(0). Header validation is shared by both.
+#
+#   python devel/bench_http_parser.py [--number N]
+
+import argparse
+import io
+import timeit
+
+from gunicorn.config import Config
+from gunicorn.http.errors import LimitRequestHeaders, LimitRequestLine, NoMoreData
+from gunicorn.http.message import Request
+from gunicorn.http.unreader import IterUnreader
+from gunicorn.util import bytes_to_str
+
+
+def make_request(nheaders):
+    head = [b"GET /path/to/resource?query=string HTTP/1.1", b"Host: example.com"]
+    head.extend(b"X-Header-%d: some moderately sized value %d" % (i, i)
+                for i in range(nheaders))
+    return b"\r\n".join(head) + b"\r\n\r\n"
+
+
+def split(data, chunk):
+    return [data[i:i + chunk] for i in range(0, len(data), chunk)]
+
+
+class LegacyRequest(Request):
+    """Request using the previous head scanning and header splitting."""
+
+    def get_data(self, unreader, buf, stop=False):
+        data = unreader.read()
+        if not data:
+            if stop:
+                raise StopIteration()
+            raise NoMoreData(buf.getvalue())
+        buf.write(data)
+
+    def parse(self, unreader):
+        buf = io.BytesIO()
+        self.get_data(unreader, buf, stop=True)
+        line, rbuf = self.read_line(unreader, buf, self.limit_request_line)
+        self.parse_request_line(line)
+        buf = io.BytesIO()
+        buf.write(rbuf)
+
+        data = buf.getvalue()
+        while True:
+            idx = data.find(b"\r\n\r\n")
+            done = data[:2] == b"\r\n"
+            if idx < 0 and not done:
+                self.get_data(unreader, buf)
+                data = buf.getvalue()
+                if len(data) > self.max_buffer_headers:
+                    raise LimitRequestHeaders("max buffer headers")
+            else:
+                break
+
+        if done:
+            self.unreader.unread(data[2:])
+            return b""
+
+        self.headers = self.parse_headers(data[:idx], from_trailer=False)
+        return data[idx + 4:]
+
+    def read_line(self, unreader, buf, limit=0):
+        data = buf.getvalue()
+        while True:
+            idx = data.find(b"\r\n")
+            if idx >= 0:
+                if idx > limit > 0:
+                    raise LimitRequestLine(idx, limit)
+                break
+            if len(data) - 2 > limit > 0:
+                raise LimitRequestLine(len(data), limit)
+            self.get_data(unreader, buf)
+            data = buf.getvalue()
+        return (data[:idx], data[idx + 2:])
+
+    def parse_headers(self, data, from_trailer=False):
+        # split into per-line strings and pop them off the front, then hand
+        # the rejoined block to the current validation so that only the
+        # splitting strategy differs between the two parsers
+        lines = [bytes_to_str(line) for line in data.split(b"\r\n")]
+        block = []
+        while lines:
+            block.append(lines.pop(0))
+        return super().parse_headers("\r\n".join(block), from_trailer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000,
+                        help="parses per measurement")
+    args = parser.parse_args()
+
+    cfg = Config()
+    cfg.set("limit_request_fields", 32768)
+
+    print("%8s %8s %14s %14s" % ("headers", "chunk", "legacy (us)", "current (us)"))
+    for nheaders in (10, 100, 1000):
+        data = make_request(nheaders)
+        for chunk in (65536, 512, 64):
+            chunks = split(data, chunk)
+
+            def legacy():
+                LegacyRequest(cfg, IterUnreader(chunks), ("127.0.0.1", 0))
+
+            def current():
+                Request(cfg, IterUnreader(chunks), ("127.0.0.1", 0))
+
+            number = max(1, args.number // nheaders * 10)
+            t_legacy = min(timeit.repeat(legacy, number=number, repeat=3))
+            t_current = min(timeit.repeat(current, number=number, repeat=3))
+            print("%8d %8d %14.1f %14.1f" % (
+                nheaders, chunk,
+                t_legacy / number * 1e6, t_current / number * 1e6))
+
+
+if __name__ == "__main__":
+    main()
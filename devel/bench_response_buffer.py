@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+#
+# Benchmark response_buffer_size with an application yielding many small
+# body items, such as template fragments.
+#
+# Responses are written to one end of a socket pair while a thread drains
+# the other. Socket writes are counted by wrapping the socket.
+#
+#   python devel/bench_response_buffer.py [--items N] [--item-size BYTES]
+
+import argparse
+import socket
+import threading
+import time
+
+from gunicorn.config import Config
+from gunicorn.http.parser import RequestParser
+from gunicorn.http.wsgi import Response
+
+
+class CountingSocket(socket.socket):
+
+    writes = 0
+
+    def sendall(self, data, *args):
+        self.writes += 1
+        return super().sendall(data, *args)
+
+    def sendmsg(self, buffers, *args):
+        self.writes += 1
+        return super().sendmsg(buffers, *args)
+
+
+def drain(sock):
+    while sock.recv(262144):
+        pass
+
+
+def run(cfg, request, items, number):
+    a, b = socket.socketpair()
+    sock = CountingSocket(fileno=a.detach())
+    reader = threading.Thread(target=drain, args=(b,))
+    reader.start()
+
+    start = time.perf_counter()
+    for _ in range(number):
+        req = next(RequestParser(cfg, [request], ("127.0.0.1", 5000)))
+        resp = Response(req, sock, cfg)
+        resp.start_response("200 OK", [("Content-Type", "text/html")])
+        for item in items:
+            resp.write(item)
+        resp.close()
+    elapsed = time.perf_counter() - start
+
+    sock.close()
+    reader.join()
+    b.close()
+    return elapsed, sock.writes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=500,
+                        help="body items per response")
+    parser.add_argument("--item-size", type=int, default=40)
+    parser.add_argument("--number", type=int, default=200,
+                        help="responses per measurement")
+    args = parser.parse_args()
+
+    items = [b"x" * args.item_size] * args.items
+    print("%d items of %d bytes per response" % (args.items, args.item_size))
+    print("%10s %12s %16s %14s" % ("buffer", "http", "writes/response",
+                                  "us/response"))
+    for request, version in ((b"GET / HTTP/1.1\r\n\r\n", "1.1 chunked"),
+                             (b"GET / HTTP/1.0\r\n\r\n", "1.0")):
+        for buffer_size in (0, 4096, 16384, 65536):
+            cfg = Config()
+            cfg.set("response_buffer_size", buffer_size)
+            elapsed, writes = run(cfg, request, items, args.number)
+            print("%10d %12s %16.1f %14.1f" % (
+                buffer_size, version, writes / args.number,
+                elapsed / args.number * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+#
+# Compare requests/second of the worker_loop choices on a hello world
+# application.
+#
+# A single worker is started for each loop and loaded by client processes
+# sending small keep-alive requests over raw sockets.
+#
+#   python devel/bench_worker_loop.py [--worker-class tornado] [--duration 5]
+
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REQUEST = b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n"
+
+
+def app(environ, start_response):
+    body = b"Hello, World!"
+    start_response("200 OK", [("Content-Type", "text/plain"),
+                              ("Content-Length", str(len(body)))])
+    return [body]
+
+
+def client(port, duration, counter):
+    sock = socket.create_connection(("127.0.0.1", port))
+    done = 0
+    buf = b""
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        sock.sendall(REQUEST)
+        while True:
+            idx = buf.find(b"\r\n\r\n")
+            if idx >= 0 and len(buf) >= idx + 4 + 13:
+                buf = buf[idx + 4 + 13:]
+                break
+            data = sock.recv(65536)
+            if not data:
+                raise RuntimeError("connection closed by the server")
+            buf += data
+        done += 1
+    sock.close()
+    with counter.get_lock():
+        counter.value += done
+
+
+def wait_listening(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("gunicorn did not start")
+
+
+def run(worker_class, loop, port, clients, duration):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([HERE, os.path.dirname(HERE),
+                                         env.get("PYTHONPATH", "")])
+    proc = subprocess.Popen([
+        sys.executable, "-m", "gunicorn", "bench_worker_loop:app",
+        "--worker-class", worker_class, "--worker-loop", loop,
+        "--workers", "1", "--bind", "127.0.0.1:%d" % port,
+        "--log-level", "warning"], env=env)
+    try:
+        wait_listening(port)
+        counter = multiprocessing.Value("l", 0)
+        procs = [multiprocessing.Process(target=client,
+                                         args=(port, duration, counter))
+                 for _ in range(clients)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        return counter.value / duration
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--worker-class", default="tornado")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print("%-10s %12s" % ("loop", "requests/s"))
+    for loop in ("asyncio", "uvloop"):
+        if loop == "uvloop" and importlib.util.find_spec("uvloop") is None:
+            print("%-10s %12s" % (loop, "not installed"))
+            continue
+        rps = run(args.worker_class, loop, args.port, args.clients,
+                  args.duration)
+        print("%-10s %12.0f" % (loop, rps))
+
+
+if __name__ == "__main__":
+    main()
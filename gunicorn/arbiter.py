@@ -2,6 +2,9 @@
 # This file is part of gunicorn released under the MIT license.
 # See the NOTICE for more information.
 import errno
+import gc
+import json
+import math
 import os
 import random
 import select
@@ -11,9 +14,15 @@ import time
 import traceback
 import socket
 
+from gunicorn.autoscale import Autoscaler
 from gunicorn.errors import HaltServer, AppImportError
+from gunicorn.http import native
+from gunicorn.instrument.prometheus import MetricsExporter
 from gunicorn.pidfile import Pidfile
 from gunicorn import sock, systemd, util
+from gunicorn.workers.heartbeat import (
+    LATENCY_BUCKETS, PHASE_NAMES, STATS, STATUS_CLASSES, HeartbeatTable
+)
 
 from gunicorn import __version__, SERVER_SOFTWARE
 
@@ -39,6 +48,14 @@ class Arbiter:
     WORKERS = {}
     PIPE = []
 
+    # statsd gauges fed from the worker statistics totals
+    STATS_METRICS = {
+        "in_flight": "gunicorn.in_flight",
+        "keepalive": "gunicorn.keepalive",
+        "requests": "gunicorn.requests_served",
+        "bytes_sent": "gunicorn.bytes_sent",
+    }
+
     # I love dynamic languages
     SIG_QUEUE = []
     SIGNALS = [getattr(signal, "SIG%s" % x)
@@ -54,12 +71,28 @@ class Arbiter:
         self._num_workers = None
         self._last_logged_active_worker_count = None
         self.log = None
+        # counters of the workers that exited
+        self.retired_stats = dict.fromkeys(STATS, 0)
+        self.retired_metrics = self.empty_metrics()
+        # workers that exited, by reason
+        self.worker_exits = dict.fromkeys(("exit", "error", "signal",
+                                           "timeout"), 0)
+        self.stats_listener = None
+        self.metrics_listener = None
+        self.metrics_exporter = MetricsExporter(self)
 
         self.setup(app)
 
+        # shared with the workers, must exist before the first fork
+        self.heartbeat = HeartbeatTable(self.cfg.worker_tmp_dir)
+
         self.pidfile = None
         self.systemd = False
         self.worker_age = 0
+        # workers up to this age belong to the generation replaced on reload
+        self.stale_age = 0
+        self.reload_started = None
+        self.reload_progress = None
         self.reexec_pid = 0
         self.master_pid = 0
         self.master_name = "Master"
@@ -98,7 +131,13 @@ class Arbiter:
 
         self.worker_class = self.cfg.worker_class
         self.address = self.cfg.address
-        self.num_workers = self.cfg.workers
+        self.autoscaler = None
+        if self.cfg.max_workers:
+            self.autoscaler = Autoscaler(
+                self.cfg, self.worker_class.concurrency(self.cfg))
+            self.num_workers = self.autoscaler.clamp(self.cfg.workers)
+        else:
+            self.num_workers = self.cfg.workers
         self.timeout = self.cfg.timeout
         self.proc_name = self.cfg.proc_name
 
@@ -123,6 +162,18 @@ class Arbiter:
         """
         self.log.info("Starting gunicorn %s", __version__)
 
+        if self.cfg.worker_cpus and hasattr(os, "sched_setaffinity"):
+            # workers would fail to boot when pinned to them
+            available = util.available_cpus()
+            unavailable = [cpu for cpu in self.cfg.worker_cpus
+                           if cpu not in available]
+            if unavailable:
+                self.log.error("worker_cpus: CPU %s not available, the "
+                               "available CPUs are %s",
+                               ",".join(str(cpu) for cpu in unavailable),
+                               ",".join(str(cpu) for cpu in available))
+                sys.exit(1)
+
         if 'GUNICORN_PID' in os.environ:
             self.master_pid = int(os.environ.get('GUNICORN_PID'))
             self.proc_name = self.proc_name + ".2"
@@ -155,10 +206,35 @@ class Arbiter:
             if not (self.cfg.reuse_port and hasattr(socket, 'SO_REUSEPORT')):
                 self.LISTENERS = sock.create_sockets(self.cfg, self.log, fds)
 
+        if self.cfg.stats_socket and self.stats_listener is None:
+            self.stats_listener = sock.UnixSocket(self.cfg.stats_socket,
+                                                  self.cfg, self.log)
+        if self.cfg.metrics_bind and self.metrics_listener is None:
+            addr = util.parse_address(self.cfg.metrics_bind)
+            try:
+                self.metrics_listener = sock._sock_type(addr)(addr, self.cfg,
+                                                              self.log)
+            except OSError as e:
+                self.log.error("Metrics exporter not started: %s", e)
+
         listeners_str = ",".join([str(lnr) for lnr in self.LISTENERS])
         self.log.debug("Arbiter booted")
         self.log.info("Listening at: %s (%s)", listeners_str, self.pid)
+        if self.stats_listener is not None:
+            self.log.info("Worker statistics at: %s", self.stats_listener)
+        if self.metrics_listener is not None:
+            self.log.info("Metrics at: %s", self.metrics_listener)
         self.log.info("Using worker: %s", self.cfg.worker_class_str)
+        if native.resolve(self.cfg.http_parser) != self.cfg.http_parser:
+            self.log.warning("HTTP parser %r is not available, using the "
+                             "Python parser", self.cfg.http_parser)
+        if self.cfg.gc_freeze and not self.cfg.preload_app:
+            self.log.warning("gc_freeze has no effect without preload_app")
+        if self.autoscaler is not None and not self.LISTENERS:
+            # with reuse_port the listeners are opened by the workers
+            self.log.warning("Autoscaling with reuse_port only measures the "
+                             "requests in flight, not the connections "
+                             "waiting to be accepted")
         systemd.sd_notify("READY=1\nSTATUS=Gunicorn arbiter booted", self.log)
 
         # check worker class requirements
@@ -200,6 +276,7 @@ class Arbiter:
         util._setproctitle("master [%s]" % self.proc_name)
 
         try:
+            self.prepare_fork()
             self.manage_workers()
 
             while True:
@@ -209,7 +286,9 @@ class Arbiter:
                 if sig is None:
                     self.sleep()
                     self.murder_workers()
+                    self.autoscale()
                     self.manage_workers()
+                    self.publish_stats()
                     continue
 
                 if sig not in self.SIG_NAMES:
@@ -357,10 +436,25 @@ class Arbiter:
         Sleep until PIPE is readable or we timeout.
         A readable PIPE means a signal occurred.
         """
+        fds = [self.PIPE[0]]
+        if self.stats_listener is not None:
+            fds.append(self.stats_listener)
+        if self.metrics_listener is not None:
+            fds.append(self.metrics_listener)
+        # booting workers do not wake the arbiter up, check on them often
+        # when more workers wait to be forked or retired
+        timeout = 1.0
+        if self.booting_workers() and (self.cfg.spawn_batch_size or
+                                       len(self.WORKERS) > self.num_workers):
+            timeout = 0.1
         try:
-            ready = select.select([self.PIPE[0]], [], [], 1.0)
+            ready = select.select(fds, [], [], timeout)
             if not ready[0]:
                 return
+            if self.stats_listener in ready[0]:
+                self.handle_stats_request()
+            if self.metrics_listener in ready[0]:
+                self.metrics_exporter.handle(self.metrics_listener, self.log)
             while os.read(self.PIPE[0], 1):
                 pass
         except OSError as e:
@@ -384,6 +478,12 @@ class Arbiter:
             and not self.cfg.reuse_port
         )
         sock.close_sockets(self.LISTENERS, unlink)
+        if self.stats_listener is not None:
+            sock.close_sockets([self.stats_listener], unlink)
+            self.stats_listener = None
+        if self.metrics_listener is not None:
+            sock.close_sockets([self.metrics_listener], unlink)
+            self.metrics_listener = None
 
         self.LISTENERS = []
         sig = signal.SIGTERM
@@ -480,9 +580,11 @@ class Arbiter:
         # set new proc_name
         util._setproctitle("master [%s]" % self.proc_name)
 
-        # spawn new workers
-        for _ in range(self.cfg.workers):
-            self.spawn_worker()
+        # spawn new workers, the current ones are retired as they boot
+        self.prepare_fork()
+        self.stale_age = self.worker_age
+        self.reload_started = time.monotonic()
+        self.reload_progress = None
 
         # manage workers
         self.manage_workers()
@@ -557,7 +659,15 @@ class Arbiter:
                     worker = self.WORKERS.pop(wpid, None)
                     if not worker:
                         continue
-                    worker.tmp.close()
+                    if worker.aborted:
+                        reason = "timeout"
+                    elif exitcode > 0:
+                        reason = "error"
+                    elif status > 0:
+                        reason = "signal"
+                    else:
+                        reason = "exit"
+                    self.retire_worker(worker, reason)
                     self.cfg.child_exit(self, worker)
         except OSError as e:
             if e.errno != errno.ECHILD:
@@ -568,14 +678,21 @@ class Arbiter:
         Maintain the number of workers by spawning or killing
         as required.
         """
-        if len(self.WORKERS) < self.num_workers:
+        if self.current_workers() < self.num_workers:
             self.spawn_workers()
 
-        workers = self.WORKERS.items()
+        # workers already told to exit finish their requests on their own
+        workers = [w for w in self.WORKERS.items() if not w[1].retiring]
         workers = sorted(workers, key=lambda w: w[1].age)
-        while len(workers) > self.num_workers:
-            (pid, _) = workers.pop(0)
+        # retire the oldest workers, as long as enough booted workers
+        # remain to take over from them
+        booted = sum(1 for _, w in workers if self.worker_booted(w))
+        retire = min(len(workers), booted) - self.num_workers
+        while retire > 0:
+            (pid, worker) = workers.pop(0)
+            worker.retiring = True
             self.kill_worker(pid, signal.SIGTERM)
+            retire -= 1
 
         active_worker_count = len(workers)
         if self._last_logged_active_worker_count != active_worker_count:
@@ -585,11 +702,158 @@ class Arbiter:
                                   "value": active_worker_count,
                                   "mtype": "gauge"})
 
+        if self.reload_started is not None:
+            self.report_reload()
+
+    def report_reload(self):
+        stale = ready = 0
+        for worker in self.WORKERS.values():
+            if worker.age <= self.stale_age:
+                stale += 1
+            elif self.worker_booted(worker):
+                ready += 1
+
+        if (ready, stale) != self.reload_progress:
+            self.reload_progress = (ready, stale)
+            self.log.info("Reloading: %s/%s new workers ready, %s old "
+                          "workers left", ready, self.num_workers, stale,
+                          extra={"metric": "gunicorn.reload.ready",
+                                 "value": ready,
+                                 "mtype": "gauge"})
+            if self.cfg.statsd_host is not None:
+                self.log.debug("", extra={"metric": "gunicorn.reload.stale",
+                                          "value": stale,
+                                          "mtype": "gauge"})
+
+        if not stale and ready >= self.num_workers:
+            duration = time.monotonic() - self.reload_started
+            self.reload_started = None
+            self.log.info("Reload complete in %.2fs", duration,
+                          extra={"metric": "gunicorn.reload.duration",
+                                 "value": duration * 1000,
+                                 "mtype": "histogram"})
+
+    def prepare_fork(self):
+        """\
+        Get the arbiter ready to fork a new generation of workers.
+        """
+        self.cfg.pre_fork_warmup(self)
+        if self.cfg.gc_freeze and self.cfg.preload_app:
+            # on reload, let the previous application be collected. Workers
+            # respawned later share what was frozen here, freezing again
+            # before each fork would need a collection first
+            gc.unfreeze()
+            gc.collect()
+            gc.freeze()
+
+    def retire_worker(self, worker, reason="exit"):
+        # keep the totals of the exited worker, then free its slot
+        self.worker_exits[reason] += 1
+        stats = worker.tmp.stats()
+        for name in ("requests", "bytes_sent"):
+            self.retired_stats[name] += stats[name]
+        self.add_metrics(self.retired_metrics, worker.tmp.metrics())
+        worker.tmp.close()
+
+    @staticmethod
+    def empty_metrics():
+        def histogram():
+            return {"latency": [0] * (len(LATENCY_BUCKETS) + 1),
+                    "latency_sum": 0.0}
+        metrics = histogram()
+        metrics["statuses"] = dict.fromkeys(STATUS_CLASSES, 0)
+        metrics["phases"] = {name: histogram() for name in PHASE_NAMES}
+        return metrics
+
+    @staticmethod
+    def add_metrics(total, metrics):
+        def add_histogram(total, histogram):
+            for i, count in enumerate(histogram["latency"]):
+                total["latency"][i] += count
+            total["latency_sum"] += histogram["latency_sum"]
+        add_histogram(total, metrics)
+        for status, count in metrics["statuses"].items():
+            total["statuses"][status] += count
+        for name, histogram in metrics["phases"].items():
+            add_histogram(total["phases"][name], histogram)
+
+    def worker_stats(self):
+        """\
+        Aggregate the statistics published by the workers.
+
+        The requests served and bytes sent totals include the workers
+        that exited, so that they never go backwards.
+        """
+        total = dict(self.retired_stats)
+        workers = []
+        for pid, worker in sorted(self.WORKERS.items()):
+            stats = worker.tmp.stats()
+            for name, value in stats.items():
+                total[name] += value
+            stats.update(pid=pid, age=worker.age)
+            workers.append(stats)
+        return {"pid": self.pid, "workers": workers, "total": total}
+
+    def worker_metrics(self):
+        """\
+        Aggregate the request latency histograms and the responses per
+        status class published by the workers, including those that
+        exited.
+        """
+        total = self.empty_metrics()
+        self.add_metrics(total, self.retired_metrics)
+        for worker in self.WORKERS.values():
+            self.add_metrics(total, worker.tmp.metrics())
+        return total
+
+    def autoscale(self):
+        if self.autoscaler is None:
+            return
+        demand = self.worker_stats()["total"]["in_flight"]
+        for lnr in self.LISTENERS:
+            demand += sock.accept_queue_length(lnr) or 0
+        num_workers = self.autoscaler.scale(self.num_workers, demand)
+        if num_workers != self.num_workers:
+            self.log.info("Autoscaling from %s to %s workers (demand: %s)",
+                          self.num_workers, num_workers, demand)
+            self.num_workers = num_workers
+
+    def publish_stats(self):
+        if self.cfg.statsd_host is None:
+            return
+        for name, value in self.worker_stats()["total"].items():
+            self.log.debug("", extra={"metric": self.STATS_METRICS[name],
+                                      "value": value,
+                                      "mtype": "gauge"})
+
+    def handle_stats_request(self):
+        try:
+            client, _ = self.stats_listener.accept()
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.ECONNABORTED,
+                               errno.EWOULDBLOCK):
+                raise
+            return
+
+        try:
+            client.settimeout(1.0)
+            data = json.dumps(self.worker_stats()) + "\n"
+            client.sendall(data.encode("utf-8"))
+        except OSError as e:
+            self.log.debug("Failed to send worker statistics: %s", e)
+        finally:
+            util.close(client)
+
     def spawn_worker(self):
         self.worker_age += 1
         worker = self.worker_class(self.worker_age, self.pid, self.LISTENERS,
                                    self.app, self.timeout / 2.0,
                                    self.cfg, self.log)
+        worker.tmp = self.heartbeat.acquire()
+        if self.cfg.worker_cpus:
+            # slots are reused, a replacement worker keeps the same CPU
+            cpus = self.cfg.worker_cpus
+            worker.cpu = cpus[worker.tmp.index % len(cpus)]
         self.cfg.pre_fork(self, worker)
         pid = os.fork()
         if pid != 0:
@@ -597,17 +861,29 @@ class Arbiter:
             self.WORKERS[pid] = worker
             return pid
 
-        # Do not inherit the temporary files of other workers
+        # Do not hold on to the heartbeat slots of other workers
         for sibling in self.WORKERS.values():
             sibling.tmp.close()
+        if self.stats_listener is not None:
+            self.stats_listener.close()
+        if self.metrics_listener is not None:
+            self.metrics_listener.close()
 
         # Process Child
         worker.pid = os.getpid()
         try:
             util._setproctitle("worker [%s]" % self.proc_name)
             self.log.info("Booting worker with pid: %s", worker.pid)
+            if worker.cpu is not None:
+                if util.set_cpu_affinity(worker.cpu):
+                    self.log.debug("Worker %s pinned to CPU %s", worker.pid,
+                                   worker.cpu)
+                else:
+                    worker.cpu = None
             if self.cfg.reuse_port:
                 worker.sockets = sock.create_sockets(self.cfg, self.log)
+                if worker.cpu is not None and self.cfg.incoming_cpu:
+                    sock.set_incoming_cpu(worker.sockets, worker.cpu, self.log)
             self.cfg.post_fork(self, worker)
             worker.init_process()
             sys.exit(0)
@@ -641,10 +917,52 @@ class Arbiter:
         of the master process.
         """
 
-        for _ in range(self.num_workers - len(self.WORKERS)):
+        missing = self.num_workers - self.current_workers()
+        if self.cfg.reload_batch_size and self.reload_started is not None:
+            # rolling reload, replace a few workers at a time
+            surge = self.num_workers + self.cfg.reload_batch_size
+            missing = min(missing, surge - len(self.WORKERS))
+
+        batch_size = self.cfg.spawn_batch_size
+        if batch_size:
+            # fork the next batch once the previous one booted
+            for _ in range(min(missing, batch_size - self.booting_workers())):
+                self.spawn_worker()
+            return
+
+        for _ in range(missing):
             self.spawn_worker()
             time.sleep(0.1 * random.random())
 
+    def current_workers(self):
+        """\
+        Return the number of workers forked since the last reload, and not
+        told to exit.
+        """
+        return sum(1 for w in self.WORKERS.values()
+                   if w.age > self.stale_age and not w.retiring)
+
+    def booting_workers(self):
+        return sum(1 for w in self.WORKERS.values()
+                   if not self.worker_booted(w))
+
+    def worker_booted(self, worker):
+        """\
+        Return whether a worker is ready to serve requests.
+
+        A worker class that does not report it, because its
+        ``init_process()`` does not call the base one, counts as booted
+        from its first heartbeat, or once ``timeout`` seconds passed since
+        it was spawned.
+        """
+        if worker.tmp.booted():
+            return True
+        if worker.tmp.last_update() != math.inf:
+            return True
+        if not self.timeout:
+            return False
+        return time.monotonic() - worker.spawned > self.timeout
+
     def kill_workers(self, sig):
         """\
         Kill all workers with the signal `sig`
@@ -667,7 +985,7 @@ class Arbiter:
             if e.errno == errno.ESRCH:
                 try:
                     worker = self.WORKERS.pop(pid)
-                    worker.tmp.close()
+                    self.retire_worker(worker)
                     self.cfg.worker_exit(self, worker)
                     return
                 except (KeyError, OSError):
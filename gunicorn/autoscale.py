@@ -0,0 +1,70 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+# design:
+# The arbiter samples the demand on its workers on every tick of its main
+# loop: the requests in flight published in the heartbeat table plus the
+# connections waiting in the accept queues. The autoscaler averages the
+# samples over two windows. The short one drives scaling up, so that bursts
+# are absorbed within seconds. The long one drives scaling down, one worker
+# at a time and only while the remaining workers would stay well below the
+# target, so that the number of workers does not flap around it.
+
+import math
+import time
+from collections import deque
+
+
+class Autoscaler:
+
+    # seconds of samples averaged before adding or retiring workers, also
+    # the time left after a change before the next one in that direction
+    scale_up_window = 5
+    scale_down_window = 60
+    # a worker is retired only if the utilization of the remaining ones
+    # would stay this many percent below the target
+    hysteresis = 20
+
+    def __init__(self, cfg, concurrency):
+        self.max_workers = cfg.max_workers
+        self.min_workers = min(max(cfg.min_workers, 1), cfg.max_workers)
+        self.target = cfg.target_utilization / 100.0
+        self.concurrency = max(concurrency, 1)
+        self.samples = deque()
+        self.last_change = time.monotonic()
+
+    def clamp(self, num_workers):
+        return max(self.min_workers, min(self.max_workers, num_workers))
+
+    def average(self, since):
+        demands = [demand for (t, demand) in self.samples if t >= since]
+        return sum(demands) / len(demands)
+
+    def scale(self, num_workers, demand):
+        """\
+        Record the current demand, the number of requests in flight or
+        waiting to be accepted, and return the number of workers to run.
+        """
+        now = time.monotonic()
+        self.samples.append((now, demand))
+        while self.samples[0][0] < now - self.scale_down_window:
+            self.samples.popleft()
+
+        wanted = self.clamp(num_workers)
+        elapsed = now - self.last_change
+
+        recent = self.average(now - self.scale_up_window)
+        if elapsed >= self.scale_up_window and \
+                recent > wanted * self.concurrency * self.target:
+            needed = math.ceil(recent / (self.concurrency * self.target))
+            wanted = self.clamp(max(needed, wanted + 1))
+        elif elapsed >= self.scale_down_window and wanted > self.min_workers:
+            overall = self.average(now - self.scale_down_window)
+            low = self.target * (100 - self.hysteresis) / 100.0
+            if overall < (wanted - 1) * self.concurrency * low:
+                wanted -= 1
+
+        if wanted != num_workers:
+            self.last_change = now
+        return wanted
@@ -19,6 +19,7 @@ import textwrap
 
 from gunicorn import __version__, util
 from gunicorn.errors import ConfigError
+from gunicorn.http.native import PARSERS
 from gunicorn.reloader import reloader_engines
 
 KNOWN_SETTINGS = []
@@ -365,12 +366,28 @@ def validate_pos_int(val):
     return val
 
 
+def validate_percent(val):
+    val = validate_pos_int(val)
+    if not 0 < val <= 100:
+        raise ValueError("Value must be between 1 and 100: %s" % val)
+    return val
+
+
 def validate_ssl_version(val):
     if val != SSLVersion.default:
         sys.stderr.write("Warning: option `ssl_version` is deprecated and it is ignored. Use ssl_context instead.\n")
     return val
 
 
+def validate_worker_tmp_dir(val):
+    val = validate_string(val)
+    if val is not None:
+        sys.stderr.write("Warning: option `worker_tmp_dir` is deprecated. "
+                         "Workers report their heartbeat through shared "
+                         "memory.\n")
+    return val
+
+
 def validate_string(val):
     if val is None:
         return None
@@ -497,6 +514,29 @@ def validate_post_request(val):
         raise TypeError("Value must have an arity of: 4")
 
 
+def validate_cpu_list(val):
+    if val is None:
+        return []
+    if isinstance(val, (list, tuple, set)):
+        return sorted({validate_pos_int(cpu) for cpu in val})
+    val = validate_string(val).strip()
+    if not val:
+        return []
+    if val == "auto":
+        return util.available_cpus()
+
+    # each CPU once, workers are pinned to them by slot
+    cpus = set()
+    for part in val.split(","):
+        first, _, last = part.strip().partition("-")
+        first = validate_pos_int(first)
+        last = validate_pos_int(last) if last else first
+        if last < first:
+            raise ValueError("Invalid CPU range: %s" % part)
+        cpus.update(range(first, last + 1))
+    return sorted(cpus)
+
+
 def validate_chdir(val):
     # valid if the value is a string
     val = validate_string(val)
@@ -657,6 +697,154 @@ class Workers(Setting):
         By default, the value of the ``WEB_CONCURRENCY`` environment variable,
         which is set by some Platform-as-a-Service providers such as Heroku. If
         it is not defined, the default is ``1``.
+
+        When autoscaling is enabled with ``max_workers``, this is the number
+        of workers started with.
+        """
+
+
+class MinWorkers(Setting):
+    name = "min_workers"
+    section = "Worker Processes"
+    cli = ["--min-workers"]
+    meta = "INT"
+    validator = validate_pos_int
+    type = int
+    default = 1
+    desc = """\
+        The lowest number of worker processes the autoscaler scales down to.
+
+        Only used when autoscaling is enabled with ``max_workers``.
+
+        .. versionadded:: 23.1.0
+        """
+
+
+class MaxWorkers(Setting):
+    name = "max_workers"
+    section = "Worker Processes"
+    cli = ["--max-workers"]
+    meta = "INT"
+    validator = validate_pos_int
+    type = int
+    default = 0
+    desc = """\
+        Enable autoscaling of the number of worker processes, up to this
+        many workers.
+
+        Every second the arbiter measures the utilization of the workers:
+        the requests in flight plus the connections waiting in the accept
+        queue of the listeners (on Linux), divided by the number of
+        requests the workers can serve concurrently (1 per ``sync``
+        worker, ``threads`` per ``gthread`` or ``asyncio`` worker,
+        ``worker_connections`` per ``eventlet`` or ``gevent`` worker).
+        With ``reuse_port`` the listeners are opened by the workers and
+        their accept queues are not measured, so connections waiting to be
+        accepted do not add workers.
+
+        Workers are added as soon as the utilization averaged over a few
+        seconds exceeds ``target_utilization``. One worker is gracefully
+        retired at a time, once the utilization averaged over a minute
+        leaves enough room below the target. Manual changes with
+        ``TTIN``/``TTOU`` are overridden by the next scaling decision.
+
+        A value of 0 disables autoscaling.
+
+        .. versionadded:: 23.1.0
+        """
+
+
+class TargetUtilization(Setting):
+    name = "target_utilization"
+    section = "Worker Processes"
+    cli = ["--target-utilization"]
+    meta = "PERCENT"
+    validator = validate_percent
+    type = int
+    default = 70
+    desc = """\
+        The worker utilization, in percent, the autoscaler aims for.
+
+        Only used when autoscaling is enabled with ``max_workers``.
+
+        .. versionadded:: 23.1.0
+        """
+
+
+class SpawnBatchSize(Setting):
+    name = "spawn_batch_size"
+    section = "Worker Processes"
+    cli = ["--spawn-batch-size"]
+    meta = "INT"
+    validator = validate_pos_int
+    type = int
+    default = 0
+    desc = """\
+        Fork up to this many workers at once, then wait for them to boot
+        before forking more.
+
+        Workers in a batch are forked back to back, without the random
+        delay of up to 100ms otherwise left between two forks, and the
+        arbiter checks on booting workers every 100ms to fork the next
+        batch. A worker has booted once its application is loaded and
+        ``post_worker_init`` returned. A worker class that does not report
+        it counts as booted from its first heartbeat, or after ``timeout``
+        seconds.
+
+        A value of 0 forks all the missing workers at once, with the random
+        delay between them.
+
+        Whatever the value, on reload or when the number of workers is
+        reduced, a worker is only retired once enough booted workers remain
+        to replace it.
+
+        .. versionadded:: 23.1.0
+        """
+
+
+class ReloadBatchSize(Setting):
+    name = "reload_batch_size"
+    section = "Worker Processes"
+    cli = ["--reload-batch-size"]
+    meta = "INT"
+    validator = validate_pos_int
+    type = int
+    default = 0
+    desc = """\
+        Replace the workers this many at a time on reload (``HUP``).
+
+        The arbiter forks up to this many new workers, waits for them to
+        boot (and serve ``warmup_path``), then gracefully stops as many old
+        workers. The next ones are forked once the old workers exited, so
+        that no more than ``workers`` plus this many workers run at once.
+        Progress is logged and sent to statsd as the
+        ``gunicorn.reload.ready`` and ``gunicorn.reload.stale`` gauges.
+
+        A value of 0 forks the whole new generation at once. Old workers
+        are still only stopped as new ones boot.
+
+        .. versionadded:: 23.1.0
+        """
+
+
+class WarmupPath(Setting):
+    name = "warmup_path"
+    section = "Worker Processes"
+    cli = ["--warmup-path"]
+    meta = "PATH"
+    validator = validate_string
+    default = None
+    desc = """\
+        A path every worker requests from the application itself, once it
+        is loaded and before the worker reports that it booted.
+
+        The request is a ``GET`` served in-process without a client, its
+        environ has ``gunicorn.warmup`` set to ``True``. Use it to run the
+        lazy initialization of the application before new workers take
+        over from old ones. A failing request is logged and does not stop
+        the worker from booting.
+
+        .. versionadded:: 23.1.0
         """
 
 
@@ -686,6 +874,8 @@ class WorkerClass(Setting):
           ``pip install gunicorn[tornado]``)
         * ``gthread``  - Python 2 requires the futures package to be installed
           (or install it via ``pip install gunicorn[gthread]``)
+        * ``asyncio``  - Runs on the standard library asyncio event loop,
+          the application is called from a pool of ``threads``
 
         Optionally, you can provide your own worker by giving Gunicorn a
         Python path to a subclass of ``gunicorn.workers.base.Worker``.
@@ -713,7 +903,7 @@ class WorkerThreads(Setting):
 
         If it is not defined, the default is ``1``.
 
-        This setting only affects the Gthread worker type.
+        This setting only affects the Gthread and asyncio worker types.
 
         .. note::
            If you try to use the ``sync`` worker type and set the ``threads``
@@ -733,7 +923,40 @@ class WorkerConnections(Setting):
     desc = """\
         The maximum number of simultaneous clients.
 
-        This setting only affects the ``gthread``, ``eventlet`` and ``gevent`` worker types.
+        This setting only affects the ``gthread``, ``asyncio``, ``eventlet`` and ``gevent``
+        worker types.
+        """
+
+
+def validate_worker_loop(val):
+    val = validate_string(val)
+    if val not in ("auto", "asyncio", "uvloop"):
+        raise ConfigError("Invalid worker_loop: %r" % val)
+    return val
+
+
+class WorkerLoop(Setting):
+    name = "worker_loop"
+    section = "Worker Processes"
+    cli = ["--worker-loop"]
+    meta = "STRING"
+    validator = validate_worker_loop
+    default = "asyncio"
+    desc = """\
+        The event loop used by the ``asyncio`` and ``tornado`` worker types.
+
+        Valid loops are:
+
+        * ``'asyncio'`` - the standard library event loop
+        * ``'uvloop'`` - the libuv based loop from ``uvloop``, falling back
+          to ``asyncio`` with a warning if it is not installed
+        * ``'auto'`` - ``uvloop`` if it is installed, ``asyncio`` otherwise
+
+        The loop is installed as the asyncio event loop policy when the worker
+        process starts. The ``tornado`` worker requires tornado >= 5.0 to use
+        it.
+
+        .. versionadded:: 23.1.0
         """
 
 
@@ -1019,6 +1242,32 @@ class PreloadApp(Setting):
         """
 
 
+class GCFreeze(Setting):
+    name = "gc_freeze"
+    section = "Server Mechanics"
+    cli = ["--gc-freeze"]
+    validator = validate_bool
+    action = "store_true"
+    default = False
+    desc = """\
+        Freeze the objects of the arbiter with ``gc.freeze()`` before forking
+        workers, when the arbiter starts and on each reload.
+
+        The cyclic garbage collector of a worker writes to every object it
+        examines, which copies the memory pages the worker shares with the
+        arbiter. Frozen objects are left out of collections, so the
+        application loaded with ``preload_app`` stays shared between the
+        workers. A full collection runs first, so that garbage is not frozen
+        along with the application.
+
+        Objects frozen in the arbiter are never collected as cyclic garbage.
+        Without ``preload_app`` the workers load the application themselves,
+        so this setting has no effect.
+
+        .. versionadded:: 23.1.0
+        """
+
+
 class Sendfile(Setting):
     name = "sendfile"
     section = "Server Mechanics"
@@ -1053,10 +1302,57 @@ class ReusePort(Setting):
     desc = """\
         Set the ``SO_REUSEPORT`` flag on the listening socket.
 
+        Where ``SO_REUSEPORT`` is available, every worker binds a listening
+        socket of its own and the kernel shards incoming connections between
+        them, instead of waking every worker waiting on a shared socket.
+
         .. versionadded:: 19.8
         """
 
 
+class WorkerCPUs(Setting):
+    name = "worker_cpus"
+    section = "Server Mechanics"
+    cli = ["--worker-cpus"]
+    meta = "CPUS"
+    validator = validate_cpu_list
+    default = None
+    desc = """\
+        Pin each worker to one CPU of this set, with ``os.sched_setaffinity``.
+
+        A comma separated list of CPU numbers and ranges, such as ``0-3,8``,
+        or ``auto`` for the CPUs the arbiter may run on. Workers are
+        assigned the CPUs in turn, and a worker replacing one that exited
+        usually gets the same CPU. Combined with ``reuse_port``, each CPU
+        serves the connections of its own listening sockets. Gunicorn
+        refuses to start when a CPU of the list is not available to it.
+
+        Ignored on platforms without ``os.sched_setaffinity``.
+
+        .. versionadded:: 23.1.0
+        """
+
+
+class IncomingCPU(Setting):
+    name = "incoming_cpu"
+    section = "Server Mechanics"
+    cli = ["--incoming-cpu"]
+    validator = validate_bool
+    action = "store_true"
+    default = False
+    desc = """\
+        Set ``SO_INCOMING_CPU`` on the listening sockets of pinned workers.
+
+        With ``reuse_port`` and ``worker_cpus``, the Linux kernel then
+        prefers to queue a connection on the socket of the worker running on
+        the CPU that received it, keeping its processing cache-local. This
+        works best when network interrupts are spread over the same CPUs as
+        the workers.
+
+        .. versionadded:: 23.1.0
+        """
+
+
 class Chdir(Setting):
     name = "chdir"
     section = "Server Mechanics"
@@ -1131,20 +1427,21 @@ class WorkerTmpDir(Setting):
     section = "Server Mechanics"
     cli = ["--worker-tmp-dir"]
     meta = "DIR"
-    validator = validate_string
+    validator = validate_worker_tmp_dir
     default = None
     desc = """\
         A directory to use for the worker heartbeat temporary file.
 
         If not set, the default temporary directory will be used.
 
-        .. note::
-           The current heartbeat system involves calling ``os.fchmod`` on
-           temporary file handlers and may block a worker for arbitrary time
-           if the directory is on a disk-backed filesystem.
+        .. versionchanged:: 23.1.0
+           Workers report their heartbeat through memory shared with the
+           arbiter. When this setting is given, that memory is backed by
+           unlinked files in this directory instead of anonymous memory.
 
-           See :ref:`blocking-os-fchmod` for more detailed information
-           and a solution for avoiding this problem.
+        .. deprecated:: 23.1.0
+           The heartbeat no longer touches a file on every notification, so
+           there is no need to point this at a memory-backed filesystem.
         """
 
 
@@ -1418,6 +1715,16 @@ class AccessLogFormat(Setting):
         M            request time in milliseconds
         D            request time in microseconds
         L            request time in decimal seconds
+        Dq           time from accept to the first bytes of the request
+                     read, in microseconds
+        Dp           time reading and parsing the request head, in
+                     microseconds
+        Dd           time from the parsed head to the application call,
+                     in microseconds
+        Da           time from the application call to the first bytes of
+                     the response sent, in microseconds
+        Dw           time sending the rest of the response, in
+                     microseconds
         p            process ID
         {header}i    request header
         {header}o    response header
@@ -1431,6 +1738,59 @@ class AccessLogFormat(Setting):
         """
 
 
+class AccessLogQueueSize(Setting):
+    name = "access_log_queue_size"
+    section = "Logging"
+    cli = ["--access-log-queue-size"]
+    meta = "INT"
+    validator = validate_pos_int
+    type = int
+    default = 0
+    desc = """\
+        The number of access log records buffered in each worker.
+
+        When set, the access log is written by a background thread of
+        each worker instead of the thread serving the request. Records
+        wait in a queue of at most this size and are written in batches,
+        so that a slow disk or syslog server does not delay responses.
+
+        ``0`` writes each record when its request completes.
+
+        .. versionadded:: 23.1.0
+        """
+
+
+def validate_access_log_overflow(val):
+    val = validate_string(val)
+    if val not in ("block", "drop", "sample"):
+        raise ConfigError("Invalid access_log_overflow: %r" % val)
+    return val
+
+
+class AccessLogOverflow(Setting):
+    name = "access_log_overflow"
+    section = "Logging"
+    cli = ["--access-log-overflow"]
+    meta = "STRING"
+    validator = validate_access_log_overflow
+    default = "block"
+    desc = """\
+        What to do with access log records once the queue is full.
+
+        Only used when ``access_log_queue_size`` is set.
+
+        * ``block`` - wait for the background thread to make room
+        * ``drop`` - drop the record
+        * ``sample`` - drop a growing share of the records once the queue
+          is half full, and every record once it is full
+
+        Dropped records are counted in the ``gunicorn.access_log.dropped``
+        metric and reported in the error log.
+
+        .. versionadded:: 23.1.0
+        """
+
+
 class ErrorLog(Setting):
     name = "errorlog"
     section = "Logging"
@@ -1693,6 +2053,97 @@ class StatsdPrefix(Setting):
     """
 
 
+class StatsdFlushInterval(Setting):
+    name = "statsd_flush_interval"
+    section = "Logging"
+    cli = ["--statsd-flush-interval"]
+    meta = "INT"
+    validator = validate_pos_int
+    type = int
+    default = 0
+    desc = """\
+    Aggregate statsd metrics and send them every this many seconds.
+
+    Counters are summed and gauges keep their last value. The values of
+    timers are sent as timings for the statsd server to aggregate, up to
+    512 per timer and interval: past that a random sample of them is sent
+    with its sample rate. Metrics are packed in datagrams of at most
+    ``statsd_max_packet_size`` bytes.
+
+    ``0`` sends every metric in its own datagram as it is recorded.
+
+    .. versionadded:: 23.1.0
+    """
+
+
+class StatsdMaxPacketSize(Setting):
+    name = "statsd_max_packet_size"
+    section = "Logging"
+    cli = ["--statsd-max-packet-size"]
+    meta = "INT"
+    validator = validate_pos_int
+    type = int
+    default = 1432
+    desc = """\
+    The largest datagram sent to statsd when ``statsd_flush_interval`` is
+    set.
+
+    The default fits in the MTU of most networks. Raise it up to 8192 with
+    a statsd server on the loopback interface or a unix socket.
+
+    .. versionadded:: 23.1.0
+    """
+
+
+class StatsSocket(Setting):
+    name = "stats_socket"
+    section = "Logging"
+    cli = ["--stats-socket"]
+    meta = "PATH"
+    validator = validate_string
+    default = None
+    desc = """\
+    A Unix socket path on which the arbiter publishes worker statistics.
+
+    Every connection receives a JSON snapshot of the live counters of each
+    worker (requests in flight, idle keep-alive connections, requests
+    served and response body bytes sent) along with their totals, then the
+    socket is closed. For example::
+
+        $ nc -U /run/gunicorn/stats.sock
+
+    The same totals are sent as gauges to statsd when ``statsd_host`` is
+    set.
+
+    .. versionadded:: 23.1.0
+    """
+
+
+class MetricsBind(Setting):
+    name = "metrics_bind"
+    section = "Logging"
+    cli = ["--metrics-bind"]
+    meta = "ADDRESS"
+    validator = validate_string
+    default = None
+    desc = """\
+    The address on which the arbiter serves metrics to Prometheus.
+
+    The address has the form of a ``bind`` address, for example
+    ``127.0.0.1:9101`` or ``unix:/run/gunicorn/metrics.sock``. Metrics are
+    served at ``/metrics`` in the Prometheus text format, or in the
+    OpenMetrics format when the scraper asks for it.
+
+    They include the number of workers and their restarts, the requests in
+    flight and served per status class, request latency histograms, overall
+    and per phase of the requests, the busy state of each worker and the
+    length of the accept queue of each listener on Linux. They are read
+    from the memory shared with the workers, scrapes never reach them.
+
+    .. versionadded:: 23.1.0
+    """
+
+
 class Procname(Setting):
     name = "proc_name"
     section = "Process Naming"
@@ -1819,6 +2270,28 @@ class Prefork(Setting):
         """
 
 
+class PreforkWarmup(Setting):
+    name = "pre_fork_warmup"
+    section = "Server Hooks"
+    validator = validate_callable(1)
+    type = callable
+
+    def pre_fork_warmup(server):
+        pass
+    default = staticmethod(pre_fork_warmup)
+    desc = """\
+        Called in the arbiter once the application is loaded, before the
+        workers are forked, and again before a new generation of workers is
+        forked on reload.
+
+        Use it to import lazily loaded modules and fill caches, so that the
+        workers share them instead of loading them each. The callable needs
+        to accept a single instance variable for the Arbiter.
+
+        .. versionadded:: 23.1.0
+        """
+
+
 class Postfork(Setting):
     name = "post_fork"
     section = "Server Hooks"
@@ -1942,6 +2415,29 @@ class PostRequest(Setting):
         """
 
 
+class TraceRequest(Setting):
+    name = "trace_request"
+    section = "Server Hooks"
+    validator = validate_callable(3)
+    type = callable
+
+    def trace_request(worker, req, timings):
+        pass
+    default = staticmethod(trace_request)
+    desc = """\
+        Called after a worker processed a request, with its timings.
+
+        The callable needs to accept three instance variables for the Worker,
+        the Request and its ``RequestTimings``. Their ``accepted``,
+        ``first_byte``, ``head_parsed``, ``app_started``,
+        ``first_byte_sent`` and ``done`` attributes hold the
+        ``time.monotonic()`` timestamps of each step, or ``None``, and
+        ``phases()`` returns the duration of the phases between them.
+
+        .. versionadded:: 23.1.0
+        """
+
+
 class ChildExit(Setting):
     name = "child_exit"
     section = "Server Hooks"
@@ -2440,3 +2936,62 @@ class HeaderMap(Setting):
 
         .. versionadded:: 22.0.0
         """
+
+
+def validate_http_parser(val):
+    val = validate_string(val)
+    if val not in PARSERS:
+        raise ConfigError("Invalid http_parser: %r" % val)
+    return val
+
+
+class HTTPParser(Setting):
+    name = "http_parser"
+    section = "Server Mechanics"
+    cli = ["--http-parser"]
+    meta = "STRING"
+    validator = validate_http_parser
+    default = "python"
+    desc = """\
+        The HTTP request parser backend.
+
+        * ``python`` - the pure Python parser.
+        * ``httptools`` - parse the request line and headers with the
+          compiled llhttp parser from ``httptools``, if it is installed.
+
+        The limits on the request line and headers, and all of the header
+        handling rules above, are still applied by Gunicorn. A request the
+        compiled parser refuses, or would read differently, is parsed again
+        by the Python parser, so both backends accept and reject the same
+        requests. If the selected backend is not installed, the Python
+        parser is used.
+
+        .. versionadded:: 23.1.0
+        """
+
+
+class ResponseBufferSize(Setting):
+    name = "response_buffer_size"
+    section = "Server Mechanics"
+    cli = ["--response-buffer-size"]
+    meta = "INT"
+    validator = validate_pos_int
+    type = int
+    default = 0
+    desc = """\
+        Coalesce response body items into writes of at least this many
+        bytes.
+
+        Applications returning iterables that yield many small byte strings
+        otherwise cause one write, and possibly one packet, per item. Body
+        data is held back until the buffer reaches this size, the
+        application yields an empty byte string, or the response ends.
+        ``Content-Length`` truncation and chunked encoding are applied as
+        usual, with one chunk per flushed buffer.
+
+        A value of 0 disables buffering. Leave it disabled for applications
+        streaming partial responses, such as server-sent events, unless
+        they yield an empty byte string after each event.
+
+        .. versionadded:: 23.1.0
+        """
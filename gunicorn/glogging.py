@@ -2,6 +2,7 @@
 # This file is part of gunicorn released under the MIT license.
 # See the NOTICE for more information.
 
+import atexit
 import base64
 import binascii
 import json
@@ -11,6 +12,9 @@ logging.Logger.manager.emittedNoHandlerWarning = 1  # noqa
 from logging.config import dictConfig
 from logging.config import fileConfig
 import os
+import queue
+import random
+import re
 import socket
 import sys
 import threading
@@ -115,6 +119,293 @@ class SafeAtoms(dict):
             return '-'
 
 
+# design:
+# access_log_format is compiled once into the list of the atoms it
+# references, each with a function computing it from the request. Only
+# those are computed for each request, instead of the dict of all the
+# atoms, headers and environ variables built by Logger.atoms(). Loggers
+# overriding atoms() or atoms_wrapper_class keep the full dict.
+
+ACCESS_LOG_ATOM_RE = re.compile(r"%\(([^)]*)\)")
+
+
+def _status(resp):
+    status = resp.status
+    if isinstance(status, str):
+        status = status.split(None, 1)[0]
+    return status
+
+
+def _headers(headers):
+    if hasattr(headers, "headers"):
+        headers = headers.headers
+    if hasattr(headers, "items"):
+        headers = headers.items()
+    return headers
+
+
+def _lookup(items, name):
+    # the last of the values whose lowercased name matches, as the dict
+    # built by Logger.atoms() would keep
+    value = "-"
+    for k, v in items:
+        if k.lower() == name:
+            value = v
+    return value
+
+
+ACCESS_LOG_ATOMS = {
+    'h': lambda log, resp, req, environ, rt: environ.get('REMOTE_ADDR', '-'),
+    'l': lambda log, resp, req, environ, rt: '-',
+    'u': lambda log, resp, req, environ, rt: log._get_user(environ) or '-',
+    't': lambda log, resp, req, environ, rt: log.now(),
+    'r': lambda log, resp, req, environ, rt: "%s %s %s" % (
+        environ['REQUEST_METHOD'], environ['RAW_URI'],
+        environ["SERVER_PROTOCOL"]),
+    's': lambda log, resp, req, environ, rt: _status(resp),
+    'm': lambda log, resp, req, environ, rt: environ.get('REQUEST_METHOD'),
+    'U': lambda log, resp, req, environ, rt: environ.get('PATH_INFO'),
+    'q': lambda log, resp, req, environ, rt: environ.get('QUERY_STRING'),
+    'H': lambda log, resp, req, environ, rt: environ.get('SERVER_PROTOCOL'),
+    'b': lambda log, resp, req, environ, rt: (
+        getattr(resp, 'sent', None) is not None and str(resp.sent) or '-'),
+    'B': lambda log, resp, req, environ, rt: getattr(resp, 'sent', None),
+    'f': lambda log, resp, req, environ, rt: environ.get('HTTP_REFERER', '-'),
+    'a': lambda log, resp, req, environ, rt: environ.get('HTTP_USER_AGENT', '-'),
+    'T': lambda log, resp, req, environ, rt: rt.seconds,
+    'D': lambda log, resp, req, environ, rt: (
+        (rt.seconds * 1000000) + rt.microseconds),
+    'M': lambda log, resp, req, environ, rt: (
+        (rt.seconds * 1000) + int(rt.microseconds / 1000)),
+    'L': lambda log, resp, req, environ, rt: "%d.%06d" % (rt.seconds,
+                                                          rt.microseconds),
+    'p': lambda log, resp, req, environ, rt: "<%s>" % os.getpid(),
+}
+
+
+def _request_header(name):
+    return lambda log, resp, req, environ, rt: _lookup(_headers(req), name)
+
+
+def _response_header(name):
+    return lambda log, resp, req, environ, rt: _lookup(_headers(resp), name)
+
+
+def _environ_variable(name):
+    return lambda log, resp, req, environ, rt: _lookup(environ.items(), name)
+
+
+def _phase(req, name):
+    # in microseconds, as D
+    timings = getattr(req, "timings", None)
+    duration = timings.phase(name) if timings is not None else None
+    if duration is None:
+        return '-'
+    return int(duration * 1000000)
+
+
+# the phases of the request, see gunicorn.http.timings
+PHASE_ATOMS = {
+    'Dq': "queue",
+    'Dp': "parse",
+    'Dd': "dispatch",
+    'Da': "app",
+    'Dw': "write",
+}
+
+
+def _phase_atom(name):
+    return lambda log, resp, req, environ, rt: _phase(req, name)
+
+
+ACCESS_LOG_ATOMS.update({key: _phase_atom(name)
+                         for key, name in PHASE_ATOMS.items()})
+
+
+def _missing(log, resp, req, environ, rt):
+    return '-'
+
+
+class AccessLogFormat:
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.atoms = []
+        for key in dict.fromkeys(ACCESS_LOG_ATOM_RE.findall(fmt)):
+            self.atoms.append((key, self.compile_atom(key)))
+
+    @staticmethod
+    def compile_atom(key):
+        if key.startswith("{"):
+            kl = key.lower()
+            name = kl[1:-2]
+            if kl.endswith("}i"):
+                return _request_header(name)
+            elif kl.endswith("}o"):
+                return _response_header(name)
+            elif kl.endswith("}e"):
+                return _environ_variable(name)
+            return _missing
+        return ACCESS_LOG_ATOMS.get(key, _missing)
+
+    def __call__(self, log, resp, req, environ, request_time):
+        """\
+        Return the atoms referenced by the format, escaped as SafeAtoms
+        does.
+        """
+        atoms = {}
+        for key, atom in self.atoms:
+            value = atom(log, resp, req, environ, request_time)
+            if isinstance(value, str):
+                value = value.replace('"', '\\"')
+            atoms[key] = value
+        return atoms
+
+
+# design:
+# With access_log_queue_size set, the thread serving a request only builds
+# the log record and puts it in a bounded queue. A daemon thread started
+# in each worker on its first access log drains the queue, formats the
+# records and hands them to the handlers of the access logger. The records
+# queued at once are joined into a single write for plain stream and file
+# handlers, other handlers, the rotating ones included, get them one by
+# one through handle(). The thread is started
+# lazily because threads do not survive the fork of the workers, and the
+# queue is drained at exit.
+
+BATCHED_HANDLERS = (logging.StreamHandler, logging.FileHandler)
+
+
+class AccessLogQueue:
+
+    # records taken from the queue at once
+    batch_size = 512
+    # seconds between two reports of dropped records
+    report_interval = 10
+
+    def __init__(self, logger, log, maxsize, overflow):
+        self.logger = logger
+        self.log = log
+        self.overflow = overflow
+        self.queue = queue.Queue(maxsize)
+        self.pid = os.getpid()
+        self.dropped = 0
+        self.reported = 0
+        self.last_report = time.monotonic()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run,
+                                       name="gunicorn-access-log",
+                                       daemon=True)
+
+    def start(self):
+        self.thread.start()
+        atexit.register(self.close)
+
+    def put(self, record):
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+
+        if self.overflow == "sample":
+            # random early drop: from none of the records when the queue is
+            # half full to all of them when it is full
+            fill = self.queue.qsize() / self.queue.maxsize
+            if fill > 0.5 and random.random() < (fill - 0.5) * 2:
+                self.drop()
+                return
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.drop()
+
+    def drop(self):
+        with self.lock:
+            self.dropped += 1
+
+    def close(self):
+        if not self.thread.is_alive():
+            return
+        self.queue.put(None)
+        self.thread.join(5)
+        self.report()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            if batch:
+                try:
+                    self.write(batch)
+                except Exception:
+                    self.log.exception("Error writing the access log")
+            if stop:
+                return
+            if time.monotonic() - self.last_report >= self.report_interval:
+                self.report()
+
+    def handlers(self):
+        # the handlers logging.Logger.callHandlers() would call
+        log = self.logger
+        while log:
+            yield from log.handlers
+            if not log.propagate:
+                break
+            log = log.parent
+
+    def write(self, batch):
+        batch = [r for r in batch if self.logger.filter(r)]
+        for handler in self.handlers():
+            records = [r for r in batch
+                       if r.levelno >= handler.level and handler.filter(r)]
+            if not records:
+                continue
+
+            # only the plain handlers are written to directly, the others
+            # rotate, reopen or otherwise extend emit()
+            if type(handler) not in BATCHED_HANDLERS or \
+                    handler.stream is None:
+                for record in records:
+                    handler.handle(record)
+                continue
+
+            handler.acquire()
+            try:
+                lines = []
+                for record in records:
+                    try:
+                        lines.append(handler.format(record) + handler.terminator)
+                    except Exception:
+                        handler.handleError(record)
+                handler.stream.write("".join(lines))
+                handler.flush()
+            except Exception:
+                handler.handleError(records[-1])
+            finally:
+                handler.release()
+
+    def report(self):
+        self.last_report = time.monotonic()
+        with self.lock:
+            dropped = self.dropped - self.reported
+            self.reported = self.dropped
+        if dropped:
+            self.log.log(logging.WARNING,
+                         "Dropped %d access log records, the queue is full",
+                         dropped,
+                         extra={"metric": "gunicorn.access_log.dropped",
+                                "value": dropped,
+                                "mtype": "counter"})
+
+
 def parse_syslog_address(addr):
 
     # unix domain socket type depends on backend
@@ -188,6 +479,8 @@ class Logger:
         self.error_handlers = []
         self.access_handlers = []
         self.logfile = None
+        self.access_queue = None
+        self.access_format = None
         self.lock = threading.Lock()
         self.cfg = cfg
         self.setup(cfg)
@@ -316,6 +609,8 @@ class Logger:
             'L': "%d.%06d" % (request_time.seconds, request_time.microseconds),
             'p': "<%s>" % os.getpid()
         }
+        for key, name in PHASE_ATOMS.items():
+            atoms[key] = _phase(req, name)
 
         # add request headers
         if hasattr(req, 'headers'):
@@ -351,18 +646,59 @@ class Logger:
            (self.cfg.syslog and not self.cfg.disable_redirect_access_to_syslog)):
             return
 
-        # wrap atoms:
-        # - make sure atoms will be test case insensitively
-        # - if atom doesn't exist replace it by '-'
-        safe_atoms = self.atoms_wrapper_class(
-            self.atoms(resp, req, environ, request_time)
-        )
+        access_format = self._get_access_format()
+        if access_format is not None:
+            safe_atoms = access_format(self, resp, req, environ, request_time)
+        else:
+            # wrap atoms:
+            # - make sure atoms will be test case insensitively
+            # - if atom doesn't exist replace it by '-'
+            safe_atoms = self.atoms_wrapper_class(
+                self.atoms(resp, req, environ, request_time)
+            )
 
         try:
-            self.access_log.info(self.cfg.access_log_format, safe_atoms)
+            access_queue = self._get_access_queue()
+            if access_queue is None:
+                self.access_log.info(self.cfg.access_log_format, safe_atoms)
+            elif self.access_log.isEnabledFor(logging.INFO):
+                access_queue.put(self.access_log.makeRecord(
+                    self.access_log.name, logging.INFO, "(unknown file)", 0,
+                    self.cfg.access_log_format, (safe_atoms,), None))
         except Exception:
             self.error(traceback.format_exc())
 
+    def _get_access_format(self):
+        if type(self).atoms is not Logger.atoms or \
+                self.atoms_wrapper_class is not SafeAtoms:
+            return None
+
+        fmt = self.cfg.access_log_format
+        access_format = self.access_format
+        if access_format is None or access_format.fmt != fmt:
+            access_format = self.access_format = AccessLogFormat(fmt)
+        if not access_format.atoms:
+            # logging only formats a non empty dict as a mapping
+            return None
+        return access_format
+
+    def _get_access_queue(self):
+        if self.cfg.access_log_queue_size <= 0:
+            return None
+
+        access_queue = self.access_queue
+        if access_queue is None or access_queue.pid != os.getpid():
+            with self.lock:
+                access_queue = self.access_queue
+                if access_queue is None or access_queue.pid != os.getpid():
+                    access_queue = AccessLogQueue(
+                        self.access_log, self,
+                        self.cfg.access_log_queue_size,
+                        self.cfg.access_log_overflow)
+                    access_queue.start()
+                    self.access_queue = access_queue
+        return access_queue
+
     def now(self):
         """ return date in Apache Common Log Format """
         return time.strftime('[%d/%b/%Y:%H:%M:%S %z]')
@@ -8,12 +8,34 @@ import sys
 from gunicorn.http.errors import (NoMoreData, ChunkMissingTerminator,
                                   InvalidChunkSize)
 
+HEXDIGITS = b"0123456789abcdefABCDEF"
+
+# chunk-size lines longer than this (extensions included) are left to the
+# general parser
+MAX_CHUNK_SIZE_LINE = 64
+
+# Body.read() without a size reads in steps growing between these bounds
+READ_SIZE_MIN = 8192
+READ_SIZE_MAX = 1024 * 1024
+
 
 class ChunkedReader:
+    """\
+    Decode a chunked body in place over the unreader's buffer.
+
+    Chunk-size lines, chunk terminators and trailers are located in the
+    shared buffer without copying it, and payload bytes are copied out
+    exactly once, into the caller's buffer when using ``readinto()``.
+    """
+
     def __init__(self, req, unreader):
         self.req = req
-        self.parser = self.parse_chunked(unreader)
-        self.buf = io.BytesIO()
+        self.unreader = unreader
+        # payload bytes left in the current chunk
+        self.chunk_left = 0
+        # a chunk was read, its CRLF terminator is still pending
+        self.pending_terminator = False
+        self.finished = False
 
     def read(self, size):
         if not isinstance(size, int):
@@ -23,75 +45,155 @@ class ChunkedReader:
         if size == 0:
             return b""
 
-        if self.parser:
-            while self.buf.tell() < size:
-                try:
-                    self.buf.write(next(self.parser))
-                except StopIteration:
-                    self.parser = None
-                    break
-
-        data = self.buf.getvalue()
-        ret, rest = data[:size], data[size:]
-        self.buf = io.BytesIO()
-        self.buf.write(rest)
-        return ret
-
-    def parse_trailers(self, unreader, data):
-        buf = io.BytesIO()
-        buf.write(data)
-
-        idx = buf.getvalue().find(b"\r\n\r\n")
-        done = buf.getvalue()[:2] == b"\r\n"
-        while idx < 0 and not done:
-            self.get_data(unreader, buf)
-            idx = buf.getvalue().find(b"\r\n\r\n")
-            done = buf.getvalue()[:2] == b"\r\n"
-        if done:
-            unreader.unread(buf.getvalue()[2:])
-            return b""
-        self.req.trailers = self.req.parse_headers(buf.getvalue()[:idx], from_trailer=True)
-        unreader.unread(buf.getvalue()[idx + 4:])
+        ret = []
+        unreader = self.unreader
+        while size > 0:
+            spans, end = self.scan_buffered(size)
+            if end > unreader.pos:
+                with memoryview(unreader.buf) as view:
+                    data = b"".join([view[start:stop] for start, stop in spans])
+                ret.append(data)
+                size -= len(data)
+                unreader.consume(end - unreader.pos)
+                continue
+            if not self.next_chunk():
+                break
+            if not unreader.buffered():
+                self.get_data(unreader)
+        return b"".join(ret)
 
-    def parse_chunked(self, unreader):
-        (size, rest) = self.parse_chunk_size(unreader)
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        unreader = self.unreader
+        nread = 0
+        while nread < len(view):
+            spans, end = self.scan_buffered(len(view) - nread)
+            if end > unreader.pos:
+                with memoryview(unreader.buf) as src:
+                    for start, stop in spans:
+                        n = stop - start
+                        view[nread:nread + n] = src[start:stop]
+                        nread += n
+                unreader.consume(end - unreader.pos)
+                continue
+            if not self.next_chunk():
+                break
+            end = nread + min(len(view) - nread, self.chunk_left)
+            n = unreader.readinto(view[nread:end])
+            if not n:
+                raise NoMoreData()
+            self.chunk_left -= n
+            nread += n
+        return nread
+
+    def scan_buffered(self, size):
+        """\
+        Locate up to ``size`` payload bytes already in the buffer.
+
+        Walks over every complete chunk header in the buffer without
+        consuming anything and returns the payload spans together with the
+        buffer offset reached. Anything unusual (chunk extensions, the last
+        chunk, a short or malformed header) stops the scan and is left to
+        ``next_chunk()``, which reports errors and reads more data.
+        """
+        buf = self.unreader.buf
+        pos = self.unreader.pos
+        end = len(buf)
+        spans = []
         while size > 0:
-            while size > len(rest):
-                size -= len(rest)
-                yield rest
-                rest = unreader.read()
-                if not rest:
-                    raise NoMoreData()
-            yield rest[:size]
-            # Remove \r\n after chunk
-            rest = rest[size:]
-            while len(rest) < 2:
-                new_data = unreader.read()
-                if not new_data:
+            if self.chunk_left == 0:
+                if self.finished:
+                    break
+                start = pos
+                if self.pending_terminator:
+                    if buf[pos:pos + 2] != b"\r\n":
+                        break
+                    start += 2
+                idx = buf.find(b"\r\n", start, start + MAX_CHUNK_SIZE_LINE)
+                if idx <= start:
                     break
-                rest += new_data
-            if rest[:2] != b'\r\n':
-                raise ChunkMissingTerminator(rest[:2])
-            (size, rest) = self.parse_chunk_size(unreader, data=rest[2:])
+                line = buf[start:idx]
+                if line.translate(None, HEXDIGITS):
+                    break
+                chunk_size = int(line, 16)
+                if chunk_size == 0:
+                    break
+                pos = idx + 2
+                self.chunk_left = chunk_size
+                self.pending_terminator = True
+            n = min(size, self.chunk_left, end - pos)
+            if n == 0:
+                break
+            spans.append((pos, pos + n))
+            pos += n
+            size -= n
+            self.chunk_left -= n
+        return spans, pos
+
+    def at_eof(self):
+        return self.finished and self.chunk_left == 0
+
+    def next_chunk(self):
+        """\
+        Parse the next chunk header once the current chunk is exhausted.
+
+        :return: False once the last chunk has been read.
+        """
+        if self.chunk_left == 0:
+            if self.finished:
+                return False
+            if self.pending_terminator:
+                self.parse_terminator(self.unreader)
+            self.chunk_left = self.parse_chunk_size(self.unreader)
+            if self.chunk_left == 0:
+                self.finished = True
+                return False
+            self.pending_terminator = True
+        return True
+
+    def parse_terminator(self, unreader):
+        # Remove \r\n after chunk
+        while unreader.buffered() < 2:
+            if not unreader.fill():
+                break
+        term = bytes(unreader.buf[unreader.pos:unreader.pos + 2])
+        if term != b"\r\n":
+            raise ChunkMissingTerminator(term)
+        unreader.read(2)
+        self.pending_terminator = False
+
+    def parse_trailers(self, unreader):
+        scan = unreader.pos
+        while True:
+            if unreader.buf[unreader.pos:unreader.pos + 2] == b"\r\n":
+                unreader.read(2)
+                return
+            idx = unreader.buf.find(b"\r\n\r\n", scan)
+            if idx >= 0:
+                break
+            # the terminator may straddle the next read
+            scan = max(unreader.pos, len(unreader.buf) - 3)
+            self.get_data(unreader)
 
-    def parse_chunk_size(self, unreader, data=None):
-        buf = io.BytesIO()
-        if data is not None:
-            buf.write(data)
+        data = unreader.read(idx + 4 - unreader.pos)
+        self.req.trailers = self.req.parse_headers(data[:-4], from_trailer=True)
 
-        idx = buf.getvalue().find(b"\r\n")
+    def parse_chunk_size(self, unreader):
+        scan = unreader.pos
+        idx = unreader.buf.find(b"\r\n", scan)
         while idx < 0:
-            self.get_data(unreader, buf)
-            idx = buf.getvalue().find(b"\r\n")
+            # a CR at the very end may pair with the next read
+            scan = max(unreader.pos, len(unreader.buf) - 1)
+            self.get_data(unreader)
+            idx = unreader.buf.find(b"\r\n", scan)
 
-        data = buf.getvalue()
-        line, rest_chunk = data[:idx], data[idx + 2:]
+        line = unreader.read(idx + 2 - unreader.pos)[:-2]
 
         # RFC9112 7.1.1: BWS before chunk-ext - but ONLY then
         chunk_size, *chunk_ext = line.split(b";", 1)
         if chunk_ext:
             chunk_size = chunk_size.rstrip(b" \t")
-        if any(n not in b"0123456789abcdefABCDEF" for n in chunk_size):
+        if chunk_size.translate(None, HEXDIGITS):
             raise InvalidChunkSize(chunk_size)
         if len(chunk_size) == 0:
             raise InvalidChunkSize(chunk_size)
@@ -99,17 +201,15 @@ class ChunkedReader:
 
         if chunk_size == 0:
             try:
-                self.parse_trailers(unreader, rest_chunk)
+                self.parse_trailers(unreader)
             except NoMoreData:
-                pass
-            return (0, None)
-        return (chunk_size, rest_chunk)
+                # drop the incomplete trailer section
+                unreader.read(unreader.buffered())
+        return chunk_size
 
-    def get_data(self, unreader, buf):
-        data = unreader.read()
-        if not data:
+    def get_data(self, unreader):
+        if not unreader.fill():
             raise NoMoreData()
-        buf.write(data)
 
 
 class LengthReader:
@@ -127,19 +227,43 @@ class LengthReader:
         if size == 0:
             return b""
 
-        buf = io.BytesIO()
-        data = self.unreader.read()
-        while data:
-            buf.write(data)
-            if buf.tell() >= size:
+        if size <= self.unreader.buffered():
+            self.length -= size
+            return self.unreader.read(size)
+
+        # receive into bounded buffers, a large Content-Length alone must
+        # not make us allocate the whole body up front
+        ret = []
+        while size > 0:
+            buf = bytearray(min(size, READ_SIZE_MAX))
+            n = self.readinto(buf)
+            if not n:
                 break
-            data = self.unreader.read()
+            del buf[n:]
+            ret.append(buf)
+            size -= n
+        return b"".join(ret)
 
-        buf = buf.getvalue()
-        ret, rest = buf[:size], buf[size:]
-        self.unreader.unread(rest)
-        self.length -= size
-        return ret
+    def readinto(self, b):
+        """\
+        Read up to ``len(b)`` bytes of the body into ``b``.
+
+        Buffered bytes are copied first, the rest is received from the
+        socket straight into ``b``.
+        """
+        view = memoryview(b).cast("B")
+        size = min(self.length, len(view))
+        nread = 0
+        while nread < size:
+            n = self.unreader.readinto(view[nread:size])
+            if not n:
+                break
+            nread += n
+        self.length -= nread
+        return nread
+
+    def at_eof(self):
+        return self.length == 0
 
 
 class EOFReader:
@@ -179,11 +303,23 @@ class EOFReader:
         self.buf.write(rest)
         return ret
 
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        data = self.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def at_eof(self):
+        return self.finished and self.buf.tell() == 0
+
 
 class Body:
     def __init__(self, reader):
         self.reader = reader
-        self.buf = io.BytesIO()
+        self.buf = bytearray()
+        # read size used when the caller does not bound the read, doubled
+        # on every step up to READ_SIZE_MAX
+        self.read_size = READ_SIZE_MIN
 
     def __iter__(self):
         return self
@@ -205,37 +341,57 @@ class Body:
             return sys.maxsize
         return size
 
+    def at_eof(self):
+        """Return True once the whole body was read."""
+        return not self.buf and self.reader.at_eof()
+
+    def next_read_size(self):
+        read_size = self.read_size
+        self.read_size = min(read_size * 2, READ_SIZE_MAX)
+        return read_size
+
     def read(self, size=None):
         size = self.getsize(size)
         if size == 0:
             return b""
 
-        if size < self.buf.tell():
-            data = self.buf.getvalue()
-            ret, rest = data[:size], data[size:]
-            self.buf = io.BytesIO()
-            self.buf.write(rest)
+        if size <= len(self.buf):
+            ret = bytes(self.buf[:size])
+            del self.buf[:size]
             return ret
 
-        while size > self.buf.tell():
-            data = self.reader.read(1024)
+        bounded = size < sys.maxsize
+        ret = [bytes(self.buf)]
+        size -= len(self.buf)
+        self.buf.clear()
+        while size > 0:
+            data = self.reader.read(size if bounded else self.next_read_size())
             if not data:
                 break
-            self.buf.write(data)
+            ret.append(data)
+            size -= len(data)
+        return b"".join(ret)
 
-        data = self.buf.getvalue()
-        ret, rest = data[:size], data[size:]
-        self.buf = io.BytesIO()
-        self.buf.write(rest)
-        return ret
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        nread = min(len(self.buf), len(view))
+        if nread:
+            view[:nread] = self.buf[:nread]
+            del self.buf[:nread]
+        while nread < len(view):
+            n = self.reader.readinto(view[nread:])
+            if not n:
+                break
+            nread += n
+        return nread
 
     def readline(self, size=None):
         size = self.getsize(size)
         if size == 0:
             return b""
 
-        data = self.buf.getvalue()
-        self.buf = io.BytesIO()
+        data = bytes(self.buf)
+        self.buf.clear()
 
         ret = []
         while 1:
@@ -243,12 +399,12 @@ class Body:
             idx = idx + 1 if idx >= 0 else size if len(data) >= size else 0
             if idx:
                 ret.append(data[:idx])
-                self.buf.write(data[idx:])
+                self.buf += data[idx:]
                 break
 
             ret.append(data)
             size -= len(data)
-            data = self.reader.read(min(1024, size))
+            data = self.reader.read(min(READ_SIZE_MIN, size))
             if not data:
                 break
 
@@ -2,9 +2,9 @@
 # This file is part of gunicorn released under the MIT license.
 # See the NOTICE for more information.
 
-import io
 import re
 import socket
+import time
 
 from gunicorn.http.body import ChunkedReader, LengthReader, EOFReader, Body
 from gunicorn.http.errors import (
@@ -15,6 +15,7 @@ from gunicorn.http.errors import (
 )
 from gunicorn.http.errors import InvalidProxyLine, ForbiddenProxyRequest
 from gunicorn.http.errors import InvalidSchemeHeaders
+from gunicorn.http.timings import RequestTimings
 from gunicorn.util import bytes_to_str, split_request_uri
 
 MAX_REQUEST_LINE = 8190
@@ -41,6 +42,7 @@ class Message:
         self.trailers = []
         self.body = None
         self.scheme = "https" if cfg.is_ssl else "http"
+        self.scheme_header = False
         self.must_close = False
 
         # set headers limits
@@ -67,40 +69,49 @@ class Message:
     def parse(self, unreader):
         raise NotImplementedError()
 
-    def parse_headers(self, data, from_trailer=False):
+    def header_trust(self, from_trailer=False):
+        """\
+        Return the scheme headers and forwarder headers this peer
+        is trusted to set.
+        """
         cfg = self.cfg
+        if from_trailer:
+            # nonsense. either a request is https from the beginning
+            #  .. or we are just behind a proxy who does not remove conflicting trailers
+            return {}, []
+        if ('*' in cfg.forwarded_allow_ips or
+                not isinstance(self.peer_addr, tuple)
+                or self.peer_addr[0] in cfg.forwarded_allow_ips):
+            return cfg.secure_scheme_headers, cfg.forwarder_headers
+        return {}, []
+
+    def parse_headers(self, data, from_trailer=False):
         headers = []
 
-        # Split lines on \r\n
-        lines = [bytes_to_str(line) for line in data.split(b"\r\n")]
+        # Decode the block once and split lines on \r\n
+        lines = bytes_to_str(data).split("\r\n")
+        nlines = len(lines)
+        i = 0
+        strip_header_spaces = self.cfg.strip_header_spaces
 
         # handle scheme headers
-        scheme_header = False
-        secure_scheme_headers = {}
-        forwarder_headers = []
-        if from_trailer:
-            # nonsense. either a request is https from the beginning
-            #  .. or we are just behind a proxy who does not remove conflicting trailers
-            pass
-        elif ('*' in cfg.forwarded_allow_ips or
-              not isinstance(self.peer_addr, tuple)
-              or self.peer_addr[0] in cfg.forwarded_allow_ips):
-            secure_scheme_headers = cfg.secure_scheme_headers
-            forwarder_headers = cfg.forwarder_headers
+        self.scheme_header = False
+        secure_scheme_headers, forwarder_headers = self.header_trust(from_trailer)
 
         # Parse headers into key/value pairs paying attention
         # to continuation lines.
-        while lines:
+        while i < nlines:
             if len(headers) >= self.limit_request_fields:
                 raise LimitRequestHeaders("limit request headers fields")
 
             # Parse initial header name: value pair.
-            curr = lines.pop(0)
+            curr = lines[i]
+            i += 1
             header_length = len(curr) + len("\r\n")
             if curr.find(":") <= 0:
                 raise InvalidHeader(curr)
             name, value = curr.split(":", 1)
-            if self.cfg.strip_header_spaces:
+            if strip_header_spaces:
                 name = name.rstrip(" \t")
             if not TOKEN_RE.fullmatch(name):
                 raise InvalidHeaderName(name)
@@ -114,11 +125,12 @@ class Message:
             value = [value.strip(" \t")]
 
             # Consume value continuation lines..
-            while lines and lines[0].startswith((" ", "\t")):
+            while i < nlines and lines[i].startswith((" ", "\t")):
                 # .. which is obsolete here, and no longer done by default
                 if not self.cfg.permit_obsolete_folding:
                     raise ObsoleteFolding(name)
-                curr = lines.pop(0)
+                curr = lines[i]
+                i += 1
                 header_length += len(curr) + len("\r\n")
                 if header_length > self.limit_request_field_size > 0:
                     raise LimitRequestHeaders("limit request headers "
@@ -132,40 +144,50 @@ class Message:
             if header_length > self.limit_request_field_size > 0:
                 raise LimitRequestHeaders("limit request headers fields size")
 
-            if name in secure_scheme_headers:
-                secure = value == secure_scheme_headers[name]
-                scheme = "https" if secure else "http"
-                if scheme_header:
-                    if scheme != self.scheme:
-                        raise InvalidSchemeHeaders()
-                else:
-                    scheme_header = True
-                    self.scheme = scheme
-
-            # ambiguous mapping allows fooling downstream, e.g. merging non-identical headers:
-            # X-Forwarded-For: 2001:db8::ha:cc:ed
-            # X_Forwarded_For: 127.0.0.1,::1
-            # HTTP_X_FORWARDED_FOR = 2001:db8::ha:cc:ed,127.0.0.1,::1
-            # Only modify after fixing *ALL* header transformations; network to wsgi env
-            if "_" in name:
-                if name in forwarder_headers or "*" in forwarder_headers:
-                    # This forwarder may override our environment
-                    pass
-                elif self.cfg.header_map == "dangerous":
-                    # as if we did not know we cannot safely map this
-                    pass
-                elif self.cfg.header_map == "drop":
-                    # almost as if it never had been there
-                    # but still counts against resource limits
-                    continue
-                else:
-                    # fail-safe fallthrough: refuse
-                    raise InvalidHeaderName(name)
-
-            headers.append((name, value))
+            if self.accept_header(name, value, secure_scheme_headers,
+                                  forwarder_headers):
+                headers.append((name, value))
 
         return headers
 
+    def accept_header(self, name, value, secure_scheme_headers, forwarder_headers):
+        """\
+        Apply the scheme and environ mapping rules to a validated header.
+
+        :return: True if the header should be kept, False to drop it.
+        """
+        if name in secure_scheme_headers:
+            secure = value == secure_scheme_headers[name]
+            scheme = "https" if secure else "http"
+            if self.scheme_header:
+                if scheme != self.scheme:
+                    raise InvalidSchemeHeaders()
+            else:
+                self.scheme_header = True
+                self.scheme = scheme
+
+        # ambiguous mapping allows fooling downstream, e.g. merging non-identical headers:
+        # X-Forwarded-For: 2001:db8::ha:cc:ed
+        # X_Forwarded_For: 127.0.0.1,::1
+        # HTTP_X_FORWARDED_FOR = 2001:db8::ha:cc:ed,127.0.0.1,::1
+        # Only modify after fixing *ALL* header transformations; network to wsgi env
+        if "_" in name:
+            if name in forwarder_headers or "*" in forwarder_headers:
+                # This forwarder may override our environment
+                pass
+            elif self.cfg.header_map == "dangerous":
+                # as if we did not know we cannot safely map this
+                pass
+            elif self.cfg.header_map == "drop":
+                # almost as if it never had been there
+                # but still counts against resource limits
+                return False
+            else:
+                # fail-safe fallthrough: refuse
+                raise InvalidHeaderName(name)
+
+        return True
+
     def set_body_reader(self):
         chunked = False
         content_length = None
@@ -256,78 +278,82 @@ class Request(Message):
 
         self.req_number = req_number
         self.proxy_protocol_info = None
+        self.timings = RequestTimings()
         super().__init__(cfg, unreader, peer_addr)
+        self.timings.head_parsed = time.monotonic()
 
-    def get_data(self, unreader, buf, stop=False):
+    def get_data(self, unreader, buf, stop=False, start=0):
         data = unreader.read()
         if not data:
             if stop:
                 raise StopIteration()
-            raise NoMoreData(buf.getvalue())
-        buf.write(data)
+            raise NoMoreData(bytes(buf[start:]))
+        if self.timings.first_byte is None:
+            self.timings.first_byte = time.monotonic()
+        buf.extend(data)
 
     def parse(self, unreader):
-        buf = io.BytesIO()
+        # The request head is accumulated in a single bytearray. Each scan
+        # resumes where the previous one stopped, so arriving data is only
+        # searched once no matter how many reads the head takes.
+        buf = bytearray()
         self.get_data(unreader, buf, stop=True)
 
         # get request line
-        line, rbuf = self.read_line(unreader, buf, self.limit_request_line)
+        line, pos = self.read_line(unreader, buf, self.limit_request_line)
 
         # proxy protocol
         if self.proxy_protocol(bytes_to_str(line)):
             # get next request line
-            buf = io.BytesIO()
-            buf.write(rbuf)
-            line, rbuf = self.read_line(unreader, buf, self.limit_request_line)
+            line, pos = self.read_line(unreader, buf, self.limit_request_line,
+                                       start=pos)
 
         self.parse_request_line(line)
-        buf = io.BytesIO()
-        buf.write(rbuf)
 
         # Headers
-        data = buf.getvalue()
-        idx = data.find(b"\r\n\r\n")
-
-        done = data[:2] == b"\r\n"
+        scan = pos
         while True:
-            idx = data.find(b"\r\n\r\n")
-            done = data[:2] == b"\r\n"
-
-            if idx < 0 and not done:
-                self.get_data(unreader, buf)
-                data = buf.getvalue()
-                if len(data) > self.max_buffer_headers:
-                    raise LimitRequestHeaders("max buffer headers")
-            else:
+            if buf[pos:pos + 2] == b"\r\n":
+                self.unreader.unread(bytes(buf[pos + 2:]))
+                return b""
+
+            idx = buf.find(b"\r\n\r\n", scan)
+            if idx >= 0:
                 break
 
-        if done:
-            self.unreader.unread(data[2:])
-            return b""
+            # the terminator may straddle the next read
+            scan = max(pos, len(buf) - 3)
+            self.get_data(unreader, buf, start=pos)
+            if len(buf) - pos > self.max_buffer_headers:
+                raise LimitRequestHeaders("max buffer headers")
 
-        self.headers = self.parse_headers(data[:idx], from_trailer=False)
+        self.headers = self.parse_headers(buf[pos:idx], from_trailer=False)
 
-        ret = data[idx + 4:]
-        buf = None
-        return ret
+        return bytes(buf[idx + 4:])
 
-    def read_line(self, unreader, buf, limit=0):
-        data = buf.getvalue()
+    def read_line(self, unreader, buf, limit=0, start=0):
+        """\
+        Find the line starting at offset ``start`` of the bytearray ``buf``,
+        reading more data into it as needed.
 
+        :return: the line without its CRLF and the offset just past it.
+        """
+        scan = start
         while True:
-            idx = data.find(b"\r\n")
+            idx = buf.find(b"\r\n", scan)
             if idx >= 0:
                 # check if the request line is too large
-                if idx > limit > 0:
-                    raise LimitRequestLine(idx, limit)
+                if idx - start > limit > 0:
+                    raise LimitRequestLine(idx - start, limit)
                 break
-            if len(data) - 2 > limit > 0:
-                raise LimitRequestLine(len(data), limit)
-            self.get_data(unreader, buf)
-            data = buf.getvalue()
-
-        return (data[:idx],  # request line,
-                data[idx + 2:])  # residue in the buffer, skip \r\n
+            if len(buf) - start - 2 > limit > 0:
+                raise LimitRequestLine(len(buf) - start, limit)
+            # a CR at the very end may pair with the next read
+            scan = max(start, len(buf) - 1)
+            self.get_data(unreader, buf, start=start)
+
+        return (bytes(buf[start:idx]),  # request line,
+                idx + 2)  # offset of the residue in the buffer, skip \r\n
 
     def proxy_protocol(self, line):
         """\
@@ -0,0 +1,162 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+# Optional compiled HTTP parser backends.
+#
+# A native backend parses the request line and the header block of a
+# request in a single call. What it cannot check on its own is left to
+# gunicorn: the resource limits, the URI split, scheme headers,
+# header_map and forwarder headers. Any head the native parser refuses,
+# or that it would read differently (bare CR or LF, folded lines, extra
+# spaces in the request line), is parsed again by the pure Python parser,
+# so both backends accept and reject the same requests with the same
+# errors.
+
+from gunicorn.http.errors import NoMoreData
+from gunicorn.http.message import Request
+from gunicorn.util import split_request_uri
+
+try:
+    import httptools
+except ImportError:
+    httptools = None
+
+PARSERS = ("python", "httptools")
+
+
+def available(name):
+    if name == "python":
+        return True
+    if name == "httptools":
+        return httptools is not None
+    return False
+
+
+def resolve(name):
+    """Return the parser backend that will be used for ``name``."""
+    if available(name):
+        return name
+    return "python"
+
+
+class _HeadCollector:
+
+    def __init__(self):
+        self.url = []
+        self.headers = []
+        self.complete = False
+
+    def on_url(self, url):
+        self.url.append(url)
+
+    def on_header(self, name, value):
+        self.headers.append((name, value))
+
+    def on_headers_complete(self):
+        self.complete = True
+
+
+class HttptoolsRequest(Request):
+
+    def parse(self, unreader):
+        cfg = self.cfg
+        # the Python parser implements these by itself
+        if cfg.proxy_protocol or cfg.strip_header_spaces or \
+                cfg.permit_obsolete_folding:
+            return super().parse(unreader)
+
+        buf = bytearray()
+        self.get_data(unreader, buf, stop=True)
+        # no head the Python parser accepts is longer
+        limit = self.limit_request_line + 2 + self.max_buffer_headers
+        scan = 0
+        while True:
+            idx = buf.find(b"\r\n\r\n", scan)
+            if idx >= 0:
+                break
+            if len(buf) > limit:
+                return self.reparse(unreader, buf)
+            # the terminator may straddle the next read
+            scan = max(0, len(buf) - 3)
+            try:
+                self.get_data(unreader, buf)
+            except NoMoreData:
+                return self.reparse(unreader, buf)
+
+        head = bytes(buf[:idx + 4])
+        crlf = head.count(b"\r\n")
+        if head.count(b"\r") != crlf or head.count(b"\n") != crlf or \
+                b"\n " in head or b"\n\t" in head:
+            return self.reparse(unreader, buf)
+        line = head.find(b"\r\n")
+        if line > self.limit_request_line > 0:
+            return self.reparse(unreader, buf)
+        size = self.limit_request_field_size
+        if idx - line > size > 0 and \
+                max(map(len, head[line + 2:idx].split(b"\r\n"))) + 2 > size:
+            return self.reparse(unreader, buf)
+
+        collector = _HeadCollector()
+        parser = httptools.HttpRequestParser(collector)
+        try:
+            parser.feed_data(head)
+        except httptools.HttpParserUpgrade:
+            pass
+        except httptools.HttpParserError:
+            return self.reparse(unreader, buf)
+        if not collector.complete or \
+                len(collector.headers) > self.limit_request_fields:
+            return self.reparse(unreader, buf)
+
+        # llhttp only knows registered methods, all of them uppercase
+        # tokens that gunicorn accepts as well
+        method = parser.get_method()
+        uri = b"".join(collector.url)
+        version = parser.get_http_version()
+        if version not in ("1.0", "1.1") or not uri or \
+                line != len(method) + len(uri) + 10 or \
+                not head.startswith(b"HTTP/", line - 8):
+            return self.reparse(unreader, buf)
+        uri = str(uri, "latin1")
+        try:
+            parts = split_request_uri(uri)
+        except ValueError:
+            return self.reparse(unreader, buf)
+
+        self.method = str(method, "latin1")
+        self.uri = uri
+        self.path = parts.path or ""
+        self.query = parts.query or ""
+        self.fragment = parts.fragment or ""
+        self.version = (1, 0) if version == "1.0" else (1, 1)
+
+        # names are RFC9110 tokens and values are free of CTLs at this point
+        headers = []
+        self.scheme_header = False
+        secure_scheme_headers, forwarder_headers = self.header_trust()
+        for name, value in collector.headers:
+            name = str(name, "latin1").upper()
+            value = str(value, "latin1").strip(" \t")
+            # only scheme headers and names with underscores need the rules
+            if ("_" in name or name in secure_scheme_headers) and \
+                    not self.accept_header(name, value, secure_scheme_headers,
+                                           forwarder_headers):
+                continue
+            headers.append((name, value))
+        self.headers = headers
+
+        return bytes(buf[idx + 4:])
+
+    def reparse(self, unreader, buf):
+        # the Python parser reads the head again, and accepts it or
+        # refuses it with its own error
+        unreader.unread(bytes(buf))
+        return super().parse(unreader)
+
+
+def request_class(name):
+    """Return the message class implementing the ``name`` backend."""
+    if resolve(name) == "httptools":
+        return HttptoolsRequest
+    return Request
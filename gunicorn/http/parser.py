@@ -2,6 +2,9 @@
 # This file is part of gunicorn released under the MIT license.
 # See the NOTICE for more information.
 
+import time
+
+from gunicorn.http import native
 from gunicorn.http.message import Request
 from gunicorn.http.unreader import SocketUnreader, IterUnreader
 
@@ -21,6 +24,8 @@ class Parser:
 
         # request counter (for keepalive connetions)
         self.req_count = 0
+        # when the connection was accepted, given to its first request
+        self.accepted = time.monotonic()
 
     def __iter__(self):
         return self
@@ -41,11 +46,28 @@ class Parser:
         self.mesg = self.mesg_class(self.cfg, self.unreader, self.source_addr, self.req_count)
         if not self.mesg:
             raise StopIteration()
+        timings = self.mesg.timings
+        timings.accepted = self.accepted or timings.first_byte
+        self.accepted = None
         return self.mesg
 
     next = __next__
 
+    def has_pending(self):
+        """\
+        Return True if the next message already started arriving: the
+        current one was read to the end and data is left in the buffer.
+        """
+        if self.mesg is None or self.mesg.should_close():
+            return False
+        return self.mesg.body.at_eof() and self.unreader.buffered() > 0
+
 
 class RequestParser(Parser):
 
     mesg_class = Request
+
+    def __init__(self, cfg, source, source_addr):
+        super().__init__(cfg, source, source_addr)
+        if cfg.http_parser != "python":
+            self.mesg_class = native.request_class(cfg.http_parser)
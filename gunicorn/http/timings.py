@@ -0,0 +1,77 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+# design:
+# Every request carries the monotonic time at which it reached each step
+# of its handling. The parser records when the connection was accepted and
+# when the request head was read, wsgi.create() when the application is
+# called, the response when its first bytes and its end were written. The
+# phases between two steps add up to the time from accept to done, and are
+# exposed as access log atoms, statsd timers, Prometheus histograms and to
+# the trace_request hook.
+
+STEPS = ("accepted", "first_byte", "head_parsed", "app_started",
+         "first_byte_sent", "done")
+
+# name, first step, last step
+PHASES = (
+    ("queue", "accepted", "first_byte"),
+    ("parse", "first_byte", "head_parsed"),
+    ("dispatch", "head_parsed", "app_started"),
+    ("app", "app_started", "first_byte_sent"),
+    ("write", "first_byte_sent", "done"),
+)
+PHASE_STEPS = {name: (first, last) for (name, first, last) in PHASES}
+
+
+class RequestTimings:
+    """\
+    The ``time.monotonic()`` timestamps of the steps of a request, ``None``
+    for the steps it did not reach.
+
+    ``accepted``
+        the connection was accepted, or for the next requests of a
+        connection in the threaded worker, it was queued again
+    ``first_byte``
+        the first bytes of the request were read
+    ``head_parsed``
+        the request line and headers were parsed
+    ``app_started``
+        the WSGI environ was built, the application is called next
+    ``first_byte_sent``
+        the status line and headers were written, with the first bytes of
+        the body when there are any
+    ``done``
+        the response was written
+    """
+
+    __slots__ = STEPS
+
+    def __init__(self):
+        for step in STEPS:
+            setattr(self, step, None)
+
+    def phase(self, name):
+        """\
+        Return the duration in seconds of the phase ``name``, or ``None``
+        if the request did not reach both its steps.
+        """
+        first, last = PHASE_STEPS[name]
+        start = getattr(self, first)
+        end = getattr(self, last)
+        if start is None or end is None:
+            return None
+        return max(end - start, 0.0)
+
+    def phases(self):
+        """\
+        Return the duration in seconds of each phase between two steps
+        the request reached, by name.
+        """
+        durations = {}
+        for name, _, _ in PHASES:
+            duration = self.phase(name)
+            if duration is not None:
+                durations[name] = duration
+        return durations
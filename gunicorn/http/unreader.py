@@ -2,20 +2,61 @@
 # This file is part of gunicorn released under the MIT license.
 # See the NOTICE for more information.
 
-import io
-import os
-
 # Classes that can undo reading data from
 # a given type of data source.
+#
+# Buffered data lives in a single growable bytearray. Consumed bytes are
+# tracked with a read offset instead of being sliced off, and the consumed
+# prefix is only dropped once it dominates the buffer, so every byte is
+# copied at most once on its way out.
+
+# compact the buffer once the consumed prefix is at least this large
+COMPACT_THRESHOLD = 65536
 
 
 class Unreader:
     def __init__(self):
-        self.buf = io.BytesIO()
+        self.buf = bytearray()
+        self.pos = 0
 
     def chunk(self):
         raise NotImplementedError()
 
+    def buffered(self):
+        """Number of bytes available without touching the source."""
+        return len(self.buf) - self.pos
+
+    def fill(self):
+        """\
+        Append the next chunk of the source to the buffer.
+
+        Return the number of bytes added, 0 at the end of the stream.
+        """
+        data = self.chunk()
+        if data:
+            self.buf += data
+        return len(data) if data else 0
+
+    def _take(self, size):
+        end = min(self.pos + size, len(self.buf))
+        ret = bytes(memoryview(self.buf)[self.pos:end])
+        self.pos = end
+        self._compact()
+        return ret
+
+    def _compact(self):
+        if self.pos >= len(self.buf):
+            self.buf.clear()
+            self.pos = 0
+        elif self.pos >= COMPACT_THRESHOLD and self.pos * 2 >= len(self.buf):
+            del self.buf[:self.pos]
+            self.pos = 0
+
+    def consume(self, size):
+        """Drop ``size`` buffered bytes that were read in place."""
+        self.pos = min(self.pos + size, len(self.buf))
+        self._compact()
+
     def read(self, size=None):
         if size is not None and not isinstance(size, int):
             raise TypeError("size parameter must be an int or long.")
@@ -26,31 +67,52 @@ class Unreader:
             if size < 0:
                 size = None
 
-        self.buf.seek(0, os.SEEK_END)
-
-        if size is None and self.buf.tell():
-            ret = self.buf.getvalue()
-            self.buf = io.BytesIO()
-            return ret
+        if size is None and self.buffered():
+            return self._take(self.buffered())
         if size is None:
             d = self.chunk()
             return d
 
-        while self.buf.tell() < size:
-            chunk = self.chunk()
-            if not chunk:
-                ret = self.buf.getvalue()
-                self.buf = io.BytesIO()
-                return ret
-            self.buf.write(chunk)
-        data = self.buf.getvalue()
-        self.buf = io.BytesIO()
-        self.buf.write(data[size:])
-        return data[:size]
+        while self.buffered() < size:
+            if not self.fill():
+                return self._take(self.buffered())
+        return self._take(size)
+
+    def readinto(self, b):
+        """\
+        Read up to ``len(b)`` bytes into the writable buffer ``b``.
+
+        Buffered data is drained first. When nothing is buffered, the
+        source is read straight into ``b`` if it supports it. Return the
+        number of bytes read, 0 at the end of the stream.
+        """
+        view = memoryview(b).cast("B")
+        size = len(view)
+        if size == 0:
+            return 0
+
+        avail = self.buffered()
+        if avail:
+            n = min(avail, size)
+            view[:n] = memoryview(self.buf)[self.pos:self.pos + n]
+            self.pos += n
+            self._compact()
+            return n
+        return self.chunk_into(view)
+
+    def chunk_into(self, view):
+        data = self.chunk()
+        if not data:
+            return 0
+        n = min(len(data), len(view))
+        view[:n] = data[:n]
+        if n < len(data):
+            self.unread(data[n:])
+        return n
 
     def unread(self, data):
-        self.buf.seek(0, os.SEEK_END)
-        self.buf.write(data)
+        if data:
+            self.buf += data
 
 
 class SocketUnreader(Unreader):
@@ -58,10 +120,27 @@ class SocketUnreader(Unreader):
         super().__init__()
         self.sock = sock
         self.mxchunk = max_chunk
+        self.pad = bytes(max_chunk)
 
     def chunk(self):
         return self.sock.recv(self.mxchunk)
 
+    def fill(self):
+        # receive straight into the tail of the buffer
+        start = len(self.buf)
+        self.buf += self.pad
+        view = memoryview(self.buf)[start:]
+        n = 0
+        try:
+            n = self.sock.recv_into(view)
+        finally:
+            view.release()
+            del self.buf[start + n:]
+        return n
+
+    def chunk_into(self, view):
+        return self.sock.recv_into(view)
+
 
 class IterUnreader(Unreader):
     def __init__(self, iterable):
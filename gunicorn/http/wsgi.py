@@ -2,11 +2,13 @@
 # This file is part of gunicorn released under the MIT license.
 # See the NOTICE for more information.
 
+import functools
 import io
 import logging
 import os
 import re
 import sys
+import time
 
 from gunicorn.http.message import TOKEN_RE
 from gunicorn.http.errors import ConfigurationProblem, InvalidHeader, InvalidHeaderName
@@ -23,6 +25,24 @@ HEADER_VALUE_RE = re.compile(r'[ \t\x21-\x7e\x80-\xff]*')
 
 log = logging.getLogger(__name__)
 
+CONNECTION_HEADERS = {
+    value: ("Connection: %s\r\n" % value).encode("latin-1")
+    for value in ("close", "keep-alive", "upgrade")
+}
+
+CHUNKED_HEADER = b"Transfer-Encoding: chunked\r\n"
+
+
+@functools.lru_cache(maxsize=256)
+def status_line(version, status):
+    """Return the encoded status line, built once per version and status."""
+    return ("HTTP/%s.%s %s\r\n" % (version[0], version[1], status)).encode("latin-1")
+
+
+@functools.lru_cache(maxsize=8)
+def server_header(server):
+    return ("Server: %s\r\n" % server).encode("latin-1")
+
 
 class FileWrapper:
 
@@ -92,6 +112,31 @@ def default_environ(req, sock, cfg):
     return env
 
 
+def warmup_environ(cfg):
+    """\
+    Return the environ of the ``warmup_path`` request a worker serves
+    itself before reporting that it booted.
+    """
+    path, _, query = cfg.warmup_path.partition("?")
+    env = base_environ(cfg)
+    env.update({
+        "wsgi.input": io.BytesIO(),
+        "wsgi.url_scheme": "http",
+        "gunicorn.warmup": True,
+        "REQUEST_METHOD": "GET",
+        "QUERY_STRING": query,
+        "RAW_URI": cfg.warmup_path,
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "REMOTE_ADDR": "127.0.0.1",
+        "HTTP_HOST": "localhost",
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path,
+    })
+    return env
+
+
 def proxy_environ(req):
     info = req.proxy_protocol_info
 
@@ -194,6 +239,7 @@ def create(req, sock, client, server, cfg):
     # override the environ with the correct remote and server address if
     # we are behind a proxy using the proxy protocol.
     environ.update(proxy_environ(req))
+    req.timings.app_started = time.monotonic()
     return resp, environ
 
 
@@ -212,6 +258,10 @@ class Response:
         self.sent = 0
         self.upgrade = False
         self.cfg = cfg
+        # body items held back by response_buffer_size
+        self.buffer_size = cfg.response_buffer_size
+        self.wbuf = []
+        self.wbuf_len = 0
 
     def force_close(self):
         self.must_close = True
@@ -300,14 +350,16 @@ class Response:
             return False
         return True
 
-    def default_headers(self):
-        # set the connection header
+    def _connection(self):
         if self.upgrade:
-            connection = "upgrade"
+            return "upgrade"
         elif self.should_close():
-            connection = "close"
-        else:
-            connection = "keep-alive"
+            return "close"
+        return "keep-alive"
+
+    def default_headers(self):
+        # set the connection header
+        connection = self._connection()
 
         headers = [
             "HTTP/%s.%s %s\r\n" % (self.req.version[0],
@@ -320,38 +372,112 @@ class Response:
             headers.append("Transfer-Encoding: chunked\r\n")
         return headers
 
+    def _default_header_bytes(self):
+        # default_headers() from cached and prebuilt bytes
+        headers = [
+            status_line(self.req.version, self.status),
+            server_header(self.version),
+            b"Date: %s\r\n" % util.http_date_bytes(),
+            CONNECTION_HEADERS[self._connection()]
+        ]
+        if self.chunked:
+            headers.append(CHUNKED_HEADER)
+        return headers
+
+    def header_bytes(self):
+        """Return the encoded header block, terminated by an empty line."""
+        if type(self).default_headers is Response.default_headers:
+            tosend = self._default_header_bytes()
+        else:
+            # keep the default headers of a subclass overriding them
+            tosend = [util.to_bytestring(h, "latin-1")
+                      for h in self.default_headers()]
+        # user headers are validated by process_headers, encoding them in
+        # one go is cheaper than building bytes per header
+        tosend.append("".join(["%s: %s\r\n" % (k, v)
+                               for k, v in self.headers]).encode("latin-1"))
+        tosend.append(b"\r\n")
+        return b"".join(tosend)
+
     def send_headers(self):
         if self.headers_sent:
             return
-        tosend = self.default_headers()
-        tosend.extend(["%s: %s\r\n" % (k, v) for k, v in self.headers])
+        util.write(self.sock, self.header_bytes())
+        self.headers_written()
 
-        header_str = "%s\r\n" % "".join(tosend)
-        util.write(self.sock, util.to_bytestring(header_str, "latin-1"))
+    def headers_written(self):
         self.headers_sent = True
+        timings = getattr(self.req, "timings", None)
+        if timings is not None:
+            timings.first_byte_sent = time.monotonic()
+
+    def send(self, buffers):
+        """\
+        Send body ``buffers``. Headers not sent yet go out with them in a
+        single vectored write.
+        """
+        if self.headers_sent:
+            util.writev(self.sock, buffers)
+            return
+        util.writev(self.sock, [self.header_bytes()] + buffers)
+        self.headers_written()
 
     def write(self, arg):
-        self.send_headers()
         if not isinstance(arg, bytes):
+            self.flush()
             raise TypeError('%r is not a byte' % arg)
         arglen = len(arg)
         tosend = arglen
         if self.response_length is not None:
             if self.sent >= self.response_length:
                 # Never write more than self.response_length bytes
+                if not self.buffer_size:
+                    self.send_headers()
                 return
 
             tosend = min(self.response_length - self.sent, tosend)
             if tosend < arglen:
                 arg = arg[:tosend]
 
-        # Sending an empty chunk signals the end of the
-        # response and prematurely closes the response
-        if self.chunked and tosend == 0:
-            return
+        if tosend == 0:
+            # an empty item flushes the buffer
+            if self.buffer_size:
+                self.flush()
+                return
+            # Sending an empty chunk signals the end of the
+            # response and prematurely closes the response
+            if self.chunked:
+                self.send_headers()
+                return
 
         self.sent += tosend
-        util.write(self.sock, arg, self.chunked)
+        if self.buffer_size:
+            self.wbuf.append(arg)
+            self.wbuf_len += tosend
+            if self.wbuf_len >= self.buffer_size:
+                self.flush()
+        elif self.chunked:
+            self.send(util.chunk_buffers(arg))
+        else:
+            self.send([arg])
+
+    def take_buffered(self):
+        """Return the buffered body, framed for sending, and empty it."""
+        buffers = self.wbuf
+        if not buffers:
+            return []
+        if self.chunked:
+            buffers = [b"%X\r\n" % self.wbuf_len] + buffers + [b"\r\n"]
+        self.wbuf = []
+        self.wbuf_len = 0
+        return buffers
+
+    def flush(self):
+        buffers = self.take_buffered()
+        if buffers:
+            self.send(buffers)
+        else:
+            self.send_headers()
 
     def can_sendfile(self):
         return self.cfg.sendfile is not False
@@ -374,11 +500,13 @@ class Response:
         except (OSError, io.UnsupportedOperation):
             return False
 
-        self.send_headers()
-
+        buffers = self.take_buffered()
         if self.is_chunked():
-            chunk_size = "%X\r\n" % nbytes
-            self.sock.sendall(chunk_size.encode('utf-8'))
+            buffers.append(b"%X\r\n" % nbytes)
+        if buffers:
+            self.send(buffers)
+        else:
+            self.send_headers()
         if nbytes > 0:
             self.sock.sendfile(respiter.filelike, offset=offset, count=nbytes)
 
@@ -395,7 +523,13 @@ class Response:
                 self.write(item)
 
     def close(self):
-        if not self.headers_sent:
-            self.send_headers()
+        buffers = self.take_buffered()
         if self.chunked:
-            util.write_chunk(self.sock, b"")
+            buffers.extend(util.chunk_buffers(b""))
+        if buffers:
+            self.send(buffers)
+        else:
+            self.send_headers()
+        timings = getattr(self.req, "timings", None)
+        if timings is not None:
+            timings.done = time.monotonic()
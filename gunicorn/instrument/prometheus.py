@@ -0,0 +1,230 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+"Prometheus and OpenMetrics exposition of the arbiter's statistics"
+
+# design:
+# The exporter is served by the arbiter from its main loop, like the stats
+# socket, so that scraping never touches the workers or their requests.
+# Every metric is read from the heartbeat table the workers publish to,
+# plus the totals the arbiter keeps for the workers that exited, so that
+# counters never go backwards. A scrape is a single request on a short
+# lived connection, answered with the Prometheus text format, or with
+# OpenMetrics when the scraper asks for it.
+
+import errno
+import socket
+import time
+
+from gunicorn import util
+from gunicorn import sock
+from gunicorn.workers.heartbeat import LATENCY_BUCKETS
+
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+MAX_REQUEST_SIZE = 8192
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n") \
+        .replace('"', '\\"')
+
+
+def format_value(value):
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value)
+    return str(value)
+
+
+def histogram_samples(histogram, labels=None):
+    labels = labels or {}
+    samples = []
+    cumulative = 0
+    for le, count in zip(LATENCY_BUCKETS + (float("inf"),),
+                         histogram["latency"]):
+        cumulative += count
+        samples.append(("_bucket", dict(labels, le=format_value(float(le))),
+                        cumulative))
+    samples.append(("_count", labels, cumulative))
+    samples.append(("_sum", labels, histogram["latency_sum"]))
+    return samples
+
+
+class MetricsExporter:
+
+    # seconds a scrape may take, from accept to the end of the response
+    timeout = 1.0
+
+    def __init__(self, arbiter):
+        self.arbiter = arbiter
+
+    def families(self):
+        """\
+        Yield the metric families as ``(name, type, help, samples)``, the
+        samples being ``(suffix, labels, value)``.
+        """
+        arbiter = self.arbiter
+        stats = arbiter.worker_stats()
+        metrics = arbiter.worker_metrics()
+        total = stats["total"]
+        concurrency = arbiter.worker_class.concurrency(arbiter.cfg)
+
+        yield ("gunicorn_workers", "gauge",
+               "Number of worker processes.",
+               [("", {}, len(stats["workers"]))])
+        yield ("gunicorn_workers_booting", "gauge",
+               "Number of worker processes not booted yet.",
+               [("", {}, arbiter.booting_workers())])
+        yield ("gunicorn_workers_desired", "gauge",
+               "Number of worker processes the arbiter maintains.",
+               [("", {}, arbiter.num_workers)])
+        yield ("gunicorn_worker_restarts", "counter",
+               "Worker processes that exited, by reason.",
+               [("_total", {"reason": reason}, count)
+                for reason, count in sorted(arbiter.worker_exits.items())])
+
+        yield ("gunicorn_requests_in_flight", "gauge",
+               "Requests being handled.",
+               [("", {}, total["in_flight"])])
+        yield ("gunicorn_keepalive_connections", "gauge",
+               "Idle keep-alive connections.",
+               [("", {}, total["keepalive"])])
+        yield ("gunicorn_requests", "counter",
+               "Requests handled.",
+               [("_total", {}, total["requests"])])
+        yield ("gunicorn_responses", "counter",
+               "Responses sent, by status class.",
+               [("_total", {"status": status}, count)
+                for status, count in metrics["statuses"].items()])
+        yield ("gunicorn_response_body_bytes", "counter",
+               "Response body bytes sent.",
+               [("_total", {}, total["bytes_sent"])])
+
+        yield ("gunicorn_request_duration_seconds", "histogram",
+               "Time spent handling requests.", histogram_samples(metrics))
+        samples = []
+        for name, phase in metrics["phases"].items():
+            samples.extend(histogram_samples(phase, {"phase": name}))
+        yield ("gunicorn_request_phase_seconds", "histogram",
+               "Time spent in each phase of the requests.", samples)
+
+        yield ("gunicorn_worker_in_flight", "gauge",
+               "Requests being handled, by worker.",
+               [("", {"pid": w["pid"]}, w["in_flight"])
+                for w in stats["workers"]])
+        yield ("gunicorn_worker_busy", "gauge",
+               "1 when all the connections a worker can handle are busy.",
+               [("", {"pid": w["pid"]}, int(w["in_flight"] >= concurrency))
+                for w in stats["workers"]])
+
+        samples = []
+        for lnr in arbiter.LISTENERS:
+            backlog = sock.accept_queue_length(lnr)
+            if backlog is not None:
+                samples.append(("", {"listener": str(lnr)}, backlog))
+        if samples:
+            yield ("gunicorn_accept_backlog", "gauge",
+                   "Connections waiting to be accepted, by listener.",
+                   samples)
+
+    def render(self, openmetrics=False):
+        lines = []
+        for name, typ, doc, samples in self.families():
+            if typ == "counter" and not openmetrics:
+                # the text format names counters with their suffix
+                lines.append("# HELP %s_total %s" % (name, doc))
+                lines.append("# TYPE %s_total %s" % (name, typ))
+            else:
+                lines.append("# HELP %s %s" % (name, doc))
+                lines.append("# TYPE %s %s" % (name, typ))
+            for suffix, labels, value in samples:
+                if labels:
+                    labels = ",".join('%s="%s"' % (k, escape(v))
+                                      for k, v in labels.items())
+                    lines.append("%s%s{%s} %s" % (name, suffix, labels,
+                                                  format_value(value)))
+                else:
+                    lines.append("%s%s %s" % (name, suffix,
+                                              format_value(value)))
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def set_deadline(self, client, deadline):
+        # socket timeouts apply to each call, a client sending a byte at a
+        # time would otherwise hold the arbiter up for as long as it likes
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout("scrape timed out")
+        client.settimeout(remaining)
+
+    def read_request(self, client, deadline):
+        data = b""
+        while b"\r\n\r\n" not in data and len(data) < MAX_REQUEST_SIZE:
+            self.set_deadline(client, deadline)
+            chunk = client.recv(MAX_REQUEST_SIZE)
+            if not chunk:
+                break
+            data += chunk
+        head = data.split(b"\r\n\r\n", 1)[0].decode("latin-1")
+        lines = head.split("\r\n")
+        parts = lines[0].split()
+        if len(parts) != 3:
+            return None, None, {}
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        method, path, _ = parts
+        return method, path.split("?", 1)[0], headers
+
+    def respond(self, client, status, content_type, body, head=False):
+        body = body.encode("utf-8")
+        headers = ("HTTP/1.1 %s\r\n"
+                   "Content-Type: %s\r\n"
+                   "Content-Length: %d\r\n"
+                   "Connection: close\r\n"
+                   "\r\n") % (status, content_type, len(body))
+        data = headers.encode("latin-1")
+        if not head:
+            data += body
+        client.sendall(data)
+
+    def handle(self, listener, log):
+        """\
+        Accept a connection on the metrics listener and answer its request.
+        """
+        try:
+            client, _ = listener.accept()
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.ECONNABORTED,
+                               errno.EWOULDBLOCK):
+                raise
+            return
+
+        try:
+            # a scrape must not hold up the arbiter
+            deadline = time.monotonic() + self.timeout
+            method, path, headers = self.read_request(client, deadline)
+            self.set_deadline(client, deadline)
+            if method not in ("GET", "HEAD"):
+                self.respond(client, "405 Method Not Allowed", "text/plain",
+                             "Method Not Allowed\n")
+            elif path not in ("/", "/metrics"):
+                self.respond(client, "404 Not Found", "text/plain",
+                             "Not Found\n")
+            else:
+                openmetrics = "application/openmetrics-text" in \
+                    headers.get("accept", "")
+                content_type = openmetrics and OPENMETRICS_TYPE or \
+                    PROMETHEUS_TYPE
+                self.respond(client, "200 OK", content_type,
+                             self.render(openmetrics), head=method == "HEAD")
+        except OSError as e:
+            log.debug("Failed to send metrics: %s", e)
+        finally:
+            util.close(client)
@@ -4,8 +4,12 @@
 
 "Bare-bones implementation of statsD's protocol, client-side"
 
+import atexit
 import logging
+import os
+import random
 import socket
+import threading
 from re import sub
 
 from gunicorn.glogging import Logger
@@ -19,6 +23,120 @@ COUNTER_TYPE = "counter"
 HISTOGRAM_TYPE = "histogram"
 
 
+# design:
+# With statsd_flush_interval set, metrics are recorded in a StatsdBuffer
+# instead of being sent at once: counters are summed, gauges keep their
+# last value and timers a reservoir sample of their values. The samples
+# are sent as timings, with the rate at which they were sampled, for the
+# statsd server to aggregate them with those of the other workers: the
+# minimum or percentiles of a worker sent as gauges would overwrite each
+# other. A daemon thread of each process swaps the buffer every interval
+# and sends its content packed in datagrams of at most
+# statsd_max_packet_size bytes. The buffer is created again after a fork,
+# the thread of the parent not running in the child.
+
+class Timer:
+
+    # values sent per interval at most
+    max_samples = 512
+
+    def __init__(self):
+        self.count = 0
+        self.samples = []
+
+    def add(self, value):
+        self.count += 1
+        if len(self.samples) < self.max_samples:
+            self.samples.append(value)
+        else:
+            # reservoir sampling, every value has the same chance to be kept
+            i = random.randrange(self.count)
+            if i < self.max_samples:
+                self.samples[i] = value
+
+    def rate(self):
+        return len(self.samples) / self.count
+
+
+class StatsdBuffer:
+
+    def __init__(self, statsd, interval):
+        self.statsd = statsd
+        self.interval = interval
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.timers = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run,
+                                       name="gunicorn-statsd",
+                                       daemon=True)
+
+    def start(self):
+        self.thread.start()
+        atexit.register(self.close)
+
+    def close(self):
+        if self.pid != os.getpid() or not self.thread.is_alive():
+            return
+        self.stopped.set()
+        self.thread.join(5)
+        self.flush()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def increment(self, name, value):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def histogram(self, name, value):
+        with self.lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = Timer()
+            timer.add(value)
+
+    def swap(self):
+        with self.lock:
+            counters, self.counters = self.counters, {}
+            gauges, self.gauges = self.gauges, {}
+            timers, self.timers = self.timers, {}
+        return counters, gauges, timers
+
+    def lines(self):
+        counters, gauges, timers = self.swap()
+        for name, value in counters.items():
+            yield "%s:%s|c" % (name, value)
+        for name, value in gauges.items():
+            yield "%s:%s|g" % (name, value)
+        for name, timer in timers.items():
+            suffix = "|ms"
+            if len(timer.samples) < timer.count:
+                suffix = "|ms|@%.6g" % timer.rate()
+            for value in timer.samples:
+                yield "%s:%s%s" % (name, value, suffix)
+
+    def flush(self):
+        packet = []
+        size = 0
+        for line in self.statsd.encode_lines(self.lines()):
+            if packet and size + 1 + len(line) > self.statsd.max_packet_size:
+                self.statsd._send_packet(b"\n".join(packet))
+                packet = []
+                size = 0
+            size += len(line) + (1 if packet else 0)
+            packet.append(line)
+        if packet:
+            self.statsd._send_packet(b"\n".join(packet))
+
+
 class Statsd(Logger):
     """statsD-based instrumentation, that passes as a logger
     """
@@ -38,6 +156,9 @@ class Statsd(Logger):
             self.sock = None
 
         self.dogstatsd_tags = cfg.dogstatsd_tags
+        self.flush_interval = cfg.statsd_flush_interval
+        self.max_packet_size = cfg.statsd_max_packet_size
+        self.buffer = None
 
     # Log errors and warnings
     def critical(self, msg, *args, **kwargs):
@@ -73,7 +194,7 @@ class Statsd(Logger):
                 metric = extra.get(METRIC_VAR, None)
                 value = extra.get(VALUE_VAR, None)
                 typ = extra.get(MTYPE_VAR, None)
-                if metric and value and typ:
+                if metric and value is not None and typ:
                     if typ == GAUGE_TYPE:
                         self.gauge(metric, value)
                     elif typ == COUNTER_TYPE:
@@ -104,21 +225,67 @@ class Statsd(Logger):
         self.histogram("gunicorn.request.duration", duration_in_ms)
         self.increment("gunicorn.requests", 1)
         self.increment("gunicorn.request.status.%d" % status, 1)
+        timings = getattr(req, "timings", None)
+        if timings is not None:
+            for name, duration in timings.phases().items():
+                self.histogram("gunicorn.request.phase.%s" % name,
+                               duration * 1000)
 
     # statsD methods
     # you can use those directly if you want
     def gauge(self, name, value):
+        buf = self._get_buffer()
+        if buf is not None:
+            buf.gauge(name, value)
+            return
         self._sock_send("{0}{1}:{2}|g".format(self.prefix, name, value))
 
     def increment(self, name, value, sampling_rate=1.0):
+        buf = self._get_buffer()
+        if buf is not None:
+            if sampling_rate != 1:
+                value = value / sampling_rate
+            buf.increment(name, value)
+            return
         self._sock_send("{0}{1}:{2}|c|@{3}".format(self.prefix, name, value, sampling_rate))
 
     def decrement(self, name, value, sampling_rate=1.0):
+        buf = self._get_buffer()
+        if buf is not None:
+            if sampling_rate != 1:
+                value = value / sampling_rate
+            buf.increment(name, -value)
+            return
         self._sock_send("{0}{1}:-{2}|c|@{3}".format(self.prefix, name, value, sampling_rate))
 
     def histogram(self, name, value):
+        buf = self._get_buffer()
+        if buf is not None:
+            buf.histogram(name, value)
+            return
         self._sock_send("{0}{1}:{2}|ms".format(self.prefix, name, value))
 
+    def _get_buffer(self):
+        if not self.flush_interval:
+            return None
+
+        buf = self.buffer
+        if buf is None or buf.pid != os.getpid():
+            with self.lock:
+                buf = self.buffer
+                if buf is None or buf.pid != os.getpid():
+                    buf = StatsdBuffer(self, self.flush_interval)
+                    buf.start()
+                    self.buffer = buf
+        return buf
+
+    def encode_lines(self, lines):
+        suffix = ""
+        if self.dogstatsd_tags:
+            suffix = "|#" + self.dogstatsd_tags
+        for line in lines:
+            yield (self.prefix + line + suffix).encode("ascii")
+
     def _sock_send(self, msg):
         try:
             if isinstance(msg, str):
@@ -132,3 +299,10 @@ class Statsd(Logger):
                 self.sock.send(msg)
         except Exception:
             Logger.warning(self, "Error sending message to statsd", exc_info=True)
+
+    def _send_packet(self, packet):
+        try:
+            if self.sock:
+                self.sock.send(packet)
+        except Exception:
+            Logger.warning(self, "Error sending message to statsd", exc_info=True)
@@ -7,11 +7,18 @@ import os
 import socket
 import ssl
 import stat
+import struct
 import sys
 import time
 
 from gunicorn import util
 
+# struct tcp_info on Linux: for a listening socket, tcpi_unacked holds the
+# length of the accept queue
+TCP_INFO_SIZE = 104
+TCP_INFO_UNACKED = struct.Struct("=I")
+TCP_INFO_UNACKED_OFFSET = 24
+
 
 class BaseSocket:
 
@@ -204,6 +211,34 @@ def create_sockets(conf, log, fds=None):
     return listeners
 
 
+def accept_queue_length(listener):
+    """\
+    Return the number of connections waiting to be accepted on a TCP
+    listener, or None if the system does not report it.
+    """
+    if not sys.platform.startswith("linux") or \
+            listener.family not in (socket.AF_INET, socket.AF_INET6):
+        return None
+    try:
+        info = listener.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO,
+                                   TCP_INFO_SIZE)
+    except OSError:
+        return None
+    return TCP_INFO_UNACKED.unpack_from(info, TCP_INFO_UNACKED_OFFSET)[0]
+
+
+def set_incoming_cpu(listeners, cpu, log):
+    option = getattr(socket, "SO_INCOMING_CPU", None)
+    if option is None:
+        log.warning("SO_INCOMING_CPU is not supported on this platform")
+        return
+    for listener in listeners:
+        try:
+            listener.setsockopt(socket.SOL_SOCKET, option, cpu)
+        except OSError as e:
+            log.warning("Failed to set SO_INCOMING_CPU on %s: %s", listener, e)
+
+
 def close_sockets(listeners, unlink=True):
     for sock in listeners:
         sock_name = sock.getsockname()
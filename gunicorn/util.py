@@ -15,6 +15,7 @@ import pwd
 import random
 import re
 import socket
+import ssl
 import sys
 import textwrap
 import time
@@ -32,6 +33,9 @@ import urllib.parse
 
 REDIRECT_TO = getattr(os, 'devnull', '/dev/null')
 
+# most systems refuse more buffers in a single sendmsg call
+IOV_MAX = 1024
+
 # Server and Date aren't technically hop-by-hop
 # headers, but they are in the purview of the
 # origin server which the WSGI spec says we should
@@ -280,12 +284,15 @@ except ImportError:
                 pass
 
 
+def chunk_buffers(data):
+    """Return ``data`` framed as one chunk, as a list of buffers."""
+    return [b"%X\r\n" % len(data), data, b"\r\n"]
+
+
 def write_chunk(sock, data):
     if isinstance(data, str):
         data = data.encode('utf-8')
-    chunk_size = "%X\r\n" % len(data)
-    chunk = b"".join([chunk_size.encode('utf-8'), data, b"\r\n"])
-    sock.sendall(chunk)
+    writev(sock, chunk_buffers(data))
 
 
 def write(sock, data, chunked=False):
@@ -294,6 +301,36 @@ def write(sock, data, chunked=False):
     sock.sendall(data)
 
 
+def can_sendmsg(sock):
+    # TLS sockets do not implement sendmsg and green sockets of the async
+    # workers may not cooperate with it
+    return isinstance(sock, socket.socket) and \
+        not isinstance(sock, ssl.SSLSocket)
+
+
+def writev(sock, buffers):
+    """\
+    Send ``buffers`` in order, gathered into as few system calls as
+    possible instead of being concatenated first.
+    """
+    if len(buffers) == 1:
+        return sock.sendall(buffers[0])
+    if not can_sendmsg(sock):
+        return sock.sendall(b"".join(buffers))
+
+    buffers = [memoryview(buf).cast("B") for buf in buffers if len(buf)]
+    while buffers:
+        sent = sock.sendmsg(buffers[:IOV_MAX])
+        # drop what went out, a partial send leaves a buffer half sent
+        idx = 0
+        while idx < len(buffers) and sent >= len(buffers[idx]):
+            sent -= len(buffers[idx])
+            idx += 1
+        del buffers[:idx]
+        if sent:
+            buffers[0] = buffers[0][sent:]
+
+
 def write_nonblock(sock, data, chunked=False):
     timeout = sock.gettimeout()
     if timeout != 0.0:
@@ -460,6 +497,56 @@ def http_date(timestamp=None):
     return s
 
 
+# (second, value) of the last Date header value formatted by this process,
+# shared by all of its threads
+_http_date_cache = (None, b"")
+
+
+def http_date_bytes():
+    """\
+    Return the current Date header value as bytes.
+
+    The value is formatted at most once per second.
+    """
+    global _http_date_cache
+    now = int(time.time())
+    second, value = _http_date_cache
+    if second != now:
+        value = http_date(now).encode("latin-1")
+        _http_date_cache = (now, value)
+    return value
+
+
+def set_event_loop_policy(name):
+    """\
+    Install the asyncio event loop policy for the ``worker_loop`` setting
+    ``name`` and return the loop in use, ``"uvloop"`` or ``"asyncio"``.
+    """
+    import asyncio
+
+    if name in ("auto", "uvloop"):
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            return "uvloop"
+    return "asyncio"
+
+
+def setup_event_loop(name, log):
+    """\
+    Install the event loop policy of a worker process with
+    ``set_event_loop_policy()``, and warn when uvloop was asked for but is
+    not installed.
+    """
+    loop = set_event_loop_policy(name)
+    if loop != name and name != "auto":
+        log.warning("uvloop is not installed, using the asyncio event loop")
+    return loop
+
+
 def is_hoppish(header):
     return header.lower().strip() in hop_headers
 
@@ -557,6 +644,23 @@ def seed():
         random.seed('%s.%s' % (time.time(), os.getpid()))
 
 
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def set_cpu_affinity(cpu):
+    """\
+    Pin the current process to ``cpu``. Return False if the platform
+    does not support it.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    os.sched_setaffinity(0, {cpu})
+    return True
+
+
 def check_is_writable(path):
     try:
         with open(path, 'a') as f:
@@ -22,9 +22,9 @@ from gunicorn.http.errors import (
     UnsupportedTransferCoding,
     ConfigurationProblem, ObsoleteFolding,
 )
-from gunicorn.http.wsgi import Response, default_environ
+from gunicorn.http.wsgi import Response, default_environ, warmup_environ
 from gunicorn.reloader import reloader_engines
-from gunicorn.workers.workertmp import WorkerTmp
+from gunicorn.workers.heartbeat import WorkerSlot
 
 
 class Worker:
@@ -48,8 +48,11 @@ class Worker:
         self.app = app
         self.timeout = timeout
         self.cfg = cfg
+        self.spawned = time.monotonic()
         self.booted = False
         self.aborted = False
+        # told by the arbiter to exit once its requests are done
+        self.retiring = False
         self.reloader = None
 
         self.nr = 0
@@ -62,11 +65,22 @@ class Worker:
 
         self.alive = True
         self.log = log
-        self.tmp = WorkerTmp(cfg)
+        # the arbiter gives a slot of its heartbeat table and a CPU before
+        # forking
+        self.tmp = WorkerSlot.local()
+        self.cpu = None
 
     def __str__(self):
         return "<Worker %s>" % self.pid
 
+    @classmethod
+    def concurrency(cls, cfg):
+        """\
+        Return the number of requests a worker of this class serves at
+        once. The autoscaler measures utilization against it.
+        """
+        return 1
+
     def notify(self):
         """\
         Your worker subclass must arrange to have this method called
@@ -110,7 +124,6 @@ class Worker:
         # Prevent fd inheritance
         for s in self.sockets:
             util.close_on_exec(s)
-        util.close_on_exec(self.tmp.fileno())
 
         self.wait_fds = self.sockets + [self.PIPE[0]]
 
@@ -138,8 +151,12 @@ class Worker:
 
         self.cfg.post_worker_init(self)
 
+        if self.cfg.warmup_path:
+            self.warmup()
+
         # Enter main run loop
         self.booted = True
+        self.tmp.set_booted()
         self.run()
 
     def load_wsgi(self):
@@ -165,6 +182,32 @@ class Worker:
             finally:
                 del exc_tb
 
+    def warmup(self):
+        """\
+        Serve ``warmup_path`` once, without a client, so that the first
+        requests do not pay for lazy initialization.
+        """
+        status = []
+
+        def start_response(status_line, headers, exc_info=None):
+            status.append(status_line)
+            return lambda data: None
+
+        try:
+            respiter = self.wsgi(warmup_environ(self.cfg), start_response)
+            try:
+                for _ in respiter:
+                    pass
+            finally:
+                if hasattr(respiter, "close"):
+                    respiter.close()
+        except Exception:
+            self.log.exception("Error handling warmup request %s",
+                               self.cfg.warmup_path)
+            return
+        self.log.debug("Warmup request %s: %s", self.cfg.warmup_path,
+                       status[-1] if status else None)
+
     def init_signals(self):
         # reset signaling
         for s in self.SIGNALS:
@@ -203,6 +246,22 @@ class Worker:
         self.cfg.worker_abort(self)
         sys.exit(1)
 
+    def request_finished(self, req, resp, started):
+        """\
+        Publish the statistics of a handled request, ``started`` being the
+        time returned by ``self.tmp.request_started()``, and pass its
+        timings to the trace_request hook.
+        """
+        timings = getattr(req, "timings", None)
+        if timings is not None and timings.done is None:
+            timings.done = time.monotonic()
+        self.tmp.request_finished(resp, started, timings)
+        if timings is not None:
+            try:
+                self.cfg.trace_request(self, req, timings)
+            except Exception:
+                self.log.exception("Exception in trace_request hook")
+
     def handle_error(self, req, client, addr, exc):
         request_start = datetime.now()
         addr = addr or ('', -1)  # unix socket case
@@ -277,10 +336,19 @@ class Worker:
             resp.response_length = len(mesg)
             self.log.access(resp, req, environ, request_time)
 
+        timings = getattr(req, "timings", None)
+        if timings is not None and timings.first_byte_sent is None:
+            timings.first_byte_sent = time.monotonic()
+        else:
+            timings = None
         try:
             util.write_error(client, status_int, reason, mesg)
         except Exception:
             self.log.debug("Failed to send error message.")
+        else:
+            if timings is not None:
+                timings.done = time.monotonic()
+            self.tmp.error_sent(status_int, timings)
 
     def handle_winch(self, sig, fname):
         # Ignore SIGWINCH in worker. Fixes a crash on OpenBSD.
@@ -21,6 +21,12 @@ class AsyncWorker(base.Worker):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.worker_connections = self.cfg.worker_connections
+        # connections waiting for their next request
+        self.nr_keepalive = 0
+
+    @classmethod
+    def concurrency(cls, cfg):
+        return cfg.worker_connections
 
     def timeout_ctx(self):
         raise NotImplementedError()
@@ -42,9 +48,18 @@ class AsyncWorker(base.Worker):
                     # keepalive loop
                     proxy_protocol_info = {}
                     while True:
+                        idle = req is not None
                         req = None
-                        with self.timeout_ctx():
-                            req = next(parser)
+                        if idle:
+                            self.nr_keepalive += 1
+                            self.tmp.set_keepalive(self.nr_keepalive)
+                        try:
+                            with self.timeout_ctx():
+                                req = next(parser)
+                        finally:
+                            if idle:
+                                self.nr_keepalive -= 1
+                                self.tmp.set_keepalive(self.nr_keepalive)
                         if not req:
                             break
                         if req.proxy_protocol_info:
@@ -90,6 +105,7 @@ class AsyncWorker(base.Worker):
         request_start = datetime.now()
         environ = {}
         resp = None
+        started = self.tmp.request_started()
         try:
             self.cfg.pre_request(self, req)
             resp, environ = wsgi.create(req, sock, addr,
@@ -140,6 +156,7 @@ class AsyncWorker(base.Worker):
                 raise StopIteration()
             raise
         finally:
+            self.request_finished(req, resp, started)
             try:
                 self.cfg.post_request(self, req, environ, resp)
             except Exception:
@@ -0,0 +1,582 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+# design:
+# An asyncio worker accepts connections and reads requests on the event
+# loop. Once a whole request head is buffered it is parsed on the loop by
+# the regular RequestParser, and the WSGI application is run in a bounded
+# thread pool. The pool thread reads the request body from data fed by
+# the loop and writes the response back through the connection transport.
+# Keepalive connections wait for their next request on the loop without
+# holding a thread. A pool thread waits for the client at most ``timeout``
+# seconds at a time, then the connection is aborted, so that stalled
+# clients cannot hold the whole pool.
+
+import asyncio
+from concurrent import futures
+import errno
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from gunicorn import http
+from gunicorn import sock
+from gunicorn import util
+from gunicorn.http import wsgi
+from gunicorn.http.message import MAX_REQUEST_LINE
+from gunicorn.workers import base
+
+# stop reading from a connection while this much of its request body waits
+# for the application, and start again below LOW_WATER. A pool thread
+# writing a response also waits while this much of it is queued for the
+# loop.
+HIGH_WATER = 256 * 1024
+LOW_WATER = 64 * 1024
+
+
+def max_head_size(cfg):
+    """\
+    Return how much of an incomplete request head is buffered on the loop
+    before parsing moves to a pool thread, which can wait for the rest or
+    report an oversized request line right away.
+    """
+    line = cfg.limit_request_line
+    if line <= 0 or line >= MAX_REQUEST_LINE:
+        line = MAX_REQUEST_LINE
+    # proxy protocol line and request line
+    return 108 + line + 2
+
+
+class RequestFeed:
+    """\
+    Data received by the loop while a request is handled, iterated over by
+    the request parser from the pool thread.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cond = threading.Condition()
+        self.chunks = deque()
+        self.size = 0
+        self.eof = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self.cond:
+            while not self.chunks and not self.eof:
+                if not self.cond.wait(self.conn.timeout):
+                    raise self.conn.timed_out()
+            if not self.chunks:
+                raise StopIteration()
+            data = self.chunks.popleft()
+            self.size -= len(data)
+            size = self.size
+        if size < LOW_WATER and self.conn.paused:
+            self.conn.loop.call_soon_threadsafe(self.conn.resume_reading)
+        return data
+
+    def feed(self, data):
+        with self.cond:
+            self.chunks.append(data)
+            self.size += len(data)
+            self.cond.notify()
+
+    def feed_eof(self):
+        with self.cond:
+            self.eof = True
+            self.cond.notify()
+
+    def take(self):
+        with self.cond:
+            chunks = list(self.chunks)
+            self.chunks.clear()
+            self.size = 0
+        return chunks
+
+
+class TransportWriter:
+    """\
+    Socket-like object the response is written to. Writes from pool threads
+    are handed to the loop and wait while the transport buffer is full, or
+    while more than HIGH_WATER bytes wait for the loop to write them.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cond = threading.Condition()
+        # bytes handed to the loop and not written to the transport yet
+        self.pending = 0
+
+    def sendall(self, data):
+        conn = self.conn
+        if threading.get_ident() == conn.worker.loop_thread:
+            conn.write(bytes(data))
+            return
+        data = bytes(data)
+        with self.cond:
+            while self.pending > HIGH_WATER and not conn.closed:
+                if not self.cond.wait(conn.timeout):
+                    raise conn.timed_out()
+            self.pending += len(data)
+        queued = False
+        try:
+            if not conn.can_write.wait(conn.timeout):
+                raise conn.timed_out()
+            if conn.closed:
+                raise OSError(errno.EPIPE, "Connection closed")
+            conn.loop.call_soon_threadsafe(self.write, data)
+            queued = True
+        finally:
+            if not queued:
+                self.written(len(data))
+
+    def write(self, data):
+        # runs on the loop
+        try:
+            self.conn.write(data)
+        finally:
+            self.written(len(data))
+
+    def written(self, size):
+        with self.cond:
+            self.pending -= size
+            self.cond.notify_all()
+
+    def wakeup(self):
+        with self.cond:
+            self.cond.notify_all()
+
+    def gettimeout(self):
+        # writes are queued on the transport, see util.write_nonblock
+        return 0.0
+
+    def sendfile(self, file, offset=0, count=None):
+        file.seek(offset)
+        blocksize = min(count or wsgi.BLKSIZE, 65536)
+        sent = 0
+        while count is None or sent < count:
+            if count is not None:
+                blocksize = min(blocksize, count - sent)
+            data = file.read(blocksize)
+            if not data:
+                break
+            self.sendall(data)
+            sent += len(data)
+        return sent
+
+
+class HttpConnection(asyncio.Protocol):
+
+    def __init__(self, worker, server):
+        self.worker = worker
+        self.cfg = worker.cfg
+        self.loop = worker.loop
+        self.server = server
+        # how long a pool thread waits for the client, 0 waits forever
+        self.timeout = self.cfg.timeout or None
+
+        self.transport = None
+        self.client = None
+        self.parser = None
+        self.unreader = None
+        self.feed = RequestFeed(self)
+        self.writer = TransportWriter(self)
+
+        # a request of this connection is handled by a pool thread
+        self.busy = False
+        # offset the search for the end of the request head resumes at
+        self.scan = 0
+        self.paused = False
+        self.can_write = threading.Event()
+        self.can_write.set()
+        self.closed = False
+        self.keepalive_timer = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.client = transport.get_extra_info("peername") or ('', -1)
+        self.parser = http.RequestParser(self.cfg, self.feed, self.client)
+        self.unreader = self.parser.unreader
+        self.worker.connections.add(self)
+
+    def connection_lost(self, exc):
+        self.closed = True
+        self.can_write.set()
+        self.writer.wakeup()
+        self.feed.feed_eof()
+        self.cancel_keepalive()
+        self.worker.connection_closed(self)
+
+    def pause_writing(self):
+        self.can_write.clear()
+
+    def resume_writing(self):
+        self.can_write.set()
+
+    def resume_reading(self):
+        if self.paused and not self.closed:
+            self.paused = False
+            self.transport.resume_reading()
+
+    def write(self, data):
+        if not self.transport.is_closing():
+            self.transport.write(data)
+
+    def close(self):
+        self.transport.close()
+
+    def abort(self):
+        # wake up the pool thread handling a request of this connection
+        # now, connection_lost() only runs on the next loop iteration
+        self.closed = True
+        self.can_write.set()
+        self.writer.wakeup()
+        self.feed.feed_eof()
+        self.transport.abort()
+
+    def timed_out(self):
+        # runs in a pool thread, return the error to raise there
+        self.loop.call_soon_threadsafe(self.abort)
+        return TimeoutError(errno.ETIMEDOUT, "Timed out waiting for the client")
+
+    def cancel_keepalive(self):
+        if self.keepalive_timer is not None:
+            self.keepalive_timer.cancel()
+            self.keepalive_timer = None
+            self.worker.keepalive_changed(-1)
+
+    def data_received(self, data):
+        self.cancel_keepalive()
+        if self.busy:
+            self.feed.feed(data)
+            if self.feed.size > HIGH_WATER and not self.paused:
+                self.paused = True
+                self.transport.pause_reading()
+            return
+
+        self.unreader.unread(data)
+        self.process()
+
+    def eof_received(self):
+        self.feed.feed_eof()
+        # keep the transport open to send the response of a request that
+        # is being handled
+        return self.busy
+
+    def process(self):
+        unreader = self.unreader
+        idx = unreader.buf.find(b"\r\n\r\n", max(unreader.pos, self.scan))
+        if idx < 0:
+            if unreader.buffered() <= self.worker.max_head:
+                # the terminator may straddle the next read
+                self.scan = max(unreader.pos, len(unreader.buf) - 3)
+                return
+            # let a pool thread parse the head and wait for the rest
+            self.dispatch(None)
+            return
+        self.scan = 0
+
+        req = None
+        try:
+            req = next(self.parser)
+        except StopIteration as e:
+            self.worker.log.debug("Closing connection. %s", e)
+            self.close()
+            return
+        except http.errors.NoMoreData as e:
+            self.worker.log.debug("Ignored premature client disconnection. %s", e)
+            self.close()
+            return
+        except Exception as e:
+            self.worker.handle_error(req, self.writer, self.client, e)
+            self.close()
+            return
+        self.dispatch(req)
+
+    def dispatch(self, req):
+        self.busy = True
+        self.scan = 0
+        fs = self.loop.run_in_executor(self.worker.executor,
+                                       self.worker.handle, self, req)
+        fs.add_done_callback(self.request_done)
+
+    def request_done(self, fs):
+        self.busy = False
+        keepalive = not fs.cancelled() and fs.exception() is None and fs.result()
+        if not keepalive or not self.worker.alive or self.closed:
+            self.close()
+            return
+
+        # data received while the request was handled belongs to the parser
+        for data in self.feed.take():
+            self.unreader.unread(data)
+        self.resume_reading()
+
+        # pipelined requests
+        if self.unreader.buffered():
+            self.process()
+            if self.busy or self.closed:
+                return
+
+        if self.feed.eof:
+            self.close()
+        else:
+            self.keepalive_timer = self.loop.call_later(self.cfg.keepalive,
+                                                        self.close)
+            self.worker.keepalive_changed(1)
+
+
+class AsyncioWorker(base.Worker):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.worker_connections = self.cfg.worker_connections
+        self.max_head = max_head_size(self.cfg)
+        self.loop = None
+        self.loop_thread = None
+        self.stopping = None
+        self.executor = None
+        self.ssl_context = None
+        self.listeners = []
+        self.accepting = False
+        self.connections = set()
+        self.nr_conns = 0
+        # connections waiting for their next request
+        self.nr_keepalive = 0
+
+    @classmethod
+    def concurrency(cls, cfg):
+        return cfg.threads
+
+    def init_process(self):
+        util.setup_event_loop(self.cfg.worker_loop, self.log)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop_thread = threading.get_ident()
+        self.executor = self.get_executor()
+        super().init_process()
+
+    def get_executor(self):
+        """Override this method to customize how the thread pool is created"""
+        return futures.ThreadPoolExecutor(max_workers=self.cfg.threads)
+
+    def handle_quit(self, sig, frame):
+        self.alive = False
+        # worker_int callback
+        self.cfg.worker_int(self)
+        self.executor.shutdown(False)
+        time.sleep(0.1)
+        sys.exit(0)
+
+    def start_accepting(self):
+        if self.accepting:
+            return
+        self.accepting = True
+        for listener, server in self.listeners:
+            self.loop.add_reader(listener, self.accept, listener, server)
+
+    def stop_accepting(self):
+        if not self.accepting:
+            return
+        self.accepting = False
+        for listener, _ in self.listeners:
+            self.loop.remove_reader(listener)
+
+    def accept(self, listener, server):
+        try:
+            client, _ = listener.accept()
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.ECONNABORTED,
+                               errno.EWOULDBLOCK):
+                raise
+            return
+
+        client.setblocking(False)
+        self.nr_conns += 1
+        if self.nr_conns >= self.worker_connections:
+            self.stop_accepting()
+        self.loop.create_task(self.connect(client, server))
+
+    async def connect(self, client, server):
+        try:
+            await self.loop.connect_accepted_socket(
+                lambda: HttpConnection(self, server), client,
+                ssl=self.ssl_context)
+        except Exception as e:
+            # the TLS handshake failed
+            self.log.debug("Failed to set up connection. %s", e)
+            client.close()
+            self.connection_closed(None)
+
+    def connection_closed(self, conn):
+        self.connections.discard(conn)
+        self.nr_conns -= 1
+        if self.alive and self.nr_conns < self.worker_connections:
+            self.start_accepting()
+
+    def keepalive_changed(self, delta):
+        self.nr_keepalive += delta
+        self.tmp.set_keepalive(self.nr_keepalive)
+
+    def on_wakeup(self):
+        try:
+            os.read(self.PIPE[0], 4096)
+        except OSError:
+            pass
+        if not self.alive:
+            # start the graceful shutdown now rather than on the next tick
+            self.stopping.set()
+
+    def run(self):
+        if self.cfg.is_ssl:
+            self.ssl_context = sock.ssl_context(self.cfg)
+
+        for listener in self.sockets:
+            listener.setblocking(False)
+            # a race condition during graceful shutdown may make the listener
+            # name unavailable in the request handler so capture it once here
+            self.listeners.append((listener, listener.getsockname()))
+
+        # drain signal wakeups
+        self.stopping = asyncio.Event()
+        self.loop.add_reader(self.PIPE[0], self.on_wakeup)
+        self.start_accepting()
+        try:
+            self.loop.run_until_complete(self.serve())
+        finally:
+            self.executor.shutdown(False)
+            self.loop.close()
+
+    async def serve(self):
+        while self.alive:
+            # notify the arbiter we are alive
+            self.notify()
+
+            # If our parent changed then we shut down.
+            if self.ppid != os.getppid():
+                self.log.info("Parent changed, shutting down: %s", self)
+                break
+
+            try:
+                await asyncio.wait_for(self.stopping.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+
+        self.alive = False
+        self.stop_accepting()
+        for listener, _ in self.listeners:
+            listener.close()
+
+        # close idle connections, let handled requests finish
+        for conn in list(self.connections):
+            if not conn.busy:
+                conn.close()
+        deadline = time.monotonic() + self.cfg.graceful_timeout
+        while self.connections and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        # the pool threads still reading a request body or writing a
+        # response would otherwise wait for the loop forever
+        for conn in list(self.connections):
+            conn.abort()
+        await asyncio.sleep(0)
+
+    def handle(self, conn, req):
+        # runs in a pool thread
+        keepalive = False
+        try:
+            if req is None:
+                req = next(conn.parser)
+            keepalive = self.handle_request(req, conn)
+            if keepalive:
+                # read what the application left of the body here, the
+                # loop must never wait for the client
+                while req.body.read(8192):
+                    pass
+        except http.errors.NoMoreData as e:
+            self.log.debug("Ignored premature client disconnection. %s", e)
+            keepalive = False
+        except StopIteration as e:
+            self.log.debug("Closing connection. %s", e)
+            keepalive = False
+        except TimeoutError as e:
+            self.log.debug("Closing connection. %s", e)
+            keepalive = False
+        except OSError as e:
+            if e.errno not in (errno.EPIPE, errno.ECONNRESET, errno.ENOTCONN):
+                self.log.exception("Socket error processing request.")
+            else:
+                if e.errno == errno.ECONNRESET:
+                    self.log.debug("Ignoring connection reset")
+                elif e.errno == errno.ENOTCONN:
+                    self.log.debug("Ignoring socket not connected")
+                else:
+                    self.log.debug("Ignoring connection epipe")
+            keepalive = False
+        except Exception as e:
+            self.handle_error(req, conn.writer, conn.client, e)
+            keepalive = False
+        return keepalive
+
+    def handle_request(self, req, conn):
+        environ = {}
+        resp = None
+        started = self.tmp.request_started()
+        try:
+            self.cfg.pre_request(self, req)
+            request_start = datetime.now()
+            resp, environ = wsgi.create(req, conn.writer, conn.client,
+                                        conn.server, self.cfg)
+            environ["wsgi.multithread"] = True
+            self.nr += 1
+            if self.nr >= self.max_requests:
+                if self.alive:
+                    self.log.info("Autorestarting worker after current request.")
+                    self.alive = False
+                resp.force_close()
+
+            if not self.alive or not self.cfg.keepalive:
+                resp.force_close()
+
+            respiter = self.wsgi(environ, resp.start_response)
+            try:
+                if isinstance(respiter, environ['wsgi.file_wrapper']):
+                    resp.write_file(respiter)
+                else:
+                    for item in respiter:
+                        resp.write(item)
+
+                resp.close()
+            finally:
+                request_time = datetime.now() - request_start
+                self.log.access(resp, req, environ, request_time)
+                if hasattr(respiter, "close"):
+                    respiter.close()
+
+            if resp.should_close():
+                self.log.debug("Closing connection.")
+                return False
+        except OSError:
+            # pass to next try-except level
+            raise
+        except Exception:
+            if resp and resp.headers_sent:
+                # If the requests have already been sent, we should close the
+                # connection to indicate the error.
+                self.log.exception("Error handling request")
+                raise StopIteration()
+            raise
+        finally:
+            self.request_finished(req, resp, started)
+            try:
+                self.cfg.post_request(self, req, environ, resp)
+            except Exception:
+                self.log.exception("Exception in post_request hook")
+
+        return True
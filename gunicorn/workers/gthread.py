@@ -8,11 +8,17 @@
 # Keepalive connections are put back in the loop waiting for an event.
 # If no event happen after the keep alive timeout, the connection is
 # closed.
+# Only the main loop touches the poller and the keepalive structures. Pool
+# threads hand finished connections back through a completion queue and
+# wake the loop up through the worker pipe.
 # pylint: disable=no-else-break
 
 from concurrent import futures
 import errno
+import heapq
+import itertools
 import os
+import select
 import selectors
 import socket
 import ssl
@@ -21,7 +27,6 @@ import time
 from collections import deque
 from datetime import datetime
 from functools import partial
-from threading import RLock
 
 from . import base
 from .. import http
@@ -41,6 +46,7 @@ class TConn:
         self.timeout = None
         self.parser = None
         self.initialized = False
+        self.accepted = time.monotonic()
 
         # set the socket to non blocking
         self.sock.setblocking(False)
@@ -56,10 +62,11 @@ class TConn:
 
             # initialize the parser
             self.parser = http.RequestParser(self.cfg, self.sock, self.client)
+            self.parser.accepted = self.accepted
 
     def set_timeout(self):
         # set the timeout
-        self.timeout = time.time() + self.cfg.keepalive
+        self.timeout = time.monotonic() + self.cfg.keepalive
 
     def close(self):
         util.close(self.sock)
@@ -67,6 +74,10 @@ class TConn:
 
 class ThreadWorker(base.Worker):
 
+    # pipelined requests served in a row on a connection before it goes
+    # back to the poller, so that other connections get their turn
+    pipeline_budget = 16
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.worker_connections = self.cfg.worker_connections
@@ -74,11 +85,21 @@ class ThreadWorker(base.Worker):
         # initialise the pool
         self.tpool = None
         self.poller = None
-        self._lock = None
-        self.futures = deque()
-        self._keep = deque()
+        self.futures = set()
+        # futures completed by the pool threads, drained by the main loop
+        self._done = deque()
+        # keepalive connections, and their (timeout, seq, conn) entries
+        # ordered by timeout. Entries of connections that left keepalive
+        # are dropped once they expire.
+        self._keep = set()
+        self._keep_timeouts = []
+        self._keep_seq = itertools.count()
         self.nr_conns = 0
 
+    @classmethod
+    def concurrency(cls, cfg):
+        return cfg.threads
+
     @classmethod
     def check_config(cls, cfg, log):
         max_keepalived = cfg.worker_connections - cfg.threads
@@ -90,7 +111,6 @@ class ThreadWorker(base.Worker):
     def init_process(self):
         self.tpool = self.get_thread_pool()
         self.poller = selectors.DefaultSelector()
-        self._lock = RLock()
         super().init_process()
 
     def get_thread_pool(self):
@@ -107,10 +127,34 @@ class ThreadWorker(base.Worker):
 
     def _wrap_future(self, fs, conn):
         fs.conn = conn
-        self.futures.append(fs)
-        fs.add_done_callback(self.finish_request)
+        self.futures.add(fs)
+        fs.add_done_callback(self.request_done)
+
+    def request_done(self, fs):
+        # called from the pool thread, hand the future to the main loop
+        self._done.append(fs)
+        try:
+            os.write(self.PIPE[1], b".")
+        except OSError:
+            # the pipe is full, the loop is waking up already
+            pass
+
+    def on_wakeup(self, fd):
+        try:
+            os.read(fd, 4096)
+        except OSError:
+            pass
+
+    def process_done(self):
+        while self._done:
+            fs = self._done.popleft()
+            self.futures.discard(fs)
+            self.finish_request(fs)
 
     def enqueue_req(self, conn):
+        if conn.parser is not None:
+            # the next request of a keep-alive connection waits from now
+            conn.parser.accepted = time.monotonic()
         conn.init()
         # submit the connection to a worker
         fs = self.tpool.submit(self.handle, conn)
@@ -124,64 +168,59 @@ class ThreadWorker(base.Worker):
 
             self.nr_conns += 1
             # wait until socket is readable
-            with self._lock:
-                self.poller.register(conn.sock, selectors.EVENT_READ,
-                                     partial(self.on_client_socket_readable, conn))
+            self.poller.register(conn.sock, selectors.EVENT_READ,
+                                 partial(self.on_client_socket_readable, conn))
         except OSError as e:
             if e.errno not in (errno.EAGAIN, errno.ECONNABORTED,
                                errno.EWOULDBLOCK):
                 raise
 
     def on_client_socket_readable(self, conn, client):
-        with self._lock:
-            # unregister the client from the poller
-            self.poller.unregister(client)
+        # unregister the client from the poller
+        self.poller.unregister(client)
 
-            if conn.initialized:
-                # remove the connection from keepalive
-                try:
-                    self._keep.remove(conn)
-                except ValueError:
-                    # race condition
-                    return
+        # remove the connection from keepalive
+        self._keep.discard(conn)
 
         # submit the connection to a worker
         self.enqueue_req(conn)
 
-    def murder_keepalived(self):
-        now = time.time()
-        while True:
-            with self._lock:
-                try:
-                    # remove the connection from the queue
-                    conn = self._keep.popleft()
-                except IndexError:
-                    break
+    def keepalive(self, conn):
+        conn.set_timeout()
+        self._keep.add(conn)
+        heapq.heappush(self._keep_timeouts,
+                       (conn.timeout, next(self._keep_seq), conn))
 
-            delta = conn.timeout - now
-            if delta > 0:
-                # add the connection back to the queue
-                with self._lock:
-                    self._keep.appendleft(conn)
-                break
-            else:
-                self.nr_conns -= 1
-                # remove the socket from the poller
-                with self._lock:
-                    try:
-                        self.poller.unregister(conn.sock)
-                    except OSError as e:
-                        if e.errno != errno.EBADF:
-                            raise
-                    except KeyError:
-                        # already removed by the system, continue
-                        pass
-                    except ValueError:
-                        # already removed by the system continue
-                        pass
-
-                # close the socket
-                conn.close()
+        # add the socket to the event loop
+        self.poller.register(conn.sock, selectors.EVENT_READ,
+                             partial(self.on_client_socket_readable, conn))
+
+    def murder_keepalived(self):
+        now = time.monotonic()
+        timeouts = self._keep_timeouts
+        while timeouts and timeouts[0][0] <= now:
+            timeout, _, conn = heapq.heappop(timeouts)
+            if conn not in self._keep or conn.timeout != timeout:
+                # the connection left keepalive since this entry was added
+                continue
+
+            self._keep.remove(conn)
+            self.nr_conns -= 1
+            # remove the socket from the poller
+            try:
+                self.poller.unregister(conn.sock)
+            except OSError as e:
+                if e.errno != errno.EBADF:
+                    raise
+            except KeyError:
+                # already removed by the system, continue
+                pass
+            except ValueError:
+                # already removed by the system continue
+                pass
+
+            # close the socket
+            conn.close()
 
     def is_parent_alive(self):
         # If our parent changed then we shut down.
@@ -200,6 +239,9 @@ class ThreadWorker(base.Worker):
             acceptor = partial(self.accept, server)
             self.poller.register(sock, selectors.EVENT_READ, acceptor)
 
+        # woken up by finished requests and signals
+        self.poller.register(self.PIPE[0], selectors.EVENT_READ, self.on_wakeup)
+
         while self.alive:
             # notify the arbiter we are alive
             self.notify()
@@ -211,18 +253,14 @@ class ThreadWorker(base.Worker):
                 for key, _ in events:
                     callback = key.data
                     callback(key.fileobj)
-
-                # check (but do not wait) for finished requests
-                result = futures.wait(self.futures, timeout=0,
-                                      return_when=futures.FIRST_COMPLETED)
-            else:
+            elif not self._done:
                 # wait for a request to finish
-                result = futures.wait(self.futures, timeout=1.0,
-                                      return_when=futures.FIRST_COMPLETED)
+                ready, _, _ = select.select([self.PIPE[0]], [], [], 1.0)
+                if ready:
+                    self.on_wakeup(self.PIPE[0])
 
             # clean up finished requests
-            for fut in result.done:
-                self.futures.remove(fut)
+            self.process_done()
 
             if not self.is_parent_alive():
                 break
@@ -230,6 +268,9 @@ class ThreadWorker(base.Worker):
             # handle keepalive timeouts
             self.murder_keepalived()
 
+            if len(self._keep) != self.tmp.keepalive:
+                self.tmp.set_keepalive(len(self._keep))
+
         self.tpool.shutdown(False)
         self.poller.close()
 
@@ -237,6 +278,7 @@ class ThreadWorker(base.Worker):
             s.close()
 
         futures.wait(self.futures, timeout=self.cfg.graceful_timeout)
+        self.process_done()
 
     def finish_request(self, fs):
         if fs.cancelled():
@@ -248,18 +290,16 @@ class ThreadWorker(base.Worker):
             (keepalive, conn) = fs.result()
             # if the connection should be kept alived add it
             # to the eventloop and record it
-            if keepalive and self.alive:
+            if keepalive and self.alive and conn.parser.has_pending():
+                # the next request is already buffered and the poller
+                # would not wake up for it, queue the connection again
+                self.enqueue_req(conn)
+            elif keepalive and self.alive:
                 # flag the socket as non blocked
                 conn.sock.setblocking(False)
 
                 # register the connection
-                conn.set_timeout()
-                with self._lock:
-                    self._keep.append(conn)
-
-                    # add the socket to the event loop
-                    self.poller.register(conn.sock, selectors.EVENT_READ,
-                                         partial(self.on_client_socket_readable, conn))
+                self.keepalive(conn)
             else:
                 self.nr_conns -= 1
                 conn.close()
@@ -272,15 +312,24 @@ class ThreadWorker(base.Worker):
     def handle(self, conn):
         keepalive = False
         req = None
+        budget = self.pipeline_budget
         try:
-            req = next(conn.parser)
-            if not req:
-                return (False, conn)
-
-            # handle the request
-            keepalive = self.handle_request(req, conn)
-            if keepalive:
-                return (keepalive, conn)
+            while True:
+                req = next(conn.parser)
+                if not req:
+                    return (False, conn)
+
+                # handle the request
+                keepalive = self.handle_request(req, conn)
+                if not keepalive:
+                    break
+
+                # serve the next request right away if it is already
+                # buffered, instead of waiting for the poller
+                budget -= 1
+                if budget <= 0 or not self.alive or \
+                        not conn.parser.has_pending():
+                    return (keepalive, conn)
         except http.errors.NoMoreData as e:
             self.log.debug("Ignored premature client disconnection. %s", e)
 
@@ -312,6 +361,7 @@ class ThreadWorker(base.Worker):
     def handle_request(self, req, conn):
         environ = {}
         resp = None
+        started = self.tmp.request_started()
         try:
             self.cfg.pre_request(self, req)
             request_start = datetime.now()
@@ -364,6 +414,7 @@ class ThreadWorker(base.Worker):
                 raise StopIteration()
             raise
         finally:
+            self.request_finished(req, resp, started)
             try:
                 self.cfg.post_request(self, req, environ, resp)
             except Exception:
@@ -15,6 +15,7 @@ from tornado.ioloop import IOLoop, PeriodicCallback
 from tornado.wsgi import WSGIContainer
 from gunicorn.workers.base import Worker
 from gunicorn import __version__ as gversion
+from gunicorn import util
 from gunicorn.sock import ssl_context
 
 
@@ -83,8 +84,13 @@ class TornadoWorker(Worker):
         # should create its own IOLoop. We should clear current IOLoop
         # if exists before os.fork.
         IOLoop.clear_current()
+        if TORNADO5:
+            self.set_event_loop()
         super().init_process()
 
+    def set_event_loop(self):
+        util.setup_event_loop(self.cfg.worker_loop, self.log)
+
     def run(self):
         self.ioloop = IOLoop.instance()
         self.alive = True
@@ -0,0 +1,265 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+# design:
+# The arbiter maps anonymous shared memory before forking and gives every
+# worker a fixed-size slot in it. Workers store their monotonic time in the
+# slot and the arbiter reads it back from its own mapping, so neither side
+# makes a syscall for the heartbeat. The table grows one page at a time
+# when more workers are spawned than the mapped slots can hold; pages are
+# never unmapped so workers keep the mapping they were forked with. With
+# worker_tmp_dir set, the pages map unlinked files in that directory
+# instead of anonymous memory.
+#
+# The rest of the first cache line holds the worker's live counters:
+# requests in flight, idle keep-alive connections, requests served and body
+# bytes sent, then a flag raised once the worker booted. The next ones hold
+# the request latency histogram, the responses per status class and a
+# histogram per phase of the requests. Each slot has a single writing
+# process, the arbiter only reads them.
+
+import bisect
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from gunicorn.http.timings import PHASES
+
+# whole cache lines, so that workers do not share one
+SLOT_SIZE = 1024
+SLOTS_PER_PAGE = max(1, mmap.PAGESIZE // SLOT_SIZE)
+
+HEARTBEAT = struct.Struct("=d")
+COUNTERS = struct.Struct("=qqQQ")
+SLOT = struct.Struct("=dqqQQ")
+BOOTED = struct.Struct("=B")
+
+STATS = ("in_flight", "keepalive", "requests", "bytes_sent")
+
+# upper bounds in seconds of the request latency histogram buckets, the
+# last bucket counts the slower requests
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+METRICS_OFFSET = 64
+HISTOGRAM = struct.Struct("=%dQd" % (len(LATENCY_BUCKETS) + 1))
+STATUSES = struct.Struct("=%dQ" % len(STATUS_CLASSES))
+PHASES_OFFSET = METRICS_OFFSET + HISTOGRAM.size + STATUSES.size
+PHASE_NAMES = tuple(name for (name, _, _) in PHASES)
+
+
+class WorkerSlot:
+    """\
+    A worker's slot in the heartbeat table.
+
+    It replaces the worker temporary file: ``notify()`` and
+    ``last_update()`` keep their meaning, without touching the filesystem.
+    The worker publishes its counters with the ``request_*`` and
+    ``set_keepalive`` methods, the arbiter reads them with ``stats()``.
+    """
+
+    def __init__(self, table, page, index):
+        self.table = table
+        self.page = page
+        self.index = index
+        self.offset = (index % SLOTS_PER_PAGE) * SLOT_SIZE
+        # counters of the worker process, published after every change.
+        # Threaded workers update them from several threads.
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.keepalive = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.statuses = [0] * len(STATUS_CLASSES)
+        self.phases = {name: [0] * (len(LATENCY_BUCKETS) + 1)
+                       for name in PHASE_NAMES}
+        self.phase_sums = dict.fromkeys(PHASE_NAMES, 0.0)
+        # a booting worker is not timed out before its first notify(), as
+        # it was not with the temporary file
+        SLOT.pack_into(page, self.offset, math.inf, 0, 0, 0, 0)
+        BOOTED.pack_into(page, self.offset + SLOT.size, 0)
+        self.publish_metrics()
+
+    @classmethod
+    def local(cls):
+        """\
+        Return a slot of its own, shared with no other process, for a
+        worker that is not spawned by the arbiter.
+        """
+        return cls(None, bytearray(SLOT_SIZE), 0)
+
+    def notify(self):
+        HEARTBEAT.pack_into(self.page, self.offset, time.monotonic())
+
+    def last_update(self):
+        return HEARTBEAT.unpack_from(self.page, self.offset)[0]
+
+    def set_booted(self):
+        BOOTED.pack_into(self.page, self.offset + SLOT.size, 1)
+
+    def booted(self):
+        return BOOTED.unpack_from(self.page, self.offset + SLOT.size)[0] == 1
+
+    def request_started(self):
+        """\
+        Count a request in flight and return its start time, to be given
+        back to ``request_finished()``.
+        """
+        with self.lock:
+            self.in_flight += 1
+            self.publish()
+        return time.monotonic()
+
+    def request_finished(self, resp, started, timings=None):
+        duration = time.monotonic() - started
+        sent = resp.sent if resp else 0
+        # the status of a response that did not go out is counted by
+        # error_sent(), with the error sent instead
+        status = None
+        if resp is not None and resp.headers_sent:
+            status = resp.status_code
+        phases = timings.phases() if timings is not None else {}
+        with self.lock:
+            self.in_flight -= 1
+            self.requests += 1
+            self.bytes_sent += sent
+            self.publish()
+            self.latency[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+            self.latency_sum += duration
+            self.add_status(status)
+            for name, value in phases.items():
+                self.add_phase(name, value)
+            self.publish_metrics()
+
+    def error_sent(self, status, timings=None):
+        """\
+        Count an error response sent by the worker instead of the
+        application's, and the phases it completed.
+        """
+        with self.lock:
+            self.add_status(status)
+            if timings is not None:
+                for name in ("app", "write"):
+                    value = timings.phase(name)
+                    if value is not None:
+                        self.add_phase(name, value)
+            self.publish_metrics()
+
+    def add_status(self, status):
+        if status is not None and 100 <= status < 600:
+            self.statuses[status // 100 - 1] += 1
+
+    def add_phase(self, name, value):
+        self.phases[name][bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.phase_sums[name] += value
+
+    def set_keepalive(self, count):
+        with self.lock:
+            self.keepalive = count
+            self.publish()
+
+    def publish(self):
+        COUNTERS.pack_into(self.page, self.offset + HEARTBEAT.size,
+                           self.in_flight, self.keepalive, self.requests,
+                           self.bytes_sent)
+
+    def publish_metrics(self):
+        offset = self.offset + METRICS_OFFSET
+        HISTOGRAM.pack_into(self.page, offset, *self.latency,
+                            self.latency_sum)
+        STATUSES.pack_into(self.page, offset + HISTOGRAM.size, *self.statuses)
+        offset = self.offset + PHASES_OFFSET
+        for name in PHASE_NAMES:
+            HISTOGRAM.pack_into(self.page, offset, *self.phases[name],
+                                self.phase_sums[name])
+            offset += HISTOGRAM.size
+
+    def metrics(self):
+        """\
+        Return the request latency histogram last published by the worker,
+        as the counts of each bucket and the sum of the latencies, the
+        number of responses per status class and the histogram of each
+        phase of the requests.
+        """
+        offset = self.offset + METRICS_OFFSET
+        values = HISTOGRAM.unpack_from(self.page, offset)
+        statuses = STATUSES.unpack_from(self.page, offset + HISTOGRAM.size)
+        phases = {}
+        offset = self.offset + PHASES_OFFSET
+        for name in PHASE_NAMES:
+            phase = HISTOGRAM.unpack_from(self.page, offset)
+            phases[name] = {"latency": list(phase[:-1]),
+                            "latency_sum": phase[-1]}
+            offset += HISTOGRAM.size
+        return {"latency": list(values[:-1]),
+                "latency_sum": values[-1],
+                "statuses": dict(zip(STATUS_CLASSES, statuses)),
+                "phases": phases}
+
+    def stats(self):
+        """\
+        Return the counters last published by the worker as a dict.
+        """
+        values = COUNTERS.unpack_from(self.page, self.offset + HEARTBEAT.size)
+        return dict(zip(STATS, values))
+
+    def close(self):
+        # only gives the slot back to this process' table, the memory stays
+        # mapped for the processes sharing it
+        if self.table is not None:
+            self.table.release(self.index)
+            self.table = None
+
+
+class HeartbeatTable:
+    """\
+    Shared memory holding a heartbeat slot per worker.
+
+    It must be created, and slots acquired, in the arbiter before forking.
+    """
+
+    def __init__(self, tmp_dir=None):
+        self.tmp_dir = tmp_dir
+        self.pages = []
+        self.free = []
+
+    def acquire(self):
+        if not self.free:
+            self.grow()
+        index = self.free.pop()
+        page = self.pages[index // SLOTS_PER_PAGE]
+        return WorkerSlot(self, page, index)
+
+    def release(self, index):
+        self.free.append(index)
+
+    def grow(self):
+        start = len(self.pages) * SLOTS_PER_PAGE
+        size = SLOTS_PER_PAGE * SLOT_SIZE
+        if self.tmp_dir is None:
+            self.pages.append(mmap.mmap(-1, size))
+        else:
+            self.pages.append(self.map_file(size))
+        # hand out the lowest slots first
+        self.free.extend(reversed(range(start, start + SLOTS_PER_PAGE)))
+
+    def map_file(self, size):
+        if not os.path.isdir(self.tmp_dir):
+            raise RuntimeError("%s doesn't exist. Can't create the heartbeat "
+                               "table." % self.tmp_dir)
+        fd, name = tempfile.mkstemp(prefix="wgunicorn-", dir=self.tmp_dir)
+        try:
+            # the mapping keeps the memory, not the name
+            os.unlink(name)
+            os.ftruncate(fd, size)
+            return mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
@@ -24,6 +24,8 @@ class StopWaiting(Exception):
 
 class SyncWorker(base.Worker):
 
+    poller = None
+
     def accept(self, listener):
         client, addr = listener.accept()
         client.setblocking(1)
@@ -33,11 +35,14 @@ class SyncWorker(base.Worker):
     def wait(self, timeout):
         try:
             self.notify()
-            ret = select.select(self.wait_fds, [], [], timeout)
-            if ret[0]:
-                if self.PIPE[0] in ret[0]:
+            if self.poller is not None:
+                ready = [self.wait_map[fd] for fd, _ in self.poller.poll(timeout)]
+            else:
+                ready = select.select(self.wait_fds, [], [], timeout)[0]
+            if ready:
+                if self.PIPE[0] in ready:
                     os.read(self.PIPE[0], 1)
-                return ret[0]
+                return ready
 
         except OSError as e:
             if e.args[0] == errno.EINTR:
@@ -49,6 +54,28 @@ class SyncWorker(base.Worker):
                     raise StopWaiting
             raise
 
+    def init_poller(self):
+        """\
+        Wait on epoll with ``EPOLLEXCLUSIVE`` where available, so that a new
+        connection wakes up a single idle worker rather than all of them.
+        """
+        if not hasattr(select, "EPOLLEXCLUSIVE"):
+            return None
+
+        poller = select.epoll()
+        try:
+            for s in self.sockets:
+                poller.register(s.fileno(),
+                                select.EPOLLIN | select.EPOLLEXCLUSIVE)
+            poller.register(self.PIPE[0], select.EPOLLIN)
+        except OSError:
+            poller.close()
+            return None
+
+        self.wait_map = {s.fileno(): s for s in self.sockets}
+        self.wait_map[self.PIPE[0]] = self.PIPE[0]
+        return poller
+
     def is_parent_alive(self):
         # If our parent changed then we shut down.
         if self.ppid != os.getppid():
@@ -119,10 +146,16 @@ class SyncWorker(base.Worker):
         for s in self.sockets:
             s.setblocking(0)
 
-        if len(self.sockets) > 1:
-            self.run_for_multiple(timeout)
-        else:
-            self.run_for_one(timeout)
+        self.poller = self.init_poller()
+        try:
+            if len(self.sockets) > 1:
+                self.run_for_multiple(timeout)
+            else:
+                self.run_for_one(timeout)
+        finally:
+            if self.poller is not None:
+                self.poller.close()
+                self.poller = None
 
     def handle(self, listener, client, addr):
         req = None
@@ -161,6 +194,7 @@ class SyncWorker(base.Worker):
     def handle_request(self, listener, req, client, addr):
         environ = {}
         resp = None
+        started = self.tmp.request_started()
         try:
             self.cfg.pre_request(self, req)
             request_start = datetime.now()
@@ -203,6 +237,7 @@ class SyncWorker(base.Worker):
                 raise StopIteration()
             raise
         finally:
+            self.request_finished(req, resp, started)
             try:
                 self.cfg.post_request(self, req, environ, resp)
             except Exception:
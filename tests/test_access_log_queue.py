@@ -0,0 +1,125 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import io
+import logging
+import logging.handlers
+
+from gunicorn.glogging import AccessLogQueue
+
+
+class Log:
+
+    def __init__(self):
+        self.messages = []
+
+    def log(self, lvl, msg, *args, **kwargs):
+        self.messages.append((lvl, msg % args, kwargs.get("extra")))
+
+    def exception(self, msg, *args, **kwargs):
+        self.messages.append((logging.ERROR, msg % args, None))
+
+
+class CountingStream(io.StringIO):
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+
+def make_logger(name, handler):
+    logger = logging.getLogger("gunicorn.test.%s" % name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def make_records(logger, n):
+    return [logger.makeRecord(logger.name, logging.INFO, __file__, 0,
+                              "line %d", (i,), None)
+            for i in range(n)]
+
+
+def test_stream_handler_batched():
+    stream = CountingStream()
+    logger = make_logger("stream", logging.StreamHandler(stream))
+    q = AccessLogQueue(logger, Log(), 16, "drop")
+
+    q.write(make_records(logger, 5))
+
+    assert stream.getvalue() == "".join("line %d\n" % i for i in range(5))
+    assert stream.writes == 1
+
+
+def test_rotating_handler_rolls_over(tmp_path):
+    path = tmp_path / "access.log"
+    handler = logging.handlers.RotatingFileHandler(str(path), maxBytes=20,
+                                                   backupCount=3)
+    logger = make_logger("rotating", handler)
+    q = AccessLogQueue(logger, Log(), 16, "drop")
+    try:
+        q.write(make_records(logger, 6))
+    finally:
+        handler.close()
+
+    # every record went through emit(), which rotated the file
+    assert (tmp_path / "access.log.1").exists()
+    lines = []
+    for name in ("access.log.3", "access.log.2", "access.log.1",
+                 "access.log"):
+        if (tmp_path / name).exists():
+            lines.extend((tmp_path / name).read_text().splitlines())
+    assert lines[-2:] == ["line 4", "line 5"]
+    assert all(len(p.read_text()) <= 20 for p in tmp_path.iterdir())
+
+
+def test_handler_level_and_filter():
+    stream = CountingStream()
+    handler = logging.StreamHandler(stream)
+    handler.addFilter(lambda r: r.args[0] % 2 == 0)
+    logger = make_logger("filter", handler)
+    q = AccessLogQueue(logger, Log(), 16, "drop")
+
+    q.write(make_records(logger, 4))
+
+    assert stream.getvalue() == "line 0\nline 2\n"
+
+
+def test_drop_when_full():
+    log = Log()
+    logger = make_logger("drop", logging.StreamHandler(CountingStream()))
+    q = AccessLogQueue(logger, log, 2, "drop")
+
+    for record in make_records(logger, 5):
+        q.put(record)
+
+    assert q.queue.qsize() == 2
+    assert q.dropped == 3
+    q.report()
+    q.report()
+    assert len(log.messages) == 1
+    lvl, msg, extra = log.messages[0]
+    assert lvl == logging.WARNING
+    assert msg == "Dropped 3 access log records, the queue is full"
+    assert extra["metric"] == "gunicorn.access_log.dropped"
+    assert extra["value"] == 3
+
+
+def test_close_drains_queue():
+    stream = CountingStream()
+    logger = make_logger("close", logging.StreamHandler(stream))
+    q = AccessLogQueue(logger, Log(), 16, "block")
+    for record in make_records(logger, 3):
+        q.put(record)
+
+    q.start()
+    q.close()
+
+    assert not q.thread.is_alive()
+    assert stream.getvalue() == "line 0\nline 1\nline 2\n"
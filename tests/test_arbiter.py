@@ -0,0 +1,274 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import os
+import signal
+import time
+
+import pytest
+
+from gunicorn import arbiter as arbiter_module, util
+from gunicorn.app.base import BaseApplication
+from gunicorn.arbiter import Arbiter
+from gunicorn.workers.sync import SyncWorker
+
+
+class DummyApplication(BaseApplication):
+
+    def __init__(self, **settings):
+        self.settings = settings
+        super().__init__()
+
+    def load_config(self):
+        for name, value in self.settings.items():
+            self.cfg.set(name, value)
+
+    def load(self):
+        return None
+
+
+def make_arbiter(workers, **settings):
+    arbiter = Arbiter(DummyApplication(workers=workers, **settings))
+    arbiter.pid = os.getpid()
+    arbiter.WORKERS = {}
+    arbiter.killed = []
+    arbiter.kill_worker = lambda pid, sig: arbiter.killed.append((pid, sig))
+    arbiter.spawn_workers = lambda: None
+    return arbiter
+
+
+def add_worker(arbiter, pid, booted=True):
+    arbiter.worker_age += 1
+    worker = SyncWorker(arbiter.worker_age, os.getpid(), [], None, 30,
+                        arbiter.cfg, arbiter.log)
+    worker.pid = pid
+    worker.tmp = arbiter.heartbeat.acquire()
+    if booted:
+        worker.tmp.set_booted()
+    arbiter.WORKERS[pid] = worker
+    return worker
+
+
+def test_retire_oldest_once():
+    arbiter = make_arbiter(3)
+    for pid in (101, 102, 103):
+        add_worker(arbiter, pid)
+
+    arbiter.num_workers = 2
+    arbiter.manage_workers()
+    assert arbiter.killed == [(101, signal.SIGTERM)]
+    assert arbiter.WORKERS[101].retiring
+
+    # the retired worker is still draining
+    arbiter.manage_workers()
+    arbiter.manage_workers()
+    assert arbiter.killed == [(101, signal.SIGTERM)]
+    assert arbiter.current_workers() == 2
+
+    arbiter.num_workers = 1
+    arbiter.manage_workers()
+    assert arbiter.killed == [(101, signal.SIGTERM), (102, signal.SIGTERM)]
+
+
+def test_retire_waits_for_booted_workers():
+    arbiter = make_arbiter(2)
+    for pid in (101, 102):
+        add_worker(arbiter, pid)
+    add_worker(arbiter, 103, booted=False)
+
+    arbiter.manage_workers()
+    assert arbiter.killed == []
+
+    arbiter.WORKERS[103].tmp.set_booted()
+    arbiter.manage_workers()
+    arbiter.manage_workers()
+    assert arbiter.killed == [(101, signal.SIGTERM)]
+
+
+def test_retire_after_first_heartbeat():
+    arbiter = make_arbiter(1)
+    add_worker(arbiter, 101)
+    # a worker class that never reports that it booted
+    worker = add_worker(arbiter, 102, booted=False)
+
+    arbiter.manage_workers()
+    assert arbiter.killed == []
+
+    worker.tmp.notify()
+    arbiter.manage_workers()
+    assert arbiter.killed == [(101, signal.SIGTERM)]
+
+
+def test_retire_after_boot_deadline():
+    arbiter = make_arbiter(1)
+    add_worker(arbiter, 101)
+    worker = add_worker(arbiter, 102, booted=False)
+
+    arbiter.manage_workers()
+    assert arbiter.killed == []
+    assert arbiter.booting_workers() == 1
+
+    worker.spawned -= arbiter.timeout + 1
+    arbiter.manage_workers()
+    assert arbiter.killed == [(101, signal.SIGTERM)]
+    assert arbiter.booting_workers() == 0
+
+
+def test_draining_worker_replaced():
+    arbiter = make_arbiter(2)
+    for pid in (101, 102, 103):
+        add_worker(arbiter, pid)
+    spawned = []
+    arbiter.spawn_workers = lambda: spawned.append(arbiter.current_workers())
+
+    arbiter.manage_workers()
+    assert arbiter.killed == [(101, signal.SIGTERM)]
+    assert spawned == []
+
+    # scaling up again while the retired worker drains
+    arbiter.num_workers = 3
+    arbiter.manage_workers()
+    assert spawned == [2]
+
+
+class Response:
+    status_code = 200
+    sent = 10
+    headers_sent = True
+
+
+def test_worker_stats_keep_exited_totals():
+    arbiter = make_arbiter(2)
+    a = add_worker(arbiter, 101)
+    b = add_worker(arbiter, 102)
+    for worker in (a, b, b):
+        worker.tmp.request_finished(Response(), worker.tmp.request_started())
+    a.tmp.request_started()
+
+    stats = arbiter.worker_stats()
+    assert stats["total"] == {"in_flight": 1, "keepalive": 0, "requests": 3,
+                              "bytes_sent": 30}
+    assert [w["pid"] for w in stats["workers"]] == [101, 102]
+
+    arbiter.retire_worker(arbiter.WORKERS.pop(102), "signal")
+    stats = arbiter.worker_stats()
+    # requests and bytes never go backwards, in flight requests do
+    assert stats["total"] == {"in_flight": 1, "keepalive": 0, "requests": 3,
+                              "bytes_sent": 30}
+    assert [w["pid"] for w in stats["workers"]] == [101]
+    assert arbiter.worker_exits["signal"] == 1
+    assert arbiter.worker_metrics()["statuses"]["2xx"] == 3
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"),
+                    reason="CPU affinity is not supported")
+def test_unavailable_worker_cpus(monkeypatch):
+    monkeypatch.setattr(util, "available_cpus", lambda: [0, 1])
+    arbiter = make_arbiter(2, worker_cpus="0-1,5")
+    errors = []
+    monkeypatch.setattr(arbiter.log, "error",
+                        lambda msg, *args: errors.append(msg % args))
+    with pytest.raises(SystemExit) as exc:
+        arbiter.start()
+    assert exc.value.code == 1
+    assert errors == ["worker_cpus: CPU 5 not available, the available "
+                      "CPUs are 0,1"]
+
+
+@pytest.mark.parametrize("preload_app, expected", [
+    (True, ["warmup", "unfreeze", "collect", "freeze"]),
+    (False, ["warmup"]),
+])
+def test_gc_freeze(monkeypatch, preload_app, expected):
+    calls = []
+    for name in ("unfreeze", "collect", "freeze"):
+        monkeypatch.setattr(arbiter_module.gc, name,
+                            lambda name=name: calls.append(name))
+    arbiter = make_arbiter(
+        2, gc_freeze=True, preload_app=preload_app,
+        pre_fork_warmup=lambda server: calls.append("warmup"))
+    arbiter.prepare_fork()
+    # the collection runs before the freeze, only for a preloaded app
+    assert calls == expected
+
+
+def test_rolling_reload(monkeypatch):
+    monkeypatch.setattr(arbiter_module.time, "sleep", lambda seconds: None)
+    arbiter = make_arbiter(4, reload_batch_size=2)
+    del arbiter.spawn_workers
+    for pid in (101, 102, 103, 104):
+        add_worker(arbiter, pid)
+    pids = iter(range(201, 300))
+    spawned = []
+
+    def spawn_worker():
+        spawned.append(add_worker(arbiter, next(pids), booted=False))
+    arbiter.spawn_worker = spawn_worker
+
+    # what reload() does once the configuration is loaded again
+    arbiter.stale_age = arbiter.worker_age
+    arbiter.reload_started = time.monotonic()
+
+    # a batch of new workers is forked, nothing is retired before they boot
+    arbiter.manage_workers()
+    assert [w.pid for w in spawned] == [201, 202]
+    assert arbiter.killed == []
+    arbiter.manage_workers()
+    assert len(spawned) == 2
+
+    # as many old workers are retired as new ones booted
+    for worker in spawned:
+        worker.tmp.set_booted()
+    arbiter.manage_workers()
+    assert arbiter.killed == [(101, signal.SIGTERM), (102, signal.SIGTERM)]
+    assert arbiter.reload_progress == (2, 4)
+
+    # the next batch is forked once the retired workers exited
+    arbiter.manage_workers()
+    assert len(spawned) == 2
+    for pid in (101, 102):
+        arbiter.WORKERS.pop(pid)
+    arbiter.manage_workers()
+    assert [w.pid for w in spawned] == [201, 202, 203, 204]
+
+    for worker in spawned[2:]:
+        worker.tmp.set_booted()
+    arbiter.manage_workers()
+    assert arbiter.killed[2:] == [(103, signal.SIGTERM),
+                                  (104, signal.SIGTERM)]
+    for pid in (103, 104):
+        arbiter.WORKERS.pop(pid)
+    arbiter.manage_workers()
+    assert arbiter.reload_progress == (4, 0)
+    assert arbiter.reload_started is None
+    assert sorted(arbiter.WORKERS) == [201, 202, 203, 204]
+
+
+def test_warmup_request():
+    paths = []
+
+    def app(environ, start_response):
+        paths.append((environ["PATH_INFO"], environ["QUERY_STRING"]))
+        start_response("200 OK", [])
+        return [b"ok"]
+
+    arbiter = make_arbiter(1, warmup_path="/ready?full=1")
+    worker = add_worker(arbiter, 101)
+    worker.wsgi = app
+    worker.warmup()
+    assert paths == [("/ready", "full=1")]
+
+
+def test_warmup_request_error():
+    def app(environ, start_response):
+        raise RuntimeError("not ready")
+
+    arbiter = make_arbiter(1, warmup_path="/ready")
+    worker = add_worker(arbiter, 101)
+    worker.wsgi = app
+    errors = []
+    worker.log.exception = lambda msg, *args: errors.append(msg % args)
+    # a failing warmup request does not stop the worker from booting
+    worker.warmup()
+    assert errors == ["Error handling warmup request /ready"]
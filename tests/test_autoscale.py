@@ -0,0 +1,115 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import pytest
+
+from gunicorn import autoscale
+from gunicorn.config import Config
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(autoscale.time, "monotonic", clock)
+    return clock
+
+
+def make_autoscaler(concurrency=1, **settings):
+    cfg = Config()
+    cfg.set("max_workers", 10)
+    cfg.set("min_workers", 2)
+    cfg.set("target_utilization", 70)
+    for name, value in settings.items():
+        cfg.set(name, value)
+    return autoscale.Autoscaler(cfg, concurrency)
+
+
+def run(clock, scaler, num_workers, demand, seconds):
+    """\
+    Sample ``demand`` every second for ``seconds`` and apply the decisions,
+    return the number of workers.
+    """
+    for _ in range(seconds):
+        clock.now += 1
+        num_workers = scaler.scale(num_workers, demand)
+    return num_workers
+
+
+def test_clamp():
+    scaler = make_autoscaler()
+    assert scaler.clamp(1) == 2
+    assert scaler.clamp(5) == 5
+    assert scaler.clamp(20) == 10
+
+
+def test_scale_up_after_window(clock):
+    scaler = make_autoscaler()
+    assert run(clock, scaler, 2, 5, 4) == 2
+    # enough workers for the demand at the target utilization
+    assert run(clock, scaler, 2, 5, 1) == 8
+
+
+def test_scale_up_by_one_at_least(clock):
+    scaler = make_autoscaler()
+    # just above 2 * 70%
+    assert run(clock, scaler, 2, 1.5, 5) == 3
+
+
+def test_scale_up_bounded(clock):
+    scaler = make_autoscaler(concurrency=4)
+    assert run(clock, scaler, 2, 100, 5) == 10
+
+
+def test_scale_up_cooldown(clock):
+    scaler = make_autoscaler()
+    assert run(clock, scaler, 2, 3, 5) == 5
+    # the average of the last window drives the next change
+    assert run(clock, scaler, 5, 10, 4) == 5
+    assert run(clock, scaler, 5, 10, 1) > 5
+
+
+def test_scale_down_one_at_a_time(clock):
+    scaler = make_autoscaler()
+    assert run(clock, scaler, 5, 0, 59) == 5
+    assert run(clock, scaler, 5, 0, 1) == 4
+    assert run(clock, scaler, 4, 0, 59) == 4
+    assert run(clock, scaler, 4, 0, 1) == 3
+    # never below min_workers
+    assert run(clock, scaler, 2, 0, 120) == 2
+
+
+@pytest.mark.parametrize("demand, expected", [
+    # 3 workers would run at 60% of their capacity, below the target but
+    # within the hysteresis
+    (1.8, 4),
+    # 3 workers would run at 53%
+    (1.6, 3),
+])
+def test_scale_down_hysteresis(clock, demand, expected):
+    scaler = make_autoscaler()
+    assert run(clock, scaler, 4, demand, 60) == expected
+
+
+def test_no_flapping(clock):
+    scaler = make_autoscaler()
+    num_workers = 4
+    changes = 0
+    for _ in range(600):
+        clock.now += 1
+        wanted = scaler.scale(num_workers, 2)
+        if wanted != num_workers:
+            changes += 1
+        num_workers = wanted
+    # a steady demand settles on a number of workers
+    assert changes == 0
+    assert num_workers == 4
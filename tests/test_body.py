@@ -0,0 +1,148 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import pytest
+
+from gunicorn.config import Config
+from gunicorn.http.body import READ_SIZE_MAX, READ_SIZE_MIN, Body
+from gunicorn.http.parser import RequestParser
+
+PAYLOAD = bytes(range(256)) * 4
+
+CHUNK_SIZES = [1, 7, 16, 100, 3, 250, 1, 646]
+
+
+def chunked_request(sizes=CHUNK_SIZES, trailers=b"X-Sum: 42\r\n"):
+    data = [b"POST /upload HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"]
+    pos = 0
+    for size in sizes:
+        data.append(b"%x\r\n" % size + PAYLOAD[pos:pos + size] + b"\r\n")
+        pos += size
+    data.append(b"0\r\n" + trailers + b"\r\n")
+    data.append(b"GET /next HTTP/1.1\r\n\r\n")
+    return b"".join(data), PAYLOAD[:pos]
+
+
+def split(data, step):
+    if step is None:
+        return [data]
+    return [data[i:i + step] for i in range(0, len(data), step)]
+
+
+def requests(data, step):
+    parser = RequestParser(Config(), split(data, step), ("127.0.0.1", 5000))
+    return parser, next(parser)
+
+
+SOURCES = [None, 1, 5, 64, 333]
+
+
+@pytest.mark.parametrize("step", SOURCES)
+@pytest.mark.parametrize("size", [1, 2, 9, 17, 120, 4096])
+def test_chunked_read(step, size):
+    data, payload = chunked_request()
+    parser, req = requests(data, step)
+
+    body = b""
+    while True:
+        part = req.body.read(size)
+        if not part:
+            break
+        assert len(part) <= size
+        body += part
+    assert body == payload
+    assert req.body.at_eof()
+    assert req.trailers == [("X-SUM", "42")]
+    # the reads ended at the end of the body
+    assert next(parser).path == "/next"
+
+
+@pytest.mark.parametrize("step", SOURCES)
+@pytest.mark.parametrize("size", [1, 2, 9, 17, 120, 4096])
+def test_chunked_readinto(step, size):
+    data, payload = chunked_request()
+    parser, req = requests(data, step)
+
+    body = bytearray()
+    buf = bytearray(size)
+    while True:
+        n = req.body.readinto(buf)
+        if not n:
+            break
+        body += buf[:n]
+    assert body == payload
+    assert req.trailers == [("X-SUM", "42")]
+    assert next(parser).path == "/next"
+
+
+@pytest.mark.parametrize("step", SOURCES)
+def test_chunked_read_all(step):
+    data, payload = chunked_request(trailers=b"")
+    parser, req = requests(data, step)
+    assert req.body.read() == payload
+    assert req.body.read() == b""
+    assert not req.trailers
+    assert next(parser).path == "/next"
+
+
+def test_chunked_buffered_chunks_read_at_once():
+    data, payload = chunked_request(sizes=[10] * 20)
+    parser, req = requests(data, None)
+    reader = req.body.reader
+
+    # the whole body is buffered, a read spans many chunks in one scan
+    assert req.body.read(95) == payload[:95]
+    assert reader.chunk_left == 5
+    buf = bytearray(100)
+    assert req.body.readinto(buf) == 100
+    assert buf == payload[95:195]
+    assert req.body.read(100) == payload[195:]
+    assert req.body.read(100) == b""
+    assert next(parser).path == "/next"
+
+
+def test_chunked_extensions():
+    data = (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"5;name=value\r\nhello\r\n6 ;x\r\n world\r\n0\r\n\r\n")
+    parser, req = requests(data, None)
+    assert req.body.read(3) == b"hel"
+    assert req.body.read(100) == b"lo world"
+
+
+class Reader:
+
+    def __init__(self, size):
+        self.left = size
+        self.sizes = []
+
+    def read(self, size):
+        self.sizes.append(size)
+        n = min(size, self.left)
+        self.left -= n
+        return b"x" * n
+
+    def at_eof(self):
+        return self.left == 0
+
+
+def test_read_sizes_grow():
+    size = 5 * READ_SIZE_MAX
+    reader = Reader(size)
+    body = Body(reader)
+    assert len(body.read()) == size
+
+    sizes = reader.sizes
+    assert sizes[0] == READ_SIZE_MIN
+    assert all(b == min(a * 2, READ_SIZE_MAX)
+               for a, b in zip(sizes, sizes[1:]))
+    assert max(sizes) == READ_SIZE_MAX
+    assert body.at_eof()
+
+
+def test_read_size_bounded_by_caller():
+    reader = Reader(READ_SIZE_MAX)
+    body = Body(reader)
+    assert len(body.read(100)) == 100
+    assert len(body.read(READ_SIZE_MAX * 2)) == READ_SIZE_MAX - 100
+    assert reader.sizes[:2] == [100, READ_SIZE_MAX * 2]
@@ -0,0 +1,40 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import pytest
+
+from gunicorn import util
+from gunicorn.config import Config
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, []),
+    ("", []),
+    ("3", [3]),
+    ("0-3", [0, 1, 2, 3]),
+    ("4, 0-1", [0, 1, 4]),
+    # each CPU once
+    ("0,0-1", [0, 1]),
+    ("2-3,1-2", [1, 2, 3]),
+    ([3, 1, 1], [1, 3]),
+    ((2, 0), [0, 2]),
+])
+def test_worker_cpus(value, expected):
+    cfg = Config()
+    cfg.set("worker_cpus", value)
+    assert cfg.worker_cpus == expected
+
+
+def test_worker_cpus_auto(monkeypatch):
+    monkeypatch.setattr(util, "available_cpus", lambda: [0, 2])
+    cfg = Config()
+    cfg.set("worker_cpus", "auto")
+    assert cfg.worker_cpus == [0, 2]
+
+
+@pytest.mark.parametrize("value", ["3-1", "a", "-1", "1,,2", [-1]])
+def test_worker_cpus_invalid(value):
+    cfg = Config()
+    with pytest.raises(ValueError):
+        cfg.set("worker_cpus", value)
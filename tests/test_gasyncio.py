@@ -0,0 +1,159 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import errno
+import threading
+
+import pytest
+
+from gunicorn.workers.gasyncio import (
+    HIGH_WATER, HttpConnection, RequestFeed, TransportWriter,
+)
+
+
+class Loop:
+
+    def __init__(self):
+        self.callbacks = []
+
+    def call_soon_threadsafe(self, callback, *args):
+        self.callbacks.append((callback, args))
+
+    def run(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback, args in callbacks:
+            callback(*args)
+
+
+class Worker:
+    loop_thread = None
+
+
+class Connection:
+
+    timed_out = HttpConnection.timed_out
+
+    def __init__(self, timeout=None):
+        self.worker = Worker()
+        self.loop = Loop()
+        self.timeout = timeout
+        self.can_write = threading.Event()
+        self.can_write.set()
+        self.closed = False
+        self.paused = False
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+    def abort(self):
+        self.closed = True
+
+
+def send(writer, data):
+    errors = []
+
+    def run():
+        try:
+            writer.sendall(data)
+        except OSError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, errors
+
+
+def test_sendall_waits_for_queued_writes():
+    conn = Connection()
+    writer = TransportWriter(conn)
+    chunk = b"x" * (HIGH_WATER // 2)
+
+    for _ in range(3):
+        writer.sendall(chunk)
+    assert writer.pending == 3 * len(chunk)
+
+    # past the high-water mark, the next write waits for the loop
+    thread, errors = send(writer, b"y")
+    thread.join(0.2)
+    assert thread.is_alive()
+
+    conn.loop.run()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert not errors
+    assert writer.pending == 1
+    conn.loop.run()
+    assert writer.pending == 0
+    assert b"".join(conn.written) == chunk * 3 + b"y"
+
+
+def test_sendall_closed_connection():
+    conn = Connection()
+    writer = TransportWriter(conn)
+    writer.sendall(b"x" * (HIGH_WATER + 1))
+
+    thread, errors = send(writer, b"y")
+    thread.join(0.2)
+    assert thread.is_alive()
+
+    conn.closed = True
+    writer.wakeup()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert errors[0].errno == errno.EPIPE
+    # only the queued write is left to the loop
+    assert writer.pending == HIGH_WATER + 1
+    conn.loop.run()
+    assert writer.pending == 0
+
+
+def test_sendall_timeout():
+    conn = Connection(timeout=0.1)
+    writer = TransportWriter(conn)
+    # the client does not read the response
+    conn.can_write.clear()
+    with pytest.raises(TimeoutError):
+        writer.sendall(b"x")
+    assert writer.pending == 0
+    conn.loop.run()
+    assert conn.closed
+
+
+def test_feed_timeout():
+    conn = Connection(timeout=0.1)
+    feed = RequestFeed(conn)
+    feed.feed(b"abc")
+    assert next(feed) == b"abc"
+    # the client stalls, the connection is aborted
+    with pytest.raises(TimeoutError):
+        next(feed)
+    conn.loop.run()
+    assert conn.closed
+
+
+def test_feed_eof_wakes_reader():
+    feed = RequestFeed(Connection())
+    feed.feed(b"abc")
+    result = []
+    thread = threading.Thread(target=lambda: result.extend(feed),
+                              daemon=True)
+    thread.start()
+    thread.join(0.2)
+    assert thread.is_alive()
+
+    feed.feed_eof()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert result == [b"abc"]
+
+
+@pytest.mark.parametrize("size", [1, HIGH_WATER])
+def test_sendall_from_loop_thread(size):
+    conn = Connection()
+    conn.worker.loop_thread = threading.get_ident()
+    writer = TransportWriter(conn)
+    writer.sendall(b"x" * size)
+    assert conn.written == [b"x" * size]
+    assert writer.pending == 0
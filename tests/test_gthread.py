@@ -0,0 +1,124 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import os
+import selectors
+import socket
+
+import pytest
+
+from gunicorn.config import Config
+from gunicorn.glogging import Logger
+from gunicorn.workers import gthread
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(gthread.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def worker():
+    cfg = Config()
+    cfg.set("keepalive", 2)
+    worker = gthread.ThreadWorker(0, os.getpid(), [], None, 30, cfg,
+                                  Logger(cfg))
+    worker.poller = selectors.DefaultSelector()
+    yield worker
+    for key in list(worker.poller.get_map().values()):
+        key.fileobj.close()
+    worker.poller.close()
+
+
+def connect(worker):
+    client, server = socket.socketpair()
+    client.close()
+    conn = gthread.TConn(worker.cfg, server, ("127.0.0.1", 5000), None)
+    worker.nr_conns += 1
+    return conn
+
+
+def is_closed(conn):
+    return conn.sock.fileno() == -1
+
+
+def test_keepalive_expiry(clock, worker):
+    a = connect(worker)
+    b = connect(worker)
+    worker.keepalive(a)
+    clock.now += 1
+    worker.keepalive(b)
+
+    clock.now += 0.9
+    worker.murder_keepalived()
+    assert not is_closed(a)
+    assert worker._keep == {a, b}
+
+    clock.now += 0.1
+    worker.murder_keepalived()
+    assert is_closed(a)
+    assert not is_closed(b)
+    assert worker._keep == {b}
+    assert worker.nr_conns == 1
+    assert len(worker.poller.get_map()) == 1
+
+    clock.now += 1
+    worker.murder_keepalived()
+    assert is_closed(b)
+    assert worker._keep == set()
+    assert worker._keep_timeouts == []
+    assert worker.nr_conns == 0
+
+
+def test_keepalive_renewed(clock, worker):
+    a = connect(worker)
+    b = connect(worker)
+    worker.keepalive(a)
+    worker.keepalive(b)
+
+    # a request arrives on a, which goes back to keepalive after it
+    clock.now += 1.5
+    worker.poller.unregister(a.sock)
+    worker._keep.discard(a)
+    clock.now += 0.3
+    worker.keepalive(a)
+
+    # the entry of the first keepalive period of a is skipped
+    clock.now += 0.5
+    worker.murder_keepalived()
+    assert not is_closed(a)
+    assert is_closed(b)
+    assert worker._keep == {a}
+    assert len(worker._keep_timeouts) == 1
+
+    clock.now += 1.5
+    worker.murder_keepalived()
+    assert is_closed(a)
+    assert worker.nr_conns == 0
+
+
+def test_left_keepalive_not_closed(clock, worker):
+    a = connect(worker)
+    worker.keepalive(a)
+    # the connection is being served by a pool thread
+    worker.poller.unregister(a.sock)
+    worker._keep.discard(a)
+
+    clock.now += 5
+    worker.murder_keepalived()
+    assert not is_closed(a)
+    assert worker._keep_timeouts == []
+    assert worker.nr_conns == 1
+    a.close()
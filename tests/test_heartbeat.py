@@ -0,0 +1,206 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import math
+import os
+import socket
+
+import pytest
+
+from gunicorn.config import Config
+from gunicorn.glogging import Logger
+from gunicorn.workers.heartbeat import (
+    HISTOGRAM, PHASE_NAMES, PHASES_OFFSET, SLOT_SIZE, SLOTS_PER_PAGE,
+    HeartbeatTable,
+)
+from gunicorn.workers.sync import SyncWorker
+
+
+def ok_app(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"ok"]
+
+
+def failing_app(environ, start_response):
+    raise RuntimeError("boom")
+
+
+def make_worker(app):
+    cfg = Config()
+    worker = SyncWorker(0, os.getpid(), [], None, 30, cfg, Logger(cfg))
+    worker.wsgi = app
+    worker.tmp = HeartbeatTable().acquire()
+    return worker
+
+
+def serve(worker, data):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    client, server = socket.socketpair()
+    try:
+        client.sendall(data)
+        client.shutdown(socket.SHUT_WR)
+        worker.handle(listener, server, ("127.0.0.1", 5000))
+        return client.recv(65536)
+    finally:
+        client.close()
+        listener.close()
+
+
+def test_counts_status_and_phases():
+    worker = make_worker(ok_app)
+    resp = serve(worker, b"GET / HTTP/1.1\r\nHost: example.com\r\n\r\n")
+    assert resp.startswith(b"HTTP/1.1 200 OK")
+
+    metrics = worker.tmp.metrics()
+    assert metrics["statuses"]["2xx"] == 1
+    assert sum(metrics["statuses"].values()) == 1
+    for name in ("queue", "parse", "dispatch", "app", "write"):
+        assert sum(metrics["phases"][name]["latency"]) == 1
+    assert worker.tmp.stats()["requests"] == 1
+
+
+def test_counts_application_error():
+    worker = make_worker(failing_app)
+    resp = serve(worker, b"GET / HTTP/1.1\r\nHost: example.com\r\n\r\n")
+    assert resp.startswith(b"HTTP/1.1 500 Internal Server Error")
+
+    metrics = worker.tmp.metrics()
+    assert metrics["statuses"]["5xx"] == 1
+    assert sum(metrics["statuses"].values()) == 1
+    assert sum(metrics["latency"]) == 1
+    for name in ("app", "write"):
+        assert sum(metrics["phases"][name]["latency"]) == 1
+    assert worker.tmp.stats()["requests"] == 1
+
+
+def test_counts_invalid_request():
+    worker = make_worker(ok_app)
+    resp = serve(worker, b"GET / HTTP/1.1\r\nBad Header\r\n\r\n")
+    assert resp.startswith(b"HTTP/1.1 400 Bad Request")
+
+    metrics = worker.tmp.metrics()
+    assert metrics["statuses"]["4xx"] == 1
+    assert sum(metrics["statuses"].values()) == 1
+    # the request never reached the application
+    assert sum(metrics["phases"]["app"]["latency"]) == 0
+
+
+def test_slot_layout():
+    assert PHASES_OFFSET + len(PHASE_NAMES) * HISTOGRAM.size <= SLOT_SIZE
+
+
+def test_slots():
+    table = HeartbeatTable()
+    slots = [table.acquire() for _ in range(SLOTS_PER_PAGE + 1)]
+    # the lowest slots are handed out first, a page at a time
+    assert [slot.index for slot in slots] == \
+        list(range(SLOTS_PER_PAGE + 1))
+    assert len(table.pages) == 2
+    assert slots[-1].page is table.pages[1]
+    assert slots[-1].offset == 0
+
+    slots[1].close()
+    slots[1].close()
+    assert table.acquire().index == 1
+    assert table.free == list(reversed(range(SLOTS_PER_PAGE + 1,
+                                             2 * SLOTS_PER_PAGE)))
+
+
+def test_heartbeat():
+    table = HeartbeatTable()
+    a = table.acquire()
+    b = table.acquire()
+    # a booting worker has not notified yet
+    assert a.last_update() == math.inf
+    assert not a.booted()
+
+    a.notify()
+    assert a.last_update() <= b.last_update()
+    assert b.last_update() == math.inf
+    a.set_booted()
+    assert a.booted()
+    assert not b.booted()
+
+
+def test_shared_with_child():
+    table = HeartbeatTable()
+    slot = table.acquire()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            slot.notify()
+            slot.set_booted()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert slot.last_update() != math.inf
+    assert slot.booted()
+
+
+def test_table_in_tmp_dir(tmp_path):
+    table = HeartbeatTable(str(tmp_path))
+    slot = table.acquire()
+    slot.notify()
+    assert slot.last_update() != math.inf
+    # the backing file is unlinked
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_table_missing_tmp_dir(tmp_path):
+    table = HeartbeatTable(str(tmp_path / "missing"))
+    with pytest.raises(RuntimeError):
+        table.acquire()
+
+
+def test_tmp_dir_deprecated(capsys, tmp_path):
+    cfg = Config()
+    cfg.set("worker_tmp_dir", str(tmp_path))
+    assert cfg.worker_tmp_dir == str(tmp_path)
+    assert "`worker_tmp_dir` is deprecated" in capsys.readouterr().err
+
+
+def test_local_slot():
+    cfg = Config()
+    worker = SyncWorker(0, os.getpid(), [], None, 30, cfg, Logger(cfg))
+    # a worker built outside of the arbiter has a slot of its own
+    worker.notify()
+    assert worker.tmp.last_update() != math.inf
+    worker.tmp.request_finished(None, worker.tmp.request_started())
+    assert worker.tmp.stats()["requests"] == 1
+    worker.tmp.close()
+
+
+class Response:
+
+    def __init__(self, status_code, sent):
+        self.status_code = status_code
+        self.sent = sent
+        self.headers_sent = True
+
+
+def test_stats():
+    slot = HeartbeatTable().acquire()
+    assert slot.stats() == {"in_flight": 0, "keepalive": 0, "requests": 0,
+                            "bytes_sent": 0}
+
+    first = slot.request_started()
+    second = slot.request_started()
+    slot.set_keepalive(3)
+    assert slot.stats() == {"in_flight": 2, "keepalive": 3, "requests": 0,
+                            "bytes_sent": 0}
+
+    slot.request_finished(Response(200, 100), first)
+    slot.request_finished(Response(404, 20), second - 1.0)
+    assert slot.stats() == {"in_flight": 0, "keepalive": 3, "requests": 2,
+                            "bytes_sent": 120}
+
+    metrics = slot.metrics()
+    assert metrics["statuses"] == {"1xx": 0, "2xx": 1, "3xx": 0, "4xx": 1,
+                                   "5xx": 0}
+    assert metrics["latency"][0] == 1
+    # between 1 and 2.5 seconds
+    assert metrics["latency"][8] == 1
+    assert sum(metrics["latency"]) == 2
+    assert 1.0 <= metrics["latency_sum"] < 2.0
@@ -0,0 +1,194 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+# Conformance suite shared by every HTTP parser backend. Each request is
+# fed whole and byte by byte; all backends must produce the same requests
+# or raise the same errors.
+
+import pytest
+
+from gunicorn.config import Config
+from gunicorn.http import native
+from gunicorn.http.errors import (
+    InvalidHeader, InvalidHeaderName, InvalidHTTPVersion,
+    InvalidRequestLine, InvalidRequestMethod, InvalidSchemeHeaders,
+    LimitRequestHeaders, LimitRequestLine, NoMoreData, ObsoleteFolding,
+    UnsupportedTransferCoding, ChunkMissingTerminator, InvalidChunkSize,
+)
+from gunicorn.http.parser import RequestParser
+
+BACKENDS = [
+    pytest.param(name, marks=pytest.mark.skipif(
+        not native.available(name), reason="%s is not installed" % name))
+    for name in native.PARSERS
+]
+
+VALID = [
+    (b"GET / HTTP/1.1\r\nHost: example.com\r\n\r\n",
+     [("GET", "/", (1, 1), [("HOST", "example.com")], b"")]),
+    (b"GET /a/b?c=d#e HTTP/1.0\r\nUser-Agent: test \t\r\nAccept: */*\r\n\r\n",
+     [("GET", "/a/b?c=d#e", (1, 0),
+       [("USER-AGENT", "test"), ("ACCEPT", "*/*")], b"")]),
+    (b"POST /upload HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello",
+     [("POST", "/upload", (1, 1), [("CONTENT-LENGTH", "5")], b"hello")]),
+    (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+     b"5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\n\r\n",
+     [("POST", "/", (1, 1), [("TRANSFER-ENCODING", "chunked")],
+       b"hello world")]),
+    (b"GET /1 HTTP/1.1\r\n\r\nGET /2 HTTP/1.1\r\nX-A: b\r\n\r\n",
+     [("GET", "/1", (1, 1), [], b""),
+      ("GET", "/2", (1, 1), [("X-A", "b")], b"")]),
+    (b"MKCALENDAR /cal HTTP/1.1\r\nX-Empty:\r\nX-Latin: caf\xe9\r\n\r\n",
+     [("MKCALENDAR", "/cal", (1, 1),
+       [("X-EMPTY", ""), ("X-LATIN", "caf\xe9")], b"")]),
+    (b"CUSTOMVERB / HTTP/1.1\r\nX-Ctl: a\x01b\r\n\r\n",
+     [("CUSTOMVERB", "/", (1, 1), [("X-CTL", "a\x01b")], b"")]),
+    (b"GET / HTTP/1.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n\r\n",
+     [("GET", "/", (1, 1),
+       [("UPGRADE", "websocket"), ("CONNECTION", "Upgrade")], b"")]),
+    (b"M-SEARCH * HTTP/1.1\r\nMan: \"ssdp:discover\"\r\n\r\n",
+     [("M-SEARCH", "*", (1, 1), [("MAN", '"ssdp:discover"')], b"")]),
+    # underscores are dropped by the default header_map
+    (b"GET / HTTP/1.1\r\nX_Forwarded_For: 1.2.3.4\r\nHost: a\r\n\r\n",
+     [("GET", "/", (1, 1), [("HOST", "a")], b"")]),
+]
+
+INVALID = [
+    (b"GET / HTTP/1.1\r\nBad Header\r\n\r\n", InvalidHeader),
+    (b"GET / HTTP/1.1\r\n: empty\r\n\r\n", InvalidHeader),
+    (b"GET / HTTP/1.1\r\nBad Name: x\r\n\r\n", InvalidHeaderName),
+    (b"GET / HTTP/1.1\r\nName : x\r\n\r\n", InvalidHeaderName),
+    (b"GET / HTTP/1.1\r\nN\xe9: x\r\n\r\n", InvalidHeaderName),
+    (b"GET / HTTP/1.1\r\nX: a\x00b\r\n\r\n", InvalidHeader),
+    (b"GET / HTTP/1.1\r\nX: a\r\n b\r\n\r\n", ObsoleteFolding),
+    (b"GET / HTTP/1.1\r\nX: a\nY: b\r\n\r\n", InvalidHeader),
+    (b"GET  / HTTP/1.1\r\n\r\n", InvalidRequestLine),
+    (b"GET /\r\n\r\n", InvalidRequestLine),
+    (b"get / HTTP/1.1\r\n\r\n", InvalidRequestMethod),
+    (b"GE / HTTP/1.1\r\n\r\n", InvalidRequestMethod),
+    (b"GET / HTTP/2.0\r\n\r\n", InvalidHTTPVersion),
+    (b"GET / HTTP/1.10\r\n\r\n", InvalidHTTPVersion),
+    (b"GET / http/1.1\r\n\r\n", InvalidHTTPVersion),
+    (b"GET /  HTTP/1.1\r\n\r\n", InvalidHTTPVersion),
+    (b"GET / HTTP/1.1 \r\n\r\n", InvalidHTTPVersion),
+    (b"GET / HTTP/1.1\r\nX: a\rb\r\n\r\n", InvalidHeader),
+    (b"GET /" + b"a" * 5000 + b" HTTP/1.1\r\n\r\n", LimitRequestLine),
+    (b"GET / HTTP/1.1\r\n" + b"".join(b"X-%d: v\r\n" % i for i in range(101))
+     + b"\r\n", LimitRequestHeaders),
+    (b"GET / HTTP/1.1\r\nX: " + b"v" * 9000 + b"\r\n\r\n", LimitRequestHeaders),
+    (b"GET / HTTP/1.1\r\nX_Bad: 1\r\n\r\n", None),
+    (b"POST / HTTP/1.1\r\nContent-Length: 1\r\nContent-Length: 1\r\n\r\nx",
+     InvalidHeader),
+    (b"POST / HTTP/1.1\r\nContent-Length: +1\r\n\r\nx", InvalidHeader),
+    (b"POST / HTTP/1.1\r\nContent-Length: 1\r\n"
+     b"Transfer-Encoding: chunked\r\n\r\n0\r\n\r\n", InvalidHeader),
+    (b"POST / HTTP/1.0\r\nTransfer-Encoding: chunked\r\n\r\n0\r\n\r\n",
+     InvalidHeader),
+    (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked, chunked\r\n\r\n",
+     InvalidHeader),
+    (b"POST / HTTP/1.1\r\nTransfer-Encoding: bogus\r\n\r\n",
+     UnsupportedTransferCoding),
+    (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n",
+     InvalidChunkSize),
+    (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n1\r\naXX",
+     ChunkMissingTerminator),
+    (b"GET / HTTP/1.1\r\nX-Forwarded-Proto: https\r\n"
+     b"X-Forwarded-Ssl: off\r\n\r\n", InvalidSchemeHeaders),
+    (b"GET / HTTP/1.1\r\nHost: a\r\n", NoMoreData),
+]
+
+
+def parse_all(backend, data, chunked_source=False, **settings):
+    cfg = Config()
+    cfg.set("http_parser", backend)
+    for name, value in settings.items():
+        cfg.set(name, value)
+    if chunked_source:
+        source = [data[i:i + 1] for i in range(len(data))]
+    else:
+        source = [data]
+    requests = []
+    for req in RequestParser(cfg, source, ("127.0.0.1", 5000)):
+        body = req.body.read()
+        requests.append((req.method, req.uri, req.version, req.headers, body))
+    return requests
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("chunked_source", [False, True])
+@pytest.mark.parametrize("data, expected", VALID)
+def test_valid(backend, chunked_source, data, expected):
+    assert parse_all(backend, data, chunked_source) == expected
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("chunked_source", [False, True])
+@pytest.mark.parametrize("data, error", INVALID)
+def test_invalid(backend, chunked_source, data, error):
+    if error is None:
+        error = InvalidHeaderName
+        settings = {"header_map": "refuse"}
+    else:
+        settings = {}
+    with pytest.raises(error):
+        parse_all(backend, data, chunked_source, **settings)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_obsolete_folding_permitted(backend):
+    data = b"GET / HTTP/1.1\r\nX: a\r\n b\r\n\r\n"
+    assert parse_all(backend, data, permit_obsolete_folding=True) == [
+        ("GET", "/", (1, 1), [("X", "a b")], b"")]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_trailers(backend):
+    cfg = Config()
+    cfg.set("http_parser", backend)
+    data = (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"3\r\nabc\r\n0\r\nX-Checksum: 1234\r\n\r\n")
+    req = next(RequestParser(cfg, [data], ("127.0.0.1", 5000)))
+    assert req.body.read() == b"abc"
+    assert req.trailers == [("X-CHECKSUM", "1234")]
+
+
+@pytest.mark.skipif(not native.available("httptools"),
+                    reason="httptools is not installed")
+@pytest.mark.parametrize("data", [
+    b"GET /a/b?c=d#e HTTP/1.0\r\nUser-Agent: test \t\r\n\r\n",
+    b"POST /upload HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello",
+    b"GET / HTTP/1.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n\r\n",
+    b"GET /1 HTTP/1.1\r\n\r\nGET /2 HTTP/1.1\r\nX-A: b\r\n\r\n",
+])
+def test_httptools_parses_head(monkeypatch, data):
+    def reparse(self, unreader, buf):
+        raise AssertionError("parsed again by the Python parser")
+    monkeypatch.setattr(native.HttptoolsRequest, "reparse", reparse)
+    assert parse_all("httptools", data) == parse_all("python", data)
+
+
+def test_unavailable_backend_falls_back():
+    assert native.resolve("python") == "python"
+    if not native.available("httptools"):
+        assert native.resolve("httptools") == "python"
+        assert native.request_class("httptools") is native.Request
+
+
+@pytest.mark.parametrize("chunked_source", [False, True])
+@pytest.mark.parametrize("data, expected", VALID)
+def test_readinto(chunked_source, data, expected):
+    if chunked_source:
+        source = [data[i:i + 1] for i in range(len(data))]
+    else:
+        source = [data]
+    bodies = []
+    for req in RequestParser(Config(), source, ("127.0.0.1", 5000)):
+        buf = bytearray(3)
+        body = []
+        n = req.body.readinto(buf)
+        while n:
+            body.append(bytes(buf[:n]))
+            n = req.body.readinto(buf)
+        bodies.append(b"".join(body))
+    assert bodies == [request[4] for request in expected]
@@ -0,0 +1,245 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import re
+
+import pytest
+
+from gunicorn import util
+from gunicorn.config import Config
+from gunicorn.http import wsgi
+from gunicorn.http.errors import InvalidHeader, InvalidHeaderName
+from gunicorn.http.parser import RequestParser
+
+
+class Sock:
+
+    def __init__(self):
+        self.writes = []
+
+    def sendall(self, data):
+        self.writes.append(bytes(data))
+
+    def data(self):
+        return b"".join(self.writes)
+
+
+def make_response(request=b"GET / HTTP/1.1\r\nHost: example.com\r\n\r\n",
+                  **settings):
+    cfg = Config()
+    for name, value in settings.items():
+        cfg.set(name, value)
+    req = next(RequestParser(cfg, [request], ("127.0.0.1", 5000)))
+    return wsgi.Response(req, Sock(), cfg)
+
+
+def split_head(data):
+    head, _, body = data.partition(b"\r\n\r\n")
+    lines = head.split(b"\r\n")
+    return lines[0], lines[1:], body
+
+
+def test_header_bytes():
+    resp = make_response()
+    resp.start_response("200 OK", [("Content-Type", "text/plain"),
+                                   ("Content-Length", "5"),
+                                   ("X-Name", " value \t")])
+    status, headers, body = split_head(resp.header_bytes())
+
+    assert status == b"HTTP/1.1 200 OK"
+    assert body == b""
+    assert headers[0] == b"Server: gunicorn"
+    assert re.fullmatch(rb"Date: \w{3}, \d\d \w{3} \d{4} \d\d:\d\d:\d\d GMT",
+                        headers[1])
+    assert headers[2:] == [b"Connection: keep-alive",
+                           b"Content-Type: text/plain",
+                           b"Content-Length: 5",
+                           b"X-Name: value"]
+
+
+@pytest.mark.parametrize("request_data, headers, expected", [
+    # no length, chunked for HTTP/1.1
+    (b"GET / HTTP/1.1\r\n\r\n", [],
+     [b"Connection: keep-alive", b"Transfer-Encoding: chunked"]),
+    # no length and no chunking for HTTP/1.0, the connection closes
+    (b"GET / HTTP/1.0\r\n\r\n", [], [b"Connection: close"]),
+    (b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n",
+     [("Content-Length", "0")],
+     [b"Connection: close", b"Content-Length: 0"]),
+    # hop-by-hop headers of the application are dropped
+    (b"GET / HTTP/1.1\r\n\r\n",
+     [("Content-Length", "0"), ("Keep-Alive", "timeout=5")],
+     [b"Connection: keep-alive", b"Content-Length: 0"]),
+    (b"GET / HTTP/1.1\r\n\r\n",
+     [("Connection", "Upgrade"), ("Upgrade", "websocket")],
+     [b"Connection: upgrade", b"Transfer-Encoding: chunked",
+      b"Upgrade: websocket"]),
+])
+def test_connection_headers(request_data, headers, expected):
+    resp = make_response(request_data)
+    resp.start_response("200 OK", headers)
+    status, lines, _ = split_head(resp.header_bytes())
+    assert status.endswith(b" 200 OK")
+    assert lines[2:] == expected
+
+
+@pytest.mark.parametrize("request_data", [
+    b"GET / HTTP/1.1\r\n\r\n",
+    b"GET / HTTP/1.0\r\n\r\n",
+])
+def test_default_headers(request_data):
+    resp = make_response(request_data)
+    resp.start_response("200 OK", [])
+    headers = resp.default_headers()
+    assert all(isinstance(h, str) for h in headers)
+    assert headers[0] == "HTTP/%s.%s 200 OK\r\n" % resp.req.version
+    head = b"".join(h.encode("latin-1") for h in headers)
+    # the same headers as the bytes sent, but for the date
+    assert [h for h in head.split(b"\r\n") if not h.startswith(b"Date")] == \
+        [h for h in resp.header_bytes()[:-2].split(b"\r\n")
+         if not h.startswith(b"Date")]
+
+
+def test_default_headers_subclass():
+
+    class Response(wsgi.Response):
+
+        def default_headers(self):
+            headers = super().default_headers()
+            headers.append("X-Served-By: test\r\n")
+            return headers
+
+    cfg = Config()
+    req = next(RequestParser(cfg, [b"GET / HTTP/1.1\r\n\r\n"],
+                             ("127.0.0.1", 5000)))
+    resp = Response(req, Sock(), cfg)
+    resp.start_response("200 OK", [("Content-Length", "0")])
+    status, lines, _ = split_head(resp.header_bytes())
+    assert status == b"HTTP/1.1 200 OK"
+    assert lines[2:] == [b"Connection: keep-alive", b"X-Served-By: test",
+                         b"Content-Length: 0"]
+
+
+def test_status_line_cached():
+    assert wsgi.status_line((1, 1), "404 Not Found") == \
+        b"HTTP/1.1 404 Not Found\r\n"
+    assert wsgi.status_line((1, 1), "404 Not Found") is \
+        wsgi.status_line((1, 1), "404 Not Found")
+    assert wsgi.status_line((1, 0), "200 OK") == b"HTTP/1.0 200 OK\r\n"
+
+
+def test_http_date_bytes(monkeypatch):
+    monkeypatch.setattr(util, "_http_date_cache", (None, b""))
+    monkeypatch.setattr(util.time, "time", lambda: 784111777.5)
+    value = util.http_date_bytes()
+    assert value == b"Sun, 06 Nov 1994 08:49:37 GMT"
+    # formatted once per second
+    assert util.http_date_bytes() is value
+    monkeypatch.setattr(util.time, "time", lambda: 784111778.1)
+    assert util.http_date_bytes() == b"Sun, 06 Nov 1994 08:49:38 GMT"
+
+
+def test_send_headers_once():
+    resp = make_response()
+    resp.start_response("204 No Content", [])
+    resp.send_headers()
+    resp.send_headers()
+    assert len(resp.sock.writes) == 1
+    assert resp.headers_sent
+    assert resp.req.timings.first_byte_sent is not None
+
+
+@pytest.mark.parametrize("headers, error", [
+    ([("X-Bad", "a\r\nb")], InvalidHeader),
+    ([("X Bad", "a")], InvalidHeaderName),
+    ([(b"X-Bytes", "a")], TypeError),
+])
+def test_invalid_headers(headers, error):
+    resp = make_response()
+    with pytest.raises(error):
+        resp.start_response("200 OK", headers)
+
+
+def test_writes_unbuffered():
+    resp = make_response()
+    resp.start_response("200 OK", [("Content-Length", "6")])
+    resp.write(b"abc")
+    resp.write(b"def")
+    resp.close()
+    assert len(resp.sock.writes) == 2
+    assert resp.sock.writes[0].endswith(b"\r\n\r\nabc")
+    assert resp.sock.writes[1] == b"def"
+
+
+def test_buffered_until_close():
+    resp = make_response(response_buffer_size=100)
+    resp.start_response("200 OK", [("Content-Length", "30")])
+    for _ in range(3):
+        resp.write(b"x" * 10)
+    assert resp.sock.writes == []
+    assert not resp.headers_sent
+
+    resp.close()
+    # headers and body in a single write
+    assert len(resp.sock.writes) == 1
+    assert split_head(resp.sock.data())[2] == b"x" * 30
+
+
+def test_buffer_flushed_when_full():
+    resp = make_response(response_buffer_size=100)
+    resp.start_response("200 OK", [("Content-Length", "250")])
+    resp.write(b"a" * 60)
+    assert resp.sock.writes == []
+    resp.write(b"b" * 60)
+    assert len(resp.sock.writes) == 1
+    resp.write(b"c" * 130)
+    assert len(resp.sock.writes) == 2
+    assert resp.sock.writes[1] == b"c" * 130
+    resp.close()
+    assert len(resp.sock.writes) == 2
+    assert split_head(resp.sock.data())[2] == \
+        b"a" * 60 + b"b" * 60 + b"c" * 130
+
+
+def test_buffer_flushed_by_empty_item():
+    resp = make_response(response_buffer_size=100)
+    resp.start_response("200 OK", [("Content-Length", "10")])
+    resp.write(b"x" * 4)
+    resp.write(b"")
+    assert len(resp.sock.writes) == 1
+    resp.write(b"y" * 6)
+    resp.close()
+    assert len(resp.sock.writes) == 2
+    assert split_head(resp.sock.data())[2] == b"x" * 4 + b"y" * 6
+
+
+def test_buffered_chunks():
+    resp = make_response(response_buffer_size=100)
+    resp.start_response("200 OK", [])
+    resp.write(b"hello ")
+    resp.write(b"world")
+    resp.close()
+    assert len(resp.sock.writes) == 1
+    # the buffered items are sent as one chunk
+    assert split_head(resp.sock.data())[2] == b"B\r\nhello world\r\n0\r\n\r\n"
+
+
+def test_buffered_content_length_truncated():
+    resp = make_response(response_buffer_size=100)
+    resp.start_response("200 OK", [("Content-Length", "5")])
+    resp.write(b"abc")
+    resp.write(b"defgh")
+    resp.write(b"ijk")
+    resp.close()
+    assert split_head(resp.sock.data())[2] == b"abcde"
+    assert resp.sent == 5
+
+
+def test_buffered_headers_only():
+    resp = make_response(response_buffer_size=100)
+    resp.start_response("204 No Content", [])
+    resp.close()
+    status, _, body = split_head(resp.sock.data())
+    assert status == b"HTTP/1.1 204 No Content"
+    assert body == b""
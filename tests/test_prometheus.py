@@ -0,0 +1,177 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import logging
+import socket
+
+import pytest
+
+from gunicorn.arbiter import Arbiter
+from gunicorn.instrument import prometheus
+from gunicorn.workers.sync import SyncWorker
+
+
+class FakeArbiter:
+    LISTENERS = []
+    num_workers = 2
+    worker_class = SyncWorker
+    cfg = None
+
+    def __init__(self):
+        self.worker_exits = {"exit": 1, "error": 0, "signal": 2,
+                             "timeout": 0}
+
+    def booting_workers(self):
+        return 1
+
+    def worker_stats(self):
+        workers = [
+            {"pid": 101, "age": 1, "in_flight": 1, "keepalive": 0,
+             "requests": 5, "bytes_sent": 50},
+            {"pid": 102, "age": 2, "in_flight": 0, "keepalive": 0,
+             "requests": 2, "bytes_sent": 20},
+        ]
+        total = {"in_flight": 1, "keepalive": 0, "requests": 7,
+                 "bytes_sent": 70}
+        return {"pid": 100, "workers": workers, "total": total}
+
+    def worker_metrics(self):
+        metrics = Arbiter.empty_metrics()
+        metrics["latency"][0] = 4
+        metrics["latency"][3] = 2
+        metrics["latency"][-1] = 1
+        metrics["latency_sum"] = 12.5
+        metrics["statuses"]["2xx"] = 6
+        metrics["statuses"]["5xx"] = 1
+        return metrics
+
+
+def samples(text, name):
+    return [line for line in text.splitlines()
+            if line.startswith(name + "{") or line.startswith(name + " ")]
+
+
+def test_render_prometheus():
+    text = prometheus.MetricsExporter(FakeArbiter()).render()
+
+    assert text.endswith("\n")
+    assert "# EOF" not in text
+    # counters are named with their suffix in the text format
+    assert "# TYPE gunicorn_requests_total counter" in text
+    assert samples(text, "gunicorn_requests_total") == \
+        ["gunicorn_requests_total 7"]
+    assert "# TYPE gunicorn_workers gauge" in text
+    assert samples(text, "gunicorn_workers") == ["gunicorn_workers 2"]
+    assert samples(text, "gunicorn_workers_booting") == \
+        ["gunicorn_workers_booting 1"]
+    assert 'gunicorn_responses_total{status="5xx"} 1' in text
+    assert 'gunicorn_worker_restarts_total{reason="signal"} 2' in text
+    # the first worker serves a request, a sync worker is then busy
+    assert samples(text, "gunicorn_worker_busy") == [
+        'gunicorn_worker_busy{pid="101"} 1',
+        'gunicorn_worker_busy{pid="102"} 0',
+    ]
+
+
+def test_render_histogram():
+    text = prometheus.MetricsExporter(FakeArbiter()).render()
+
+    assert "# TYPE gunicorn_request_duration_seconds histogram" in text
+    buckets = samples(text, "gunicorn_request_duration_seconds_bucket")
+    assert buckets[0] == \
+        'gunicorn_request_duration_seconds_bucket{le="0.005"} 4'
+    assert buckets[3] == \
+        'gunicorn_request_duration_seconds_bucket{le="0.05"} 6'
+    assert buckets[-1] == \
+        'gunicorn_request_duration_seconds_bucket{le="+Inf"} 7'
+    assert len(buckets) == len(prometheus.LATENCY_BUCKETS) + 1
+    assert samples(text, "gunicorn_request_duration_seconds_count") == \
+        ["gunicorn_request_duration_seconds_count 7"]
+    assert samples(text, "gunicorn_request_duration_seconds_sum") == \
+        ["gunicorn_request_duration_seconds_sum 12.5"]
+    assert 'gunicorn_request_phase_seconds_count{phase="app"} 0' in text
+
+
+def test_render_openmetrics():
+    text = prometheus.MetricsExporter(FakeArbiter()).render(openmetrics=True)
+
+    assert text.endswith("# EOF\n")
+    assert "# TYPE gunicorn_requests counter" in text
+    assert samples(text, "gunicorn_requests_total") == \
+        ["gunicorn_requests_total 7"]
+
+
+def test_escape():
+    assert prometheus.escape('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+    assert prometheus.format_value(float("inf")) == "+Inf"
+    assert prometheus.format_value(0.25) == "0.25"
+    assert prometheus.format_value(3) == "3"
+
+
+class Listener:
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def accept(self):
+        return self.sock, None
+
+
+def scrape(request):
+    client, server = socket.socketpair()
+    try:
+        client.sendall(request)
+        exporter = prometheus.MetricsExporter(FakeArbiter())
+        exporter.handle(Listener(server), logging.getLogger(__name__))
+        data = b""
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        client.close()
+    head, _, body = data.partition(b"\r\n\r\n")
+    return head.decode("latin-1").split("\r\n"), body
+
+
+@pytest.mark.parametrize("request_data, status", [
+    (b"GET /metrics HTTP/1.1\r\nHost: x\r\n\r\n", "200 OK"),
+    (b"GET / HTTP/1.0\r\n\r\n", "200 OK"),
+    (b"GET /metrics?x=1 HTTP/1.1\r\n\r\n", "200 OK"),
+    (b"GET /other HTTP/1.1\r\n\r\n", "404 Not Found"),
+    (b"POST /metrics HTTP/1.1\r\n\r\n", "405 Method Not Allowed"),
+    (b"garbage\r\n\r\n", "405 Method Not Allowed"),
+])
+def test_handle(request_data, status):
+    head, body = scrape(request_data)
+    assert head[0] == "HTTP/1.1 " + status
+    assert "Content-Length: %d" % len(body) in head
+    assert "Connection: close" in head
+
+
+def test_handle_content_type():
+    head, body = scrape(b"GET /metrics HTTP/1.1\r\n\r\n")
+    assert "Content-Type: " + prometheus.PROMETHEUS_TYPE in head
+    assert not body.endswith(b"# EOF\n")
+
+    head, body = scrape(b"GET /metrics HTTP/1.1\r\n"
+                        b"Accept: application/openmetrics-text\r\n\r\n")
+    assert "Content-Type: " + prometheus.OPENMETRICS_TYPE in head
+    assert body.endswith(b"# EOF\n")
+
+
+def test_handle_head():
+    head, body = scrape(b"HEAD /metrics HTTP/1.1\r\n\r\n")
+    assert head[0] == "HTTP/1.1 200 OK"
+    assert body == b""
+    assert int(head[2].split(": ")[1]) > 0
+
+
+def test_handle_slow_client(monkeypatch):
+    monkeypatch.setattr(prometheus.MetricsExporter, "timeout", 0.2)
+    head, body = scrape(b"GET /metrics HTTP/1.1\r\n")
+    # the scrape is dropped once its deadline passed
+    assert head == [""]
+    assert body == b""
@@ -0,0 +1,76 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+from gunicorn.config import Config
+from gunicorn.instrument.statsd import Statsd, StatsdBuffer, Timer
+
+
+class Client(Statsd):
+
+    def __init__(self, **settings):
+        cfg = Config()
+        cfg.set("statsd_prefix", "app")
+        for name, value in settings.items():
+            cfg.set(name, value)
+        super().__init__(cfg)
+        self.packets = []
+
+    def _send_packet(self, packet):
+        self.packets.append(packet)
+
+
+def test_lines():
+    buf = StatsdBuffer(Client(), 10)
+    buf.increment("requests", 1)
+    buf.increment("requests", 2)
+    buf.gauge("workers", 3)
+    buf.gauge("workers", 4)
+    buf.histogram("duration", 1.5)
+    buf.histogram("duration", 2.5)
+
+    assert list(buf.lines()) == [
+        "requests:3|c",
+        "workers:4|g",
+        "duration:1.5|ms",
+        "duration:2.5|ms",
+    ]
+    # the buffer is emptied
+    assert list(buf.lines()) == []
+
+
+def test_sampled_timer():
+    buf = StatsdBuffer(Client(), 10)
+    for i in range(Timer.max_samples * 4):
+        buf.histogram("duration", i)
+
+    lines = list(buf.lines())
+    assert len(lines) == Timer.max_samples
+    assert all(line.startswith("duration:") and line.endswith("|ms|@0.25")
+               for line in lines)
+
+
+def test_flush_packs_lines():
+    client = Client(statsd_max_packet_size=48,
+                    dogstatsd_tags="env:test")
+    buf = StatsdBuffer(client, 10)
+    for i in range(5):
+        buf.increment("c%d" % i, 1)
+
+    buf.flush()
+
+    lines = [line for packet in client.packets
+             for line in packet.split(b"\n")]
+    assert lines == [b"app.c%d:1|c|#env:test" % i for i in range(5)]
+    assert all(len(packet) <= 48 for packet in client.packets)
+    assert len(client.packets) == 3
+
+
+def test_large_line_sent_alone():
+    client = Client(statsd_max_packet_size=8)
+    buf = StatsdBuffer(client, 10)
+    buf.increment("requests", 1)
+
+    buf.flush()
+
+    assert client.packets == [b"app.requests:1|c"]
@@ -0,0 +1,99 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import os
+import select
+import socket
+
+import pytest
+
+from gunicorn.config import Config
+from gunicorn.glogging import Logger
+from gunicorn.workers.sync import SyncWorker
+
+requires_epollexclusive = pytest.mark.skipif(
+    not hasattr(select, "EPOLLEXCLUSIVE"),
+    reason="EPOLLEXCLUSIVE is not supported")
+
+
+@pytest.fixture
+def worker():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(8)
+    listener.setblocking(False)
+    cfg = Config()
+    worker = SyncWorker(0, os.getpid(), [listener], None, 30, cfg,
+                        Logger(cfg))
+    worker.PIPE = os.pipe()
+    worker.wait_fds = worker.sockets + [worker.PIPE[0]]
+    yield worker
+    listener.close()
+    for fd in worker.PIPE:
+        os.close(fd)
+
+
+def connect(worker):
+    return socket.create_connection(worker.sockets[0].getsockname())
+
+
+@requires_epollexclusive
+def test_wait_epoll(worker):
+    worker.poller = worker.init_poller()
+    assert worker.poller is not None
+    try:
+        assert worker.wait(0.01) is None
+        client = connect(worker)
+        assert worker.wait(1.0) == worker.sockets
+        client.close()
+    finally:
+        worker.poller.close()
+
+
+def test_wait_select(monkeypatch, worker):
+    # kernels and platforms without EPOLLEXCLUSIVE
+    monkeypatch.delattr(select, "EPOLLEXCLUSIVE", raising=False)
+    assert worker.init_poller() is None
+    assert worker.wait(0.01) is None
+    client = connect(worker)
+    assert worker.wait(1.0) == worker.sockets
+    client.close()
+
+
+@requires_epollexclusive
+def test_init_poller_register_error(monkeypatch, worker):
+    pollers = []
+
+    class Poller:
+
+        def __init__(self):
+            self.closed = False
+            pollers.append(self)
+
+        def register(self, fd, events):
+            raise OSError("EPOLLEXCLUSIVE refused")
+
+        def close(self):
+            self.closed = True
+
+    monkeypatch.setattr(select, "epoll", Poller)
+    assert worker.init_poller() is None
+    assert pollers[0].closed
+
+
+@requires_epollexclusive
+def test_run_closes_poller(monkeypatch, worker):
+    pollers = []
+    init_poller = worker.init_poller
+
+    def record():
+        poller = init_poller()
+        pollers.append(poller)
+        return poller
+
+    monkeypatch.setattr(worker, "init_poller", record)
+    worker.alive = False
+    worker.run()
+    assert pollers[0].closed
+    assert worker.poller is None
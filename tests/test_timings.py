@@ -0,0 +1,128 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import datetime
+
+import pytest
+
+from gunicorn.config import Config
+from gunicorn.glogging import AccessLogFormat, Logger, SafeAtoms
+from gunicorn.http import wsgi
+from gunicorn.http.parser import RequestParser
+from gunicorn.http.timings import PHASES, STEPS, RequestTimings
+
+
+def make_timings(**steps):
+    timings = RequestTimings()
+    for step, value in steps.items():
+        setattr(timings, step, value)
+    return timings
+
+
+def test_phases():
+    timings = make_timings(accepted=10.0, first_byte=10.5, head_parsed=10.75,
+                           app_started=11.0, first_byte_sent=13.0, done=13.5)
+    assert timings.phases() == {"queue": 0.5, "parse": 0.25,
+                                "dispatch": 0.25, "app": 2.0, "write": 0.5}
+    # the phases add up to the whole request
+    assert sum(timings.phases().values()) == timings.done - timings.accepted
+
+
+def test_missing_steps():
+    timings = make_timings(accepted=10.0, first_byte=10.5, head_parsed=10.75)
+    assert timings.phase("app") is None
+    assert timings.phases() == {"queue": 0.5, "parse": 0.25}
+    assert RequestTimings().phases() == {}
+
+
+def test_never_negative():
+    timings = make_timings(first_byte_sent=2.0, done=1.0)
+    assert timings.phase("write") == 0.0
+
+
+def test_phase_steps():
+    names = [name for (name, _, _) in PHASES]
+    assert names == ["queue", "parse", "dispatch", "app", "write"]
+    # consecutive phases share their step
+    steps = [PHASES[0][1]] + [last for (_, _, last) in PHASES]
+    assert tuple(steps) == STEPS
+
+
+def test_parser_steps():
+    parser = RequestParser(Config(), [b"GET / HTTP/1.1\r\n\r\n"],
+                           ("127.0.0.1", 5000))
+    parser.accepted = 1.0
+    req = next(parser)
+    timings = req.timings
+    assert timings.accepted == 1.0
+    assert timings.first_byte is not None
+    assert timings.head_parsed >= timings.first_byte
+    assert timings.app_started is None
+
+
+class Response:
+    status = "200 OK"
+    headers = []
+    sent = 10
+    response_length = 10
+
+
+class Request:
+    headers = []
+
+    def __init__(self, timings):
+        self.timings = timings
+
+
+FORMAT = "%(Dq)s %(Dp)s %(Dd)s %(Da)s %(Dw)s %(D)s"
+
+
+@pytest.mark.parametrize("steps, expected", [
+    ({"accepted": 1.0, "first_byte": 1.25, "head_parsed": 1.5,
+      "app_started": 1.75, "first_byte_sent": 3.75, "done": 4.0},
+     "250000 250000 250000 2000000 250000 12500"),
+    ({"accepted": 1.0, "first_byte": 1.5},
+     "500000 - - - - 12500"),
+])
+def test_access_log_atoms(steps, expected):
+    log = Logger(Config())
+    req = Request(make_timings(**steps))
+    request_time = datetime.timedelta(microseconds=12500)
+    environ = {"REQUEST_METHOD": "GET", "RAW_URI": "/",
+               "SERVER_PROTOCOL": "HTTP/1.1"}
+
+    compiled = AccessLogFormat(FORMAT)
+    assert FORMAT % compiled(log, Response(), req, environ,
+                             request_time) == expected
+    atoms = log.atoms(Response(), req, environ, request_time)
+    assert FORMAT % SafeAtoms(atoms) == expected
+
+
+def test_access_log_atoms_without_timings():
+    log = Logger(Config())
+    request_time = datetime.timedelta(microseconds=12500)
+    compiled = AccessLogFormat("%(Da)s")
+    assert "%(Da)s" % compiled(log, Response(), object(), {},
+                               request_time) == "-"
+
+
+def test_response_steps():
+    cfg = Config()
+    req = next(RequestParser(cfg, [b"GET / HTTP/1.1\r\n\r\n"],
+                             ("127.0.0.1", 5000)))
+
+    class Sock:
+        def sendall(self, data):
+            pass
+
+    resp, _ = wsgi.create(req, Sock(), ("127.0.0.1", 5000),
+                          ("127.0.0.1", 8000), cfg)
+    assert req.timings.app_started is not None
+    resp.start_response("200 OK", [("Content-Length", "2")])
+    resp.write(b"ok")
+    resp.close()
+    timings = req.timings
+    assert timings.app_started <= timings.first_byte_sent <= timings.done
+    assert set(timings.phases()) == {"queue", "parse", "dispatch", "app",
+                                     "write"}
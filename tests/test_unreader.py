@@ -0,0 +1,111 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import socket
+
+import pytest
+
+from gunicorn.http.unreader import (
+    COMPACT_THRESHOLD, IterUnreader, SocketUnreader,
+)
+
+
+def test_read_sizes():
+    u = IterUnreader([b"abc", b"defgh", b"ij"])
+    assert u.read(0) == b""
+    assert u.read(2) == b"ab"
+    assert u.read(4) == b"cdef"
+    # unsized reads return what is buffered, then the next chunk
+    assert u.read() == b"gh"
+    assert u.read(-1) == b"ij"
+    assert u.read() == b""
+    with pytest.raises(TypeError):
+        u.read("1")
+
+
+def test_read_past_end():
+    u = IterUnreader([b"abc"])
+    assert u.read(10) == b"abc"
+    assert u.read(10) == b""
+
+
+def test_unread():
+    u = IterUnreader([b"abcdef"])
+    assert u.read(4) == b"abcd"
+    u.unread(b"xy")
+    assert u.read() == b"efxy"
+
+
+def test_consumed_prefix_compacted():
+    u = IterUnreader([b"a" * COMPACT_THRESHOLD, b"b" * COMPACT_THRESHOLD,
+                      b"c" * 10])
+    u.fill()
+    u.fill()
+    assert u.read(COMPACT_THRESHOLD - 1) == b"a" * (COMPACT_THRESHOLD - 1)
+    # below the threshold, only the offset moves
+    assert u.pos == COMPACT_THRESHOLD - 1
+    assert len(u.buf) == 2 * COMPACT_THRESHOLD
+
+    assert u.read(2) == b"ab"
+    assert u.pos == 0
+    assert len(u.buf) == COMPACT_THRESHOLD - 1
+    assert u.buffered() == COMPACT_THRESHOLD - 1
+
+    # a drained buffer is emptied
+    assert u.read(COMPACT_THRESHOLD - 1) == b"b" * (COMPACT_THRESHOLD - 1)
+    assert u.pos == 0
+    assert len(u.buf) == 0
+    assert u.read() == b"c" * 10
+
+
+def test_consume():
+    u = IterUnreader([b"abcdef"])
+    u.fill()
+    u.consume(4)
+    assert u.buffered() == 2
+    u.consume(10)
+    assert u.buffered() == 0
+    assert u.pos == 0
+
+
+def test_readinto_drains_buffer_first():
+    u = IterUnreader([b"abcdef", b"ghij"])
+    u.fill()
+    u.read(1)
+    buf = bytearray(3)
+    assert u.readinto(buf) == 3
+    assert buf == b"bcd"
+    assert u.readinto(buf) == 2
+    assert buf[:2] == b"ef"
+    assert u.readinto(bytearray(0)) == 0
+
+
+def test_readinto_unreads_extra():
+    u = IterUnreader([b"abcdef"])
+    buf = bytearray(4)
+    assert u.readinto(buf) == 4
+    assert buf == b"abcd"
+    assert u.read() == b"ef"
+    assert u.readinto(buf) == 0
+
+
+def test_socket_unreader():
+    a, b = socket.socketpair()
+    try:
+        a.sendall(b"hello world")
+        a.close()
+        u = SocketUnreader(b, max_chunk=4)
+        assert u.fill() == 4
+        assert bytes(u.buf) == b"hell"
+        assert u.read(6) == b"hello "
+        buf = bytearray(8)
+        assert u.readinto(buf) == 2
+        assert buf[:2] == b"wo"
+        # straight from the socket once the buffer is drained
+        assert u.readinto(buf) == 3
+        assert buf[:3] == b"rld"
+        assert u.buffered() == 0
+        assert u.read() == b""
+    finally:
+        b.close()
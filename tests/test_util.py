@@ -0,0 +1,157 @@
+#
+# This file is part of gunicorn released under the MIT license.
+# See the NOTICE for more information.
+
+import asyncio
+import socket
+import ssl
+import sys
+
+import pytest
+
+from gunicorn import util
+
+
+class PartialSock(socket.socket):
+    """\
+    A socket whose sendmsg() sends at most ``limit`` bytes per call.
+    """
+
+    def __init__(self, limit):
+        super().__init__(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.limit = limit
+        self.calls = []
+        self.data = b""
+
+    def sendmsg(self, buffers):
+        buffers = [bytes(buf) for buf in buffers]
+        self.calls.append(buffers)
+        data = b"".join(buffers)[:self.limit]
+        self.data += data
+        return len(data)
+
+    def sendall(self, data):
+        self.calls.append([bytes(data)])
+        self.data += bytes(data)
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5, 7, 100])
+def test_writev_partial_sends(limit):
+    sock = PartialSock(limit)
+    try:
+        util.writev(sock, [b"abc", b"", b"de", bytearray(b"fgh"),
+                           memoryview(b"ij")])
+        assert sock.data == b"abcdefghij"
+        # a call per partial send, empty buffers are skipped
+        assert len(sock.calls) == -(-10 // limit)
+        assert all(call and all(call) for call in sock.calls)
+    finally:
+        sock.close()
+
+
+def test_writev_iov_max(monkeypatch):
+    monkeypatch.setattr(util, "IOV_MAX", 4)
+    sock = PartialSock(1000)
+    try:
+        buffers = [b"%d" % i for i in range(10)]
+        util.writev(sock, buffers)
+        assert sock.data == b"".join(buffers)
+        assert [len(call) for call in sock.calls] == [4, 4, 2]
+    finally:
+        sock.close()
+
+
+def test_writev_single_buffer():
+    sock = PartialSock(1)
+    try:
+        util.writev(sock, [b"abc"])
+        assert sock.calls == [[b"abc"]]
+    finally:
+        sock.close()
+
+
+def test_writev_socketpair():
+    a, b = socket.socketpair()
+    try:
+        util.writev(a, [b"x" * 70000, b"y" * 10, b"z" * 70000])
+        a.close()
+        data = b""
+        while True:
+            chunk = b.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+        assert data == b"x" * 70000 + b"y" * 10 + b"z" * 70000
+    finally:
+        b.close()
+
+
+class Writer:
+
+    def __init__(self):
+        self.data = []
+
+    def sendall(self, data):
+        self.data.append(bytes(data))
+
+
+def test_writev_without_sendmsg():
+    sock = Writer()
+    util.writev(sock, [b"ab", b"cd"])
+    assert sock.data == [b"abcd"]
+
+
+def test_can_sendmsg():
+    a, b = socket.socketpair()
+    try:
+        assert util.can_sendmsg(a)
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        tls = context.wrap_socket(socket.socket(),
+                                  do_handshake_on_connect=False)
+        try:
+            assert not util.can_sendmsg(tls)
+        finally:
+            tls.close()
+        assert not util.can_sendmsg(Writer())
+    finally:
+        a.close()
+        b.close()
+
+
+def test_chunk_buffers():
+    assert b"".join(util.chunk_buffers(b"hello")) == b"5\r\nhello\r\n"
+    assert b"".join(util.chunk_buffers(b"")) == b"0\r\n\r\n"
+
+
+class Log:
+
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, msg, *args):
+        self.warnings.append(msg % args)
+
+
+@pytest.mark.parametrize("name, warned", [
+    ("asyncio", False),
+    ("auto", False),
+    ("uvloop", True),
+])
+def test_setup_event_loop_without_uvloop(monkeypatch, name, warned):
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    log = Log()
+    assert util.setup_event_loop(name, log) == "asyncio"
+    assert bool(log.warnings) == warned
+
+
+def test_setup_event_loop_uvloop():
+    uvloop = pytest.importorskip("uvloop")
+    log = Log()
+    try:
+        assert util.setup_event_loop("auto", log) == "uvloop"
+        assert isinstance(asyncio.get_event_loop_policy(),
+                          uvloop.EventLoopPolicy)
+    finally:
+        asyncio.set_event_loop_policy(None)
+    assert log.warnings == []